@@ -1,7 +1,12 @@
 from flask import Flask
 from flask_cors import CORS
+from app.config import Config
+from app.resources import ResourceRegistry
 
 app = Flask(__name__)
+app.config.from_object(Config)
 CORS(app)
 
-from app import routes
+resources = ResourceRegistry(app.config)
+
+from app import routes, commands
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ArtifactStore:
+    def __init__(self, root="db/artifacts", max_bytes=5 * 1024 ** 3):
+        """
+        Disk store of the intermediate files of an ingest (raw transcripts, downloaded audio, Whisper
+        output), so that retries and re-ingests reuse them instead of fetching or computing them again.
+
+        Artifacts are keyed by kind, video id and model and stored under a hash of that key. A SQLite
+        manifest records the real path, format and size of every file. Once the files exceed
+        `max_bytes`, the least recently used ones are evicted, except those currently in use.
+
+        Args:
+            root (str): directory holding the files and the manifest.
+            max_bytes (int): disk quota of the files, 0 for no limit.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._in_use = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "manifest.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "key TEXT PRIMARY KEY, kind TEXT NOT NULL, video_id TEXT NOT NULL, model TEXT NOT NULL, "
+            "path TEXT NOT NULL, format TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_video_id ON artifacts (video_id)")
+        self._conn.commit()
+
+
+    @staticmethod
+    def make_key(kind, video_id, model=""):
+        return hashlib.sha256(f"{kind}\0{video_id}\0{model}".encode("utf-8")).hexdigest()
+
+
+    def __entry(self, row):
+        path, file_format, size = row
+        return {"path": path, "format": file_format, "size": size}
+
+
+    def get(self, kind, video_id, model=""):
+        """
+        Returns:
+            dict: "path", "format" and "size" of the artifact, or None if it is missing.
+        """
+        key = self.make_key(kind, video_id, model)
+        with self._lock:
+            row = self._conn.execute("SELECT path, format, size FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is not None and not os.path.exists(row[0]):
+                # Removed behind the manifest's back
+                self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return self.__entry(row)
+
+
+    @contextmanager
+    def use(self, kind, video_id, model=""):
+        """
+        Look up an artifact and keep it from being evicted while the block runs.
+
+        Yields:
+            dict: As `get`, or None if the artifact is missing.
+        """
+        key = self.make_key(kind, video_id, model)
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield self.get(kind, video_id, model)
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+
+
+    @contextmanager
+    def staging_dir(self):
+        """
+        Yields:
+            str: A scratch directory inside the store, for downloads to be moved in with `put_file`.
+                It is removed with whatever is left in it.
+        """
+        path = tempfile.mkdtemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+    def put_file(self, kind, video_id, source_path, model=""):
+        """
+        Move a file into the store, replacing the previous artifact of the same key.
+
+        Args:
+            kind (str): artifact kind, e.g. "audio".
+            video_id (str): video the artifact belongs to.
+            source_path (str): file to move in. Its extension is kept as the artifact format.
+            model (str): model or settings that produced the artifact, if any.
+
+        Returns:
+            dict: As `get`.
+        """
+        key = self.make_key(kind, video_id, model)
+        file_format = os.path.splitext(source_path)[1].lstrip(".") or "bin"
+        path = os.path.join(self.root, kind, key[:2], f"{key}.{file_format}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(source_path, path)
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT path FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if previous is not None and previous[0] != path and os.path.exists(previous[0]):
+                os.remove(previous[0])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, kind, video_id, model, path, format, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, video_id, model, path, file_format, size, now, now),
+            )
+            self._conn.commit()
+            self.__evict(keep=key)
+        return {"path": path, "format": file_format, "size": size}
+
+
+    def put_json(self, kind, video_id, value, model=""):
+        """
+        Store a JSON-serialisable value as an artifact, see `put_file`.
+        """
+        with self.staging_dir() as staging:
+            source_path = os.path.join(staging, "artifact.json")
+            with open(source_path, "w", encoding="utf-8") as file:
+                json.dump(value, file)
+            return self.put_file(kind, video_id, source_path, model)
+
+
+    def get_json(self, kind, video_id, model=""):
+        """
+        Returns:
+            The value stored with `put_json`, or None if it is missing.
+        """
+        with self.use(kind, video_id, model) as entry:
+            if entry is None:
+                return None
+            with open(entry["path"], "r", encoding="utf-8") as file:
+                return json.load(file)
+
+
+    def __evict(self, keep):
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, path, size in self._conn.execute("SELECT key, path, size FROM artifacts ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._in_use:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+        self._conn.commit()
+
+
+    def delete(self, video_id):
+        """
+        Remove every artifact of a video.
+        """
+        with self._lock:
+            for (path,) in self._conn.execute("SELECT path FROM artifacts WHERE video_id = ?", (video_id,)).fetchall():
+                if os.path.exists(path):
+                    os.remove(path)
+            self._conn.execute("DELETE FROM artifacts WHERE video_id = ?", (video_id,))
+            self._conn.commit()
+
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit, miss and eviction counters, and the number and total size of the stored artifacts.
+        """
+        with self._lock:
+            items, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "items": items, "bytes": size}
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+class EmbeddingCache:
+    def __init__(self, path="db/embedding_cache.sqlite3", max_memory_items=10000, max_disk_items=1000000):
+        """
+        Two-tier embedding cache keyed by a hash of (model, text).
+
+        Recently used vectors are kept in an in-memory LRU, everything else in a SQLite table of
+        float32 blobs. Both tiers evict their least recently used entries once they exceed their size.
+
+        Args:
+            path (str): path of the SQLite file, None to keep only the memory tier.
+            max_memory_items (int): max number of vectors kept in memory.
+            max_disk_items (int): max number of vectors kept on disk.
+        """
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+    def __remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+
+    def get_many(self, model, texts):
+        """
+        Look up the embeddings of several texts.
+
+        Args:
+            model (str): embedding model name.
+            texts (list of str): texts to look up.
+
+        Returns:
+            list: The cached embedding (list of float) of each text, or None where it is missing.
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found = [None] * len(keys)
+        disk_lookup = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[i] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                lookup_keys = list(disk_lookup)
+                rows = []
+                for offset in range(0, len(lookup_keys), 500):
+                    chunk = lookup_keys[offset:offset + 500]
+                    rows += self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                for key, blob in rows:
+                    vector = array('f', blob).tolist()
+                    self.__remember(key, vector)
+                    for i in disk_lookup.pop(key):
+                        found[i] = vector
+                        self.disk_hits += 1
+                if rows:
+                    now = time.time()
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows])
+                    self._conn.commit()
+
+            self.misses += sum(len(indices) for indices in disk_lookup.values())
+        return found
+
+
+    def put_many(self, model, texts, vectors):
+        """
+        Store the embeddings of several texts.
+
+        Args:
+            model (str): embedding model name.
+            texts (list of str): embedded texts.
+            vectors (list of list of float): their embeddings.
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self.__remember(key, list(vector))
+
+            if self._conn is None:
+                return
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array('f', vector).tobytes(), now) for key, vector in zip(keys, vectors)],
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_disk_items:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_disk_items,),
+                )
+            self._conn.commit()
+
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit and miss counters and the current size of the memory tier.
+        """
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+        }
+
+
+class ResponseCache:
+    def __init__(self, ttl=86400, max_size=10000, path=None):
+        """
+        LRU cache of JSON-serialisable values that expire after a time to live.
+
+        Entries can be tagged, e.g. with the video they were computed from, and all entries of a tag are
+        invalidated together. With a SQLite file, invalidations are shared with every process using it.
+
+        Args:
+            ttl (float): seconds an entry stays valid.
+            max_size (int): max number of entries kept in each tier.
+            path (str, optional): path of a SQLite file that persists entries across restarts.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+            if "tag" not in columns:
+                # Added after the first release of the table
+                self._conn.execute("ALTER TABLE responses ADD COLUMN tag TEXT")
+                self._conn.execute("ALTER TABLE responses ADD COLUMN created_at REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_tag ON responses (tag)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS invalidations (tag TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)")
+            self._conn.commit()
+
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Hash the parts that identify a response, e.g. model, prompt and generation parameters.
+        """
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+    def __invalidated(self, tag, created_at):
+        # Invalidations of this process drop its entries right away, those of others are only in the file
+        if tag is None or self._conn is None:
+            return False
+        row = self._conn.execute("SELECT invalidated_at FROM invalidations WHERE tag = ?", (tag,)).fetchone()
+        return row is not None and row[0] >= created_at
+
+
+    def get(self, key):
+        """
+        Returns:
+            The cached value, or None if it is missing, expired or invalidated.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now and not self.__invalidated(entry[2], entry[3]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, expires_at, tag, created_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None and not self.__invalidated(row[2], row[3]):
+                    value = json.loads(row[0])
+                    self.__remember(key, value, row[1], row[2], row[3])
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+
+    def __remember(self, key, value, expires_at, tag=None, created_at=None):
+        self._memory[key] = (value, expires_at, tag, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+
+    def set(self, key, value, tag=None):
+        """
+        Store a value under a key for `ttl` seconds.
+
+        Args:
+            tag (str, optional): tag the entry is invalidated with, see `invalidate`.
+        """
+        created_at = time.time()
+        expires_at = created_at + self.ttl
+        with self._lock:
+            self.__remember(key, value, expires_at, tag, created_at)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, tag, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, tag, created_at),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_size:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at LIMIT ?)",
+                    (count - self.max_size,),
+                )
+            self._conn.commit()
+
+
+    def invalidate(self, tag):
+        """
+        Drop every entry stored with a tag so far. Entries other processes keep in memory are dropped on
+        their next lookup, as the invalidation is recorded in the SQLite file.
+
+        Args:
+            tag (str): tag of the entries, e.g. a video id.
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if entry[2] == tag]:
+                del self._memory[key]
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM responses WHERE tag = ?", (tag,))
+            self._conn.execute("INSERT OR REPLACE INTO invalidations (tag, invalidated_at) VALUES (?, ?)", (tag, now))
+            # Entries older than the time to live have expired anyway
+            self._conn.execute("DELETE FROM invalidations WHERE invalidated_at <= ?", (now - self.ttl,))
+            self._conn.commit()
+
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit and miss counters and the current size of the memory tier.
+        """
+        return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory)}
@@ -0,0 +1,159 @@
+import json
+import logging
+import time
+import click
+from app import app, resources
+from app.routes import chroma_db, confidence_gate, ingest_service, search_query_text, video_bundles
+from app.services import ChromaDBService, YouTubeService
+
+commands_logger = logging.getLogger("commands_logger")
+commands_logger.addHandler(logging.StreamHandler())
+commands_logger.setLevel(logging.INFO)
+
+
+@app.cli.command("migrate-shared-collection")
+@click.option("--delete-source", is_flag=True, help="Delete each per-video collection after copying it.")
+def migrate_shared_collection(delete_source):
+    """
+    Copy per-video subtitle collections into the shared collection.
+    """
+    shared_db = ChromaDBService(
+        chroma_client=resources.chroma_client,
+        storage_mode="shared",
+        shared_collection_name=app.config["CHROMA_SHARED_COLLECTION"],
+        embedding_backend=resources.embedding_backend,
+    )
+    migrated = shared_db.migrate_to_shared_collection(delete_source=delete_source, logger=commands_logger)
+    click.echo(f"Migrated {migrated} videos.")
+
+
+@app.cli.command("build-lexical-index")
+@click.argument("video_ids", nargs=-1)
+def build_lexical_index(video_ids):
+    """
+    Build the BM25 index of stored videos, all of them if no VIDEO_IDS are given.
+    """
+    for video_id in video_ids or chroma_db.list_video_ids():
+        segments = chroma_db.get_segments(video_id)
+        if segments:
+            chroma_db.lexical_index.build(video_id, segments)
+            commands_logger.info(f"{video_id} Indexed {len(segments)} segments.")
+
+
+@app.cli.command("build-chapter-index")
+@click.option("--fetch-youtube-chapters", is_flag=True, help="Fetch the chapters of each video from YouTube again.")
+@click.argument("video_ids", nargs=-1)
+def build_chapter_index(fetch_youtube_chapters, video_ids):
+    """
+    Build the chapter index of stored videos, all of them if no VIDEO_IDS are given.
+    """
+    if chroma_db.chapter_index is None:
+        raise click.ClickException("The chapter index is disabled, set CHAPTER_INDEX=1.")
+    for video_id in video_ids or chroma_db.list_video_ids():
+        segments, embeddings = chroma_db.get_segment_embeddings(video_id)
+        if not segments:
+            continue
+        youtube_chapters = None
+        if fetch_youtube_chapters:
+            youtube_chapters = ingest_service.youtube.fetch_info(YouTubeService.watch_url(video_id))["chapters"]
+        chapters = chroma_db.build_chapter_index(video_id, segments, youtube_chapters, embeddings=embeddings)
+        commands_logger.info(f"{video_id} Indexed {len(segments)} segments into {len(chapters)} chapters.")
+
+
+@app.cli.command("reembed")
+@click.option("--from-mode", type=click.Choice(["per_video", "shared"]), default=None,
+              help="Storage mode holding the old vectors, defaults to CHROMA_STORAGE_MODE.")
+@click.option("--from-collection", default=None,
+              help="Shared collection holding the old vectors, defaults to CHROMA_SHARED_COLLECTION.")
+@click.argument("video_ids", nargs=-1)
+def reembed(from_mode, from_collection, video_ids):
+    """
+    Re-embed stored segments with the configured embedding backend, all videos if no VIDEO_IDS are given.
+
+    In shared mode, point CHROMA_SHARED_COLLECTION at a new collection and pass the old one with
+    --from-collection.
+    """
+    source = ChromaDBService(
+        chroma_client=resources.chroma_client,
+        storage_mode=from_mode or app.config["CHROMA_STORAGE_MODE"],
+        shared_collection_name=from_collection or app.config["CHROMA_SHARED_COLLECTION"],
+    )
+    count = chroma_db.reembed_from(source, video_ids=list(video_ids) or None, logger=commands_logger)
+    click.echo(f"Re-embedded {count} videos with {chroma_db.embedding_backend.name}.")
+
+
+@app.cli.command("export-bundles")
+@click.argument("video_ids", nargs=-1)
+def export_bundles(video_ids):
+    """
+    Export stored videos as bundles into BUNDLE_DIR, all of them if no VIDEO_IDS are given.
+    """
+    count = 0
+    for video_id in video_ids or chroma_db.list_video_ids():
+        manifest = video_bundles.export(video_id)
+        count += 1
+        commands_logger.info(f"{video_id} Exported {manifest['segments']} segments.")
+    click.echo(f"Exported {count} videos to {video_bundles.bundle_dir}.")
+
+
+@app.cli.command("import-bundles")
+@click.option("--force", is_flag=True, help="Import bundles again even if their videos were already imported from them.")
+@click.argument("video_ids", nargs=-1)
+def import_bundles(force, video_ids):
+    """
+    Import the bundles of BUNDLE_DIR into ChromaDB, all of them if no VIDEO_IDS are given. Videos
+    already imported from the same bundle are skipped, so an interrupted import can simply be run again.
+    A bundle that fails to import is reported and the others are still imported.
+    """
+    start_time = time.perf_counter()
+    count = 0
+    skipped = 0
+    segments = 0
+    failed = []
+    for video_id in video_ids or video_bundles.list_video_ids():
+        try:
+            imported = video_bundles.load(video_id, force=force)
+        except Exception as e:
+            commands_logger.error(f"{video_id} Import failed: {e}")
+            failed.append(video_id)
+            continue
+        ingest_service.mark_done(video_id, YouTubeService.watch_url(video_id))
+        if imported:
+            count += 1
+            segments += imported
+        else:
+            skipped += 1
+    click.echo(f"Imported {count} videos ({segments} segments), skipped {skipped} already imported, "
+               f"in {time.perf_counter() - start_time:.1f} seconds.")
+    if failed:
+        raise click.ClickException(f"{len(failed)} bundles failed to import: {', '.join(failed)}")
+
+
+@app.cli.command("calibrate-fast-path")
+@click.option("--target-precision", type=float, default=0.9, show_default=True,
+              help="Share of queries answered without the LLM that must be answered correctly.")
+@click.argument("labels_file", type=click.File("r", encoding="utf-8"))
+def calibrate_fast_path(target_precision, labels_file):
+    """
+    Fit the fast path confidence to the configured embedding model. LABELS_FILE holds one JSON object
+    per line with the "video_id" and "query_text" of a query and the "start_seconds" and "end_seconds" of
+    the moment that answers it, for stored videos.
+    """
+    samples = []
+    for line in labels_file:
+        if line.strip():
+            label = json.loads(line)
+            _, results = search_query_text(label["video_id"], label["query_text"])
+            samples.append((results, label["start_seconds"], label["end_seconds"]))
+    try:
+        calibration = confidence_gate.calibrate(samples, target_precision)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{calibration['samples']} queries, {calibration['correct']:.0%} answered by their best match.")
+    click.echo(f"FAST_PATH_MIDPOINT={calibration['midpoint']:.4f}")
+    click.echo(f"FAST_PATH_SLOPE={calibration['slope']:.2f}")
+    if calibration["min_confidence"] is None:
+        click.echo(f"No confidence reaches a precision of {target_precision:.0%}, keep the fast path off.")
+    else:
+        click.echo(f"FAST_PATH_MIN_CONFIDENCE={calibration['min_confidence']:.4f}")
+        click.echo(f"{calibration['skip_share']:.0%} of the queries would skip the LLM, {calibration['precision']:.0%} of them correctly.")
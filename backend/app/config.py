@@ -0,0 +1,129 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Config:
+    """
+    Application settings, overridable through environment variables or `.env`.
+    """
+    CHROMA_PERSIST_DIR = os.environ.get("CHROMA_PERSIST_DIR", "db/chroma")
+    # "per_video" or "shared", see ChromaDBService
+    CHROMA_STORAGE_MODE = os.environ.get("CHROMA_STORAGE_MODE", "per_video")
+    CHROMA_SHARED_COLLECTION = os.environ.get("CHROMA_SHARED_COLLECTION", "subtitles")
+
+    # "ollama" or "sentence-transformers" (needs `pip install sentence-transformers`)
+    EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "ollama")
+    # Empty picks the backend default: llama3.2 for Ollama, all-MiniLM-L6-v2 for sentence-transformers
+    EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL") or None
+    # Keep only the first N components of every vector, 0 keeps them all. Only for Matryoshka-trained models,
+    # e.g. EMBEDDING_MODEL=nomic-embed-text, see MATRYOSHKA_MODELS in app/services/embedding_backend.py
+    EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", 0))
+    EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+    # Concurrent embedding calls, e.g. from videos ingested in parallel, are merged into batches of up to this size
+    EMBEDDING_COALESCE_MAX_BATCH = int(os.environ.get("EMBEDDING_COALESCE_MAX_BATCH", 512))
+    EMBEDDING_COALESCE_WAIT = float(os.environ.get("EMBEDDING_COALESCE_WAIT", 0))
+
+    EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "db/embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MEMORY_ITEMS = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ITEMS", 10000))
+    EMBEDDING_CACHE_DISK_ITEMS = int(os.environ.get("EMBEDDING_CACHE_DISK_ITEMS", 1000000))
+
+    # Answer LLM keywords from a per-video BM25 index instead of embedding each of them
+    HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "1") == "1"
+    LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", "db/lexical")
+    LEXICAL_INDEX_MAX_LOADED = int(os.environ.get("LEXICAL_INDEX_MAX_LOADED", 256))
+
+    # Search the closest chapters of a video first, then segments within them (see ChapterIndexService)
+    CHAPTER_INDEX = os.environ.get("CHAPTER_INDEX", "1") == "1"
+    CHAPTER_MIN_SECONDS = float(os.environ.get("CHAPTER_MIN_SECONDS", 60))
+    CHAPTER_MAX_SECONDS = float(os.environ.get("CHAPTER_MAX_SECONDS", 300))
+    CHAPTER_TOP_K = int(os.environ.get("CHAPTER_TOP_K", 3))
+    # Queries of at most this many terms, all found in the video, skip the keyword LLM call (0 never skips)
+    SIMPLE_QUERY_MAX_TERMS = int(os.environ.get("SIMPLE_QUERY_MAX_TERMS", 4))
+
+    # Queries whose best vector match stands out are answered without the LLM, see ConfidenceGate. The
+    # confidence is a logistic function of the relative distance gap to the best match elsewhere in the
+    # video, whose midpoint and slope depend on the embedding model: fit them with `flask
+    # calibrate-fast-path`. FAST_PATH_MIN_CONFIDENCE above 1 (the default) sends every query to the LLM
+    FAST_PATH_MIN_CONFIDENCE = float(os.environ.get("FAST_PATH_MIN_CONFIDENCE", 2))
+    FAST_PATH_MIDPOINT = float(os.environ.get("FAST_PATH_MIDPOINT", 0.15))
+    FAST_PATH_SLOPE = float(os.environ.get("FAST_PATH_SLOPE", 20))
+    # Max distance of the best match for the fast path, 0 for no limit (the scale depends on the embedding model)
+    FAST_PATH_MAX_DISTANCE = float(os.environ.get("FAST_PATH_MAX_DISTANCE", 0))
+    FAST_PATH_DISTANCE_RATIO = float(os.environ.get("FAST_PATH_DISTANCE_RATIO", 1.03))
+
+    # Estimated tokens of the description and candidates in the timestamp prompt (0 for no limit); adjacent
+    # candidates are merged into time windows and the best scoring windows are kept
+    PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 1500))
+    PROMPT_DESCRIPTION_TOKENS = int(os.environ.get("PROMPT_DESCRIPTION_TOKENS", 300))
+    CONTEXT_MERGE_GAP_SECONDS = float(os.environ.get("CONTEXT_MERGE_GAP_SECONDS", 5))
+    CONTEXT_MAX_WINDOW_SECONDS = float(os.environ.get("CONTEXT_MAX_WINDOW_SECONDS", 45))
+
+    # /search_library (shared storage mode only): videos returned, and segments retrieved from the whole library
+    LIBRARY_SEARCH_TOP_K = int(os.environ.get("LIBRARY_SEARCH_TOP_K", 10))
+    LIBRARY_SEARCH_MAX_SEGMENTS = int(os.environ.get("LIBRARY_SEARCH_MAX_SEGMENTS", 200))
+
+    LLM_API_URL = os.environ.get("LLM_API_URL", "https://api.groq.com/openai/v1")
+    LLM_MODEL = os.environ.get("LLM_MODEL", "llama-3.2-90b-vision-preview")
+    PUBLIC_API_KEY = os.environ.get("PUBLIC_API_KEY")
+    LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+    LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+    # Threads running the concurrent retrieval calls of queries, separate from the ingest workers
+    QUERY_MAX_WORKERS = int(os.environ.get("QUERY_MAX_WORKERS", 16))
+    # Max seconds an ingest step waits for in-flight queries to finish, see QueryPriority. 0 lets ingest
+    # compete with queries for the CPU
+    INGEST_YIELD_MAX_WAIT = float(os.environ.get("INGEST_YIELD_MAX_WAIT", 0.5))
+
+    # Set the *_CACHE_PATH variables to a SQLite file to persist cached responses across restarts
+    # A running server only sees the query results that `flask` commands invalidate, e.g. reembed or
+    # import-bundles, through a QUERY_CACHE_PATH file
+    LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 86400))
+    LLM_CACHE_MAX_SIZE = int(os.environ.get("LLM_CACHE_MAX_SIZE", 10000))
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH") or None
+    QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 3600))
+    QUERY_CACHE_MAX_SIZE = int(os.environ.get("QUERY_CACHE_MAX_SIZE", 10000))
+    QUERY_CACHE_PATH = os.environ.get("QUERY_CACHE_PATH") or None
+
+    # Keep an .srt copy of every ingested subtitle under SUBTITLE_DIR
+    SAVE_SRT = os.environ.get("SAVE_SRT", "1") == "1"
+    SUBTITLE_DIR = os.environ.get("SUBTITLE_DIR", "subtitles")
+    # Directory of store_video_data.log and query_timestamp.log
+    LOG_DIR = os.environ.get("LOG_DIR", ".")
+
+    # Caption tracks tried before falling back to Whisper: "manual" and "generated" tracks in one of
+    # TRANSCRIPT_LANGUAGES, tracks "translated" into one of them by YouTube, then any "original" track
+    TRANSCRIPT_LANGUAGES = os.environ.get("TRANSCRIPT_LANGUAGES", "en").split(",")
+    TRANSCRIPT_POLICY = os.environ.get("TRANSCRIPT_POLICY", "manual,generated,translated,original").split(",")
+    # Retries of caption requests failing on rate limits or network errors, before the ingest job itself is retried
+    TRANSCRIPT_MAX_RETRIES = int(os.environ.get("TRANSCRIPT_MAX_RETRIES", 3))
+    TRANSCRIPT_RETRY_BACKOFF = float(os.environ.get("TRANSCRIPT_RETRY_BACKOFF", 2))
+
+    # Raw transcripts, downloaded audio and Whisper output, reused across ingest retries and evicted
+    # least recently used first beyond ARTIFACT_MAX_MB (0 for no limit)
+    ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "db/artifacts")
+    ARTIFACT_MAX_MB = float(os.environ.get("ARTIFACT_MAX_MB", 5120))
+
+    # Precomputed video indexes exported with `flask export-bundles`, see VideoBundleService. With
+    # BUNDLE_LAZY_LOAD a video missing from ChromaDB is imported from its bundle on its first request
+    BUNDLE_DIR = os.environ.get("BUNDLE_DIR", "db/bundles")
+    BUNDLE_LAZY_LOAD = os.environ.get("BUNDLE_LAZY_LOAD", "1") == "1"
+
+    WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "medium")
+    WHISPER_IDLE_TIMEOUT = float(os.environ.get("WHISPER_IDLE_TIMEOUT", 600))
+    # e.g. "int8", "int8_float32", "float32"; empty picks float16 on GPU and int8 on CPU
+    WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE") or None
+    # WHISPER_WORKERS > 1 splits long audio into chunks transcribed in parallel
+    WHISPER_WORKERS = int(os.environ.get("WHISPER_WORKERS", 1))
+    WHISPER_THREADS_PER_WORKER = int(os.environ.get("WHISPER_THREADS_PER_WORKER", 0))
+    WHISPER_CHUNK_SECONDS = float(os.environ.get("WHISPER_CHUNK_SECONDS", 300))
+    WHISPER_CHUNK_OVERLAP = float(os.environ.get("WHISPER_CHUNK_OVERLAP", 2))
+
+    INGEST_DB_PATH = os.environ.get("INGEST_DB_PATH", "db/ingest_jobs.sqlite3")
+    INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", 2))
+    INGEST_MAX_RETRIES = int(os.environ.get("INGEST_MAX_RETRIES", 2))
+    INGEST_RETRY_BACKOFF = float(os.environ.get("INGEST_RETRY_BACKOFF", 5))
+    # Requests to YouTube (metadata, transcripts, audio, playlist pages) per second across all workers, 0 for no limit
+    YOUTUBE_REQUESTS_PER_SECOND = float(os.environ.get("YOUTUBE_REQUESTS_PER_SECOND", 2))
+    # Max videos queued from one playlist or channel URL
+    BULK_INGEST_MAX_VIDEOS = int(os.environ.get("BULK_INGEST_MAX_VIDEOS", 500))
@@ -0,0 +1,224 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+trace_stages_var = contextvars.ContextVar("trace_stages", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size=1024):
+        """
+        Cumulative bucket counts plus a reservoir of the latest samples for exact recent percentiles.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=reservoir_size)
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="vidlocator"):
+        """
+        Process-wide counters and histograms, rendered in the Prometheus text format.
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._help = {}
+
+
+    def inc(self, name, amount=1, help=None, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+            if help:
+                self._help[name] = help
+
+
+    def observe(self, name, value, help=None, buckets=DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+            if help:
+                self._help[name] = help
+
+
+    def register_gauge(self, name, callback, help=None):
+        """
+        Register a callback returning {label tuple: value} evaluated at render time.
+        """
+        with self._lock:
+            self._gauges[name] = callback
+            if help:
+                self._help[name] = help
+
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        """
+        Time a block as one observation of the `stage_seconds` histogram. Failures are also counted
+        in `stage_errors_total`. The duration is added to the current request trace, if any.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", help="Failed stage executions.", stage=stage, **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.observe("stage_seconds", elapsed, help="Duration of pipeline stages.", stage=stage, **labels)
+            stages = trace_stages_var.get()
+            if stages is not None:
+                stages.append((stage, elapsed))
+
+
+    def timed_iter(self, stage, iterable, **labels):
+        """
+        Yield from `iterable`, recording only the time spent producing items as one observation.
+        """
+        elapsed = 0.0
+        iterator = iter(iterable)
+        stages = trace_stages_var.get()
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start_time
+                break
+            except Exception:
+                self.inc("stage_errors_total", help="Failed stage executions.", stage=stage, **labels)
+                raise
+            elapsed += time.perf_counter() - start_time
+            yield item
+        self.observe("stage_seconds", elapsed, help="Duration of pipeline stages.", stage=stage, **labels)
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+
+    def render(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {full_name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.total}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+            gauges = sorted(self._gauges.items())
+
+        for name, callback in gauges:
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {full_name} gauge")
+            for labels, value in sorted(callback().items()):
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+    def counters(self):
+        """
+        Returns:
+            dict: Value of every counter series, keyed by name and labels.
+        """
+        with self._lock:
+            return {name + _format_labels(labels): value for name, series in self._counters.items() for labels, value in series.items()}
+
+
+    def summary(self):
+        """
+        Returns:
+            dict: Count, mean and recent p50/p95/p99 of every histogram series, keyed by name and labels.
+        """
+        summary = {}
+        with self._lock:
+            for name, series in self._histograms.items():
+                for labels, histogram in series.items():
+                    key = name + _format_labels(labels)
+                    summary[key] = {
+                        "count": histogram.count,
+                        "mean": histogram.total / histogram.count if histogram.count else None,
+                        "p50": histogram.percentile(0.5),
+                        "p95": histogram.percentile(0.95),
+                        "p99": histogram.percentile(0.99),
+                    }
+        return summary
+
+
+@contextmanager
+def trace(trace_id):
+    """
+    Bind a trace id to the current context and collect the stage durations recorded under it.
+
+    Yields:
+        list of (str, float): Stage names and durations, filled in as stages complete.
+    """
+    stages = []
+    id_token = trace_id_var.set(trace_id)
+    stages_token = trace_stages_var.set(stages)
+    try:
+        yield stages
+    finally:
+        trace_id_var.reset(id_token)
+        trace_stages_var.reset(stages_token)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,51 @@
+import threading
+from contextlib import contextmanager
+
+from app.metrics import metrics
+
+
+class QueryPriority:
+    def __init__(self, max_wait=0.5):
+        """
+        Let background ingest work give way to queries. Queries mark their CPU-bound steps (embedding,
+        vector search, fusion) in flight with `query`, but not their LLM calls, and ingest calls
+        `yield_to_queries` between its own CPU-bound steps (embedding a chunk, writing it to Chroma,
+        building the indexes of a video), which waits until no query step is in flight.
+
+        Ingest runs in the same process as the queries, so on a small machine every step it takes while
+        a query runs slows that query down, whatever the thread pools look like.
+
+        Args:
+            max_wait (float): max seconds one step is held back, so ingest keeps progressing under a
+                steady query load. 0 never holds ingest back.
+        """
+        self.max_wait = max_wait
+        self._active = 0
+        self._condition = threading.Condition()
+
+
+    @contextmanager
+    def query(self):
+        """
+        Mark a query in flight while the block runs.
+        """
+        with self._condition:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                if not self._active:
+                    self._condition.notify_all()
+
+
+    def yield_to_queries(self):
+        """
+        Wait until no query is in flight, at most `max_wait` seconds.
+        """
+        if not self.max_wait or not self._active:
+            return
+        with metrics.timed("ingest_yield"):
+            with self._condition:
+                self._condition.wait_for(lambda: not self._active, timeout=self.max_wait)
@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import httpx
+import openai
+from chromadb.config import DEFAULT_TENANT, DEFAULT_DATABASE, Settings
+from app.artifacts import ArtifactStore
+from app.cache import EmbeddingCache, ResponseCache
+from app.priority import QueryPriority
+from app.services.embedding_backend import CoalescingEmbeddingBackend, create_embedding_backend
+from app.services.transcription import LazyWhisperModel
+
+
+class ResourceRegistry:
+    def __init__(self, config):
+        """
+        Build the process-wide clients shared by every request.
+
+        Args:
+            config (Mapping): Flask app config (see `app.config.Config`).
+        """
+        start_time = time.time()
+        self.chroma_client = chromadb.PersistentClient(
+            path=config["CHROMA_PERSIST_DIR"],
+            settings=Settings(),
+            tenant=DEFAULT_TENANT,
+            database=DEFAULT_DATABASE,
+        )
+        self.embedding_cache = EmbeddingCache(
+            path=config["EMBEDDING_CACHE_PATH"],
+            max_memory_items=config["EMBEDDING_CACHE_MEMORY_ITEMS"],
+            max_disk_items=config["EMBEDDING_CACHE_DISK_ITEMS"],
+        )
+        self.embedding_backend = create_embedding_backend(
+            config["EMBEDDING_BACKEND"],
+            config["EMBEDDING_MODEL"],
+            config["EMBEDDING_DIMENSIONS"],
+            batch_size=config["EMBEDDING_BATCH_SIZE"],
+        )
+        # Ingest embeddings go through their own batching lane so queries never wait behind them
+        self.ingest_embedding_backend = CoalescingEmbeddingBackend(
+            self.embedding_backend,
+            max_batch_size=config["EMBEDDING_COALESCE_MAX_BATCH"],
+            max_wait=config["EMBEDDING_COALESCE_WAIT"],
+        )
+        self.query_executor = ThreadPoolExecutor(max_workers=config["QUERY_MAX_WORKERS"], thread_name_prefix="query")
+        self.query_priority = QueryPriority(config["INGEST_YIELD_MAX_WAIT"])
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=config["LLM_MAX_CONNECTIONS"],
+                max_keepalive_connections=config["LLM_MAX_CONNECTIONS"],
+            ),
+            timeout=config["LLM_TIMEOUT"],
+        )
+        self.llm_api_url = config["LLM_API_URL"]
+        self.llm_api_key = config["PUBLIC_API_KEY"]
+        self._llm_client = None
+        self._llm_client_lock = threading.Lock()
+        self.llm_model = config["LLM_MODEL"]
+        self.llm_cache = ResponseCache(config["LLM_CACHE_TTL"], config["LLM_CACHE_MAX_SIZE"], config["LLM_CACHE_PATH"])
+        self.query_result_cache = ResponseCache(config["QUERY_CACHE_TTL"], config["QUERY_CACHE_MAX_SIZE"], config["QUERY_CACHE_PATH"])
+        self.artifact_store = ArtifactStore(config["ARTIFACT_DIR"], int(config["ARTIFACT_MAX_MB"] * 1024 ** 2))
+        self.whisper_model = LazyWhisperModel(
+            config["WHISPER_MODEL"],
+            config["WHISPER_IDLE_TIMEOUT"],
+            compute_type=config["WHISPER_COMPUTE_TYPE"],
+            cpu_threads=config["WHISPER_THREADS_PER_WORKER"],
+            num_workers=config["WHISPER_WORKERS"],
+        )
+        self.startup_time = time.time() - start_time
+
+
+    @property
+    def llm_client(self):
+        """
+        OpenAI-compatible client on the shared keep-alive connection pool. Built on first use so a
+        missing API key surfaces on the first LLM request rather than at startup.
+        """
+        with self._llm_client_lock:
+            if self._llm_client is None:
+                self._llm_client = openai.Client(
+                    base_url=self.llm_api_url,
+                    api_key=self.llm_api_key,
+                    http_client=self.http_client,
+                )
+            return self._llm_client
+
@@ -1,97 +1,503 @@
-from app import app
-from flask import request, jsonify
+from app import app, resources
+from flask import request, jsonify, g, Response, stream_with_context
 from collections import Counter
+import os
 import time 
 import logging
-from app.services import ChromaDBService, YouTubeService, LLMService
+import uuid
+import json
+import contextvars
+from app.services import ChromaDBService, YouTubeService, LLMService, IngestService, LexicalIndexService, ChapterIndexService, ContextPacker, TranscriptResolver, ConfidenceGate, VideoBundleService
+from app.services.lexical_index import tokenize
+from app.services.ingest_service import DONE, FAILED
+from app.cache import ResponseCache
+from app.utils import format_hms, normalize_query, parse_timestamp_seconds, parse_upload_date
+from app.metrics import metrics, trace, RATIO_BUCKETS
 log = True
-queue_set = set()
 
 store_video_logger = logging.getLogger("store_video_logger")
-store_video_handler = logging.FileHandler("store_video_data.log")
+os.makedirs(app.config["LOG_DIR"], exist_ok=True)
+store_video_handler = logging.FileHandler(os.path.join(app.config["LOG_DIR"], "store_video_data.log"))
 store_video_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 store_video_logger.addHandler(store_video_handler)
 store_video_logger.setLevel(logging.INFO)
 
+query_timestamp_logger = logging.getLogger("query_timestamp_logger")
+query_timestamp_handler = logging.FileHandler(os.path.join(app.config["LOG_DIR"], "query_timestamp.log"))
+query_timestamp_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+query_timestamp_logger.addHandler(query_timestamp_handler)
+query_timestamp_logger.setLevel(logging.INFO)
+
+if log:
+    store_video_logger.info(f"Resource registry startup Time taken: {resources.startup_time:.2f} seconds.")
+
+chroma_db = ChromaDBService(
+    embedding_batch_size=app.config["EMBEDDING_BATCH_SIZE"],
+    chroma_client=resources.chroma_client,
+    storage_mode=app.config["CHROMA_STORAGE_MODE"],
+    shared_collection_name=app.config["CHROMA_SHARED_COLLECTION"],
+    embedding_cache=resources.embedding_cache,
+    embedding_backend=resources.embedding_backend,
+    ingest_embedding_backend=resources.ingest_embedding_backend,
+    lexical_index=LexicalIndexService(app.config["LEXICAL_INDEX_DIR"], app.config["LEXICAL_INDEX_MAX_LOADED"]),
+    chapter_index=ChapterIndexService(
+        resources.chroma_client,
+        min_seconds=app.config["CHAPTER_MIN_SECONDS"],
+        max_seconds=app.config["CHAPTER_MAX_SECONDS"],
+    ) if app.config["CHAPTER_INDEX"] else None,
+    query_priority=resources.query_priority,
+    result_cache=resources.query_result_cache,
+)
+ingest_service = IngestService(
+    chroma_db,
+    YouTubeService(
+        save_dir=app.config["SUBTITLE_DIR"],
+        whisper_model=resources.whisper_model,
+        transcribe_workers=app.config["WHISPER_WORKERS"],
+        chunk_seconds=app.config["WHISPER_CHUNK_SECONDS"],
+        chunk_overlap=app.config["WHISPER_CHUNK_OVERLAP"],
+        save_srt=app.config["SAVE_SRT"],
+        requests_per_second=app.config["YOUTUBE_REQUESTS_PER_SECOND"],
+        artifact_store=resources.artifact_store,
+        transcript_resolver=TranscriptResolver(
+            languages=app.config["TRANSCRIPT_LANGUAGES"],
+            policy=app.config["TRANSCRIPT_POLICY"],
+            max_retries=app.config["TRANSCRIPT_MAX_RETRIES"],
+            retry_backoff=app.config["TRANSCRIPT_RETRY_BACKOFF"],
+        ),
+    ),
+    db_path=app.config["INGEST_DB_PATH"],
+    max_workers=app.config["INGEST_MAX_WORKERS"],
+    max_retries=app.config["INGEST_MAX_RETRIES"],
+    retry_backoff=app.config["INGEST_RETRY_BACKOFF"],
+    logger=store_video_logger if log else None,
+    query_priority=resources.query_priority,
+)
+
+context_packer = ContextPacker(
+    token_budget=app.config["PROMPT_TOKEN_BUDGET"],
+    description_tokens=app.config["PROMPT_DESCRIPTION_TOKENS"],
+    merge_gap_seconds=app.config["CONTEXT_MERGE_GAP_SECONDS"],
+    max_window_seconds=app.config["CONTEXT_MAX_WINDOW_SECONDS"],
+)
+
+video_bundles = VideoBundleService(chroma_db, app.config["BUNDLE_DIR"], logger=store_video_logger if log else None)
+
+confidence_gate = ConfidenceGate(
+    min_confidence=app.config["FAST_PATH_MIN_CONFIDENCE"],
+    midpoint=app.config["FAST_PATH_MIDPOINT"],
+    slope=app.config["FAST_PATH_SLOPE"],
+    max_distance=app.config["FAST_PATH_MAX_DISTANCE"],
+    distance_ratio=app.config["FAST_PATH_DISTANCE_RATIO"],
+)
+
+request_loggers = {"store_video_data": store_video_logger, "query_timestamp": query_timestamp_logger}
+
+
+def cache_stats():
+    stats = {}
+    for cache_name, cache in [
+        ("embedding", resources.embedding_cache),
+        ("llm", resources.llm_cache),
+        ("query_result", resources.query_result_cache),
+        ("artifacts", resources.artifact_store),
+    ]:
+        for stat, value in cache.stats().items():
+            stats[(("cache", cache_name), ("stat", stat))] = value
+    return stats
+
+
+metrics.register_gauge("cache", cache_stats, help="Hit, miss and size counters of the in-process caches.")
+
+
+@app.before_request
+def start_trace():
+    g.trace_id = request.headers.get("X-Trace-Id") or uuid.uuid4().hex
+    g.request_start_time = time.perf_counter()
+    g.trace = trace(g.trace_id)
+    g.trace_stages = g.trace.__enter__()
+
+
+def record_request(status):
+    """
+    Record the latency and trace of the current request.
+    """
+    elapsed = time.perf_counter() - g.request_start_time
+    endpoint = request.endpoint or "unknown"
+    metrics.observe("request_seconds", elapsed, help="Request latency by endpoint.", endpoint=endpoint)
+    metrics.inc("requests_total", help="Requests by endpoint and status.", endpoint=endpoint, status=status)
+
+    logger = request_loggers.get(endpoint)
+    if log and logger is not None:
+        breakdown = " ".join(f"{stage}={stage_elapsed:.2f}s" for stage, stage_elapsed in g.trace_stages)
+        logger.info(f"trace={g.trace_id} {endpoint} status={status} total={elapsed:.2f}s {breakdown} {g.get('trace_note', '')}".rstrip())
+
+
+@app.after_request
+def finish_trace(response):
+    response.headers["X-Trace-Id"] = g.trace_id
+    # A streamed response is only complete once its generator has run, which records it then
+    if not g.get("streaming"):
+        record_request(response.status_code)
+    return response
+
+
+@app.teardown_request
+def end_trace(exc):
+    request_trace = g.pop("trace", None)
+    if request_trace is not None:
+        request_trace.__exit__(None, None, None)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text by default, ?format=json for recent per-stage percentiles
+    if request.args.get("format") == "json":
+        return jsonify(metrics.summary()), 200
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def load_bundle(video_id):
+    """
+    Import the precomputed bundle of a video not stored yet, if there is one.
+    """
+    if app.config["BUNDLE_LAZY_LOAD"]:
+        with metrics.timed("bundle_lazy_load"):
+            if video_bundles.ensure_loaded(video_id):
+                store_video_logger.info(f"{video_id} Imported from its bundle.")
+
+
+def queue_video(video_id, youtube_url):
+    """
+    Returns:
+        str, dict: "Existed", "Processing" or "Queued", and the ingest job of the video.
+    """
+    job = ingest_service.get_job(video_id)
+    if job is None:
+        load_bundle(video_id)
+    # Check if the data has existed in db, for done jobs too as they can be left without data, e.g.
+    # after the store was wiped
+    if (job is None or job["state"] == DONE) and chroma_db.video_exists(video_id):
+        return "Existed", job or ingest_service.mark_done(video_id, youtube_url)
+    if job is not None and job["state"] not in (DONE, FAILED):
+        return "Processing", job
+    return "Queued", ingest_service.submit(video_id, youtube_url, requeue_done=True)
+
+
 @app.route('/store_video_data', methods=['POST'])
 def store_video_data():
-    store_video_data_start_time = time.time()
     youtube_url = request.json['youtube_url']
     try:
-        chroma_db = ChromaDBService()
-        yt = YouTubeService()
         video_id = YouTubeService.extract_video_id(youtube_url)
-        if video_id in queue_set:
-            return jsonify({"message": "Processing"}), 200
-        queue_set.add(video_id)
-
-        # Check if the data has existed in db
-        if chroma_db.video_exists(video_id):
-            return jsonify({"message": "Existed"}), 200
-
-        fetch_metadata_start_time = time.time()
-        title, description = yt.fetch_metadata(youtube_url)
-        fetch_metadata_end_time = time.time()
-        if log:
-            store_video_logger.info(f"{video_id} Fetch metadata Time taken: {fetch_metadata_end_time - fetch_metadata_start_time:.2f} seconds.")
-     
-        chroma_db.store_metadata(video_id, title, description)
-        store_metadata_end_time = time.time()
-        if log:
-            store_video_logger.info(f"{video_id} Store metadata Time taken: {store_metadata_end_time - fetch_metadata_end_time:.2f} seconds.")
-        
-        # Attempt to fetch subtitle
-        srt_file_path = yt.fetch_subtitle(youtube_url, log, store_video_logger, force_download_audio=False)
-        if srt_file_path is None:
-            return jsonify({"message": "Fail"}), 200
-
-        srt_content = ''
-        with open(srt_file_path, 'r', encoding='utf-8') as file:
-            srt_content = file.read()
-
-        store_subtitles_start_time = time.time()
-        chroma_db.store_subtitles(srt_content, video_id)
-        store_subtitles_end_time = time.time()
-        if log:
-            store_video_logger.info(f"{video_id} Store Subtitle Data Time taken: {store_subtitles_end_time - store_subtitles_start_time:.2f} seconds.")
-        
-        queue_set.remove(video_id)
-
-        store_video_data_end_time = time.time()
-        if log:
-            store_video_logger.info(f"{video_id} Store Video Data Time taken: {store_video_data_end_time - store_video_data_start_time:.2f} seconds.")
-        return jsonify({"message": "Sucess"}), 200
+        if video_id is None:
+            return jsonify({"error": "Invalid YouTube URL"}), 400
+
+        message, job = queue_video(video_id, youtube_url)
+        return jsonify({"message": message, "job": job}), 200 if message == "Existed" else 202
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@app.route('/store_videos_data', methods=['POST'])
+def store_videos_data():
+    youtube_urls = request.json.get('youtube_urls') or [request.json['youtube_url']]
+    max_videos = app.config["BULK_INGEST_MAX_VIDEOS"]
+    youtube = ingest_service.youtube
+
+    videos = {}
+    errors = {}
+    for youtube_url in youtube_urls:
+        try:
+            expanded = youtube.expand_url(youtube_url, max_videos)
+        except Exception as e:
+            errors[youtube_url] = str(e)
+            continue
+        if not expanded:
+            errors[youtube_url] = "Invalid YouTube URL"
+        for video_id, video_url in expanded:
+            videos.setdefault(video_id, video_url)
+
+    jobs = []
+    counts = Counter()
+    for video_id, video_url in list(videos.items())[:max_videos]:
+        message, job = queue_video(video_id, video_url)
+        counts[message] += 1
+        jobs.append(job)
+    return jsonify({"counts": counts, "jobs": jobs, "errors": errors}), 202 if jobs else 400
+
+
+@app.route('/ingest_status/<video_id>', methods=['GET'])
+def ingest_status(video_id):
+    job = ingest_service.get_job(video_id)
+    if job is None:
+        return jsonify({"error": "Unknown video"}), 404
+    return jsonify(job), 200
+
+
+@app.route('/search_library', methods=['POST'])
+def search_library():
+    """
+    Search every stored video for a query: the best videos with their best timestamps, optionally
+    limited to a channel or a range of upload dates (YYYY-MM-DD).
+    """
+    query_text = request.json['query_text']
+    g.trace_note = f"library query={query_text!r}"
+    try:
+        videos = chroma_db.library_search(
+            query_text,
+            top_k=int(request.json.get('top_k') or app.config["LIBRARY_SEARCH_TOP_K"]),
+            segments_per_video=int(request.json.get('timestamps_per_video') or 3),
+            channel=request.json.get('channel'),
+            uploaded_after=parse_upload_date(request.json.get('uploaded_after')),
+            uploaded_before=parse_upload_date(request.json.get('uploaded_before')),
+            max_segments=app.config["LIBRARY_SEARCH_MAX_SEGMENTS"],
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"videos": [
+        {
+            "video_id": video["video_id"],
+            "youtube_url": YouTubeService.watch_url(video["video_id"]),
+            "title": video["title"],
+            "channel": video["channel"],
+            "upload_date": video["upload_date"],
+            "score": video["score"],
+            "timestamps": [[format_hms(parse_timestamp_seconds(s["start"])), s["text"]] for s in video["segments"]],
+        }
+        for video in videos
+    ]}), 200
+
+
+def search_query_text(video_id, query_text):
+    """
+    Coarse-to-fine vector search of the query text: the closest chapters of the video first, then the
+    segments within them. Falls back to the whole video without a chapter index or chapter matches.
+
+    Returns:
+        list of dict, tuple: The chapters searched (empty for the whole video) and the `vector_search` results.
+    """
+    # Ingest gives way to the embedding and search, but not to the LLM calls around them
+    with resources.query_priority.query():
+        chapters = chroma_db.search_chapters(query_text, video_id, app.config["CHAPTER_TOP_K"]) if app.config["CHAPTER_INDEX"] else []
+        if chapters:
+            segment_ranges = [(chapter["first_segment"], chapter["last_segment"]) for chapter in chapters]
+            results = chroma_db.vector_search([query_text], video_id, segment_ranges=segment_ranges)
+            if results[1]:
+                return chapters, results
+        return [], chroma_db.vector_search([query_text], video_id)
+
+
+def is_simple_query(video_id, query_text):
+    """
+    A short query whose terms all occur in the video is answered well by the query itself, without
+    LLM-generated keywords.
+    """
+    max_terms = app.config["SIMPLE_QUERY_MAX_TERMS"]
+    if not max_terms or chroma_db.lexical_index is None or len(tokenize(query_text)) > max_terms:
+        return False
+    index = chroma_db.lexical_index.get(video_id)
+    return index is not None and index.covers(query_text)
+
+
+def fast_path_answer(query_results):
+    """
+    Answer a query from the vector matches of its text when the best one is an obvious match.
+
+    Returns:
+        list of (str, str): Timestamps with the segment texts as reasons, or None if the LLM should rank
+            the candidates.
+    """
+    confidence, timestamps = confidence_gate.answer(query_results)
+    metrics.observe("query_confidence", confidence, help="Confidence of the best vector match of a query.", buckets=RATIO_BUCKETS)
+    metrics.inc("query_path_total", help="Queries by answer path, fast ones skip the LLM.", path="llm" if timestamps is None else "fast")
+    if timestamps is not None:
+        g.trace_note += f" fast_path confidence={confidence:.2f}"
+    return timestamps
+
+
+def submit_query_task(fn, *args):
+    """
+    Run `fn` on the query executor with the context of the request, so its stages land in its trace.
+    """
+    return resources.query_executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def generate_keywords(llm, video_id, title, description, query_text):
+    """
+    Returns:
+        list of str: LLM-generated search keywords of the query, none for simple queries.
+    """
+    if is_simple_query(video_id, query_text):
+        metrics.inc("keyword_llm_skipped_total", help="Queries answered without the keyword LLM call.")
+        return []
+    keywords = llm.generate_rag_keywords(title, description, query_text)
+    return [keyword for keyword in keywords if keyword and keyword != query_text]
+
+
+def retrieve_candidates(llm, video_id, title, description, query_text, query_search=None, keywords=None):
+    """
+    Args:
+        query_search (tuple or Future, optional): `search_query_text` results, if already known or started.
+        keywords (Future, optional): `generate_keywords` call, if already started.
+
+    Returns:
+        list of dict, list of dict: The fused segments matching the query and its keywords, and the
+            chapters they were searched in.
+    """
+    # The search of the query text does not depend on the keywords, so it runs on the query executor
+    # while the keyword LLM call is in flight
+    if query_search is None:
+        query_search = submit_query_task(search_query_text, video_id, query_text)
+    if keywords is None:
+        keywords = generate_keywords(llm, video_id, title, description, query_text)
+    else:
+        keywords = keywords.result()
+    chapters, query_results = query_search if isinstance(query_search, tuple) else query_search.result()
+    results = [query_results]
+
+    with resources.query_priority.query():
+        lexical = None
+        if app.config["HYBRID_SEARCH"]:
+            lexical = chroma_db.lexical_search([query_text] + keywords, video_id)
+        if lexical is not None:
+            results.append(lexical)
+        else:
+            results.append(chroma_db.vector_search(keywords, video_id))
+        return chroma_db.fuse_search_results(results), chapters
+
+
+def video_missing_message(video_id):
+    job = ingest_service.get_job(video_id)
+    if job is not None and job["state"] not in (DONE, FAILED):
+        return "Video is still being ingested, try again shortly"
+    return "Video is not stored, ingest it with /store_video_data first"
+
+
+def query_cache_key(video_id, query_text):
+    # Results of other embedding models stay apart, e.g. after a re-embed into a new shared collection
+    return ResponseCache.make_key(video_id, chroma_db.embedding_backend.name, normalize_query(query_text))
+
+
+def cache_query_result(video_id, cache_key, timestamps):
+    # Results over a partially ingested video would go stale once ingest finishes. Entries are tagged
+    # with the video, so they are invalidated whenever its segments are rewritten
+    job = ingest_service.get_job(video_id)
+    if job is None or job["state"] == DONE:
+        resources.query_result_cache.set(cache_key, timestamps, tag=video_id)
+
+
 @app.route('/query_timestamp', methods=['POST'])
 def query_timestamp():
-    print(request.json)
     query_text = request.json['query_text']
     youtube_url = request.json['youtube_url']
 
     try:
         video_id = YouTubeService.extract_video_id(youtube_url)
+        if video_id is None:
+            return jsonify({"error": "Invalid YouTube URL"}), 400
+        g.trace_note = f"video={video_id} query={query_text!r}"
+
+        cache_key = query_cache_key(video_id, query_text)
+        timestamps = resources.query_result_cache.get(cache_key)
+        if timestamps is not None:
+            g.trace_note += " cache=hit"
+            return jsonify(timestamps), 200
 
-        chroma_db = ChromaDBService()
-        title, description = chroma_db.get_metadata_by_video_id(video_id)
+        load_bundle(video_id)
+        if not chroma_db.video_exists(video_id):
+            return jsonify({"error": video_missing_message(video_id)}), 404
 
-        llm = LLMService()
-        keywords = llm.generate_rag_keywords(title, description, query_text)
-        candidates = set(chroma_db.find_subtitle_by_query(query_text, video_id))
+        with metrics.timed("metadata_lookup"):
+            title, description = chroma_db.get_metadata_by_video_id(video_id)
+        llm = LLMService(model=resources.llm_model, client=resources.llm_client, cache=resources.llm_cache, context_packer=context_packer)
 
-        # candidates = []
-        for k in keywords:
-            # candidates += [s[0] for s in chroma_db.find_subtitle_by_query(k, video_id)]
-            pairs = chroma_db.find_subtitle_by_query(k, video_id)
-            for p in pairs:
-                candidates.add(p)
+        # With the fast path on, the keyword call only starts once the matches of the query text have
+        # not answered the query on their own, so fast-path queries never pay for it
+        query_search = None
+        if confidence_gate.enabled:
+            query_search = search_query_text(video_id, query_text)
+            timestamps = fast_path_answer(query_search[1])
+            if timestamps is not None:
+                cache_query_result(video_id, cache_key, timestamps)
+                return jsonify(timestamps), 200
 
-        # cnt = Counter(candidates)
-        candidates = list(candidates)
-        timestamps = llm.get_recommended_timestamps(title, description, query_text, candidates)
-        
+        candidates, chapters = retrieve_candidates(llm, video_id, title, description, query_text, query_search)
+        timestamps = llm.get_recommended_timestamps(title, description, query_text, candidates, chapters)
+        cache_query_result(video_id, cache_key, timestamps)
         return jsonify(timestamps), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/query_timestamp/stream', methods=['POST'])
+def query_timestamp_stream():
+    """
+    Server-sent events for a query: `candidates` with the vector matches of the query text as soon as
+    they are found, `timestamps` each time the LLM ranking completes another timestamp, and `done` with
+    the same result as /query_timestamp. Failures end the stream with an `error` event.
+    """
+    query_text = request.json['query_text']
+    youtube_url = request.json['youtube_url']
+    video_id = YouTubeService.extract_video_id(youtube_url)
+    if video_id is None:
+        return jsonify({"error": "Invalid YouTube URL"}), 400
+    g.trace_note = f"video={video_id} query={query_text!r} stream"
+    g.streaming = True
+
+    def events():
+        try:
+            yield from query_events()
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            record_request(200)
+
+    def query_events():
+        cache_key = query_cache_key(video_id, query_text)
+        timestamps = resources.query_result_cache.get(cache_key)
+        if timestamps is not None:
+            yield sse_event("done", timestamps)
+            return
+
+        load_bundle(video_id)
+        if not chroma_db.video_exists(video_id):
+            yield sse_event("error", {"error": video_missing_message(video_id)})
+            return
+        with metrics.timed("metadata_lookup"):
+            title, description = chroma_db.get_metadata_by_video_id(video_id)
+        llm = LLMService(model=resources.llm_model, client=resources.llm_client, cache=resources.llm_cache, context_packer=context_packer)
+
+        # As in /query_timestamp, the keyword call overlaps the search of the query text unless the
+        # fast path may answer the query without it
+        keywords = None if confidence_gate.enabled else submit_query_task(generate_keywords, llm, video_id, title, description, query_text)
+        query_search = search_query_text(video_id, query_text)
+        candidates = chroma_db.fuse_search_results([query_search[1]])
+        yield sse_event("candidates", [[format_hms(parse_timestamp_seconds(c["start"])), c["text"]] for c in candidates])
+        timestamps = fast_path_answer(query_search[1]) if confidence_gate.enabled else None
+        if timestamps is not None:
+            cache_query_result(video_id, cache_key, timestamps)
+            yield sse_event("done", timestamps)
+            return
+
+        candidates, chapters = retrieve_candidates(llm, video_id, title, description, query_text, query_search, keywords)
+
+        # Each partial is sent once the next one arrives, so the last one goes out as `done` only
+        timestamps = None
+        for partial in llm.stream_recommended_timestamps(title, description, query_text, candidates, chapters):
+            if timestamps is not None:
+                yield sse_event("timestamps", timestamps)
+            timestamps = partial
+        if timestamps is None:
+            yield sse_event("error", {"error": "The LLM response held no timestamps"})
+            return
+        cache_query_result(video_id, cache_key, timestamps)
+        yield sse_event("done", timestamps)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
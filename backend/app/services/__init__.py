@@ -1,5 +1,12 @@
 from .youtube_service import YouTubeService
 from .chromadb_service import ChromaDBService
 from .llm_service import LLMService
+from .ingest_service import IngestService
+from .lexical_index import LexicalIndexService
+from .chapter_index import ChapterIndexService
+from .context_packer import ContextPacker
+from .transcript_resolver import TranscriptResolver
+from .confidence import ConfidenceGate
+from .video_bundle import VideoBundleService
 
-__all__ = ["YouTubeService", "ChromaDBService", "LLMService"]
\ No newline at end of file
+__all__ = ["YouTubeService", "ChromaDBService", "LLMService", "IngestService", "LexicalIndexService", "ChapterIndexService", "ContextPacker", "TranscriptResolver", "ConfidenceGate", "VideoBundleService"]
\ No newline at end of file
@@ -0,0 +1,249 @@
+import hashlib
+import re
+
+import numpy as np
+
+from app.utils import format_hms
+
+
+def normalize_rows(rows):
+    """
+    Returns:
+        np.ndarray: float32 copy of `rows` with every row scaled to unit length.
+    """
+    rows = np.array(rows, dtype=np.float32)
+    rows /= np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+    return rows
+
+
+def topical_windows(starts, embeddings, min_seconds=60, max_seconds=300, depth=0.5):
+    """
+    Split a video into topical windows where the similarity between neighbouring segments drops.
+
+    Every boundary is scored by the cosine similarity of the mean embeddings of the segments on either
+    side of it (TextTiling with embeddings). A window is closed at a local minimum lower than `depth`
+    standard deviations below the mean score once it is `min_seconds` long, and always at `max_seconds`.
+
+    Args:
+        starts (list of float): Segment start times in seconds, ascending.
+        embeddings (np.ndarray): Segment embeddings, one row per segment, read a few rows at a time.
+
+    Returns:
+        list of (int, int): First and last-plus-one segment index of every window.
+    """
+    count = len(starts)
+    if count < 2:
+        return [(0, count)] if count else []
+
+    side = 3
+    scores = np.ones(count)
+    for i in range(1, count):
+        rows = normalize_rows(embeddings[max(0, i - side):i + side])
+        before = rows[:min(i, side)].mean(axis=0)
+        after = rows[min(i, side):].mean(axis=0)
+        scores[i] = before @ after / max(np.linalg.norm(before) * np.linalg.norm(after), 1e-12)
+    threshold = scores[1:].mean() - depth * scores[1:].std()
+
+    windows = []
+    window_start = 0
+    for i in range(1, count):
+        duration = starts[i] - starts[window_start]
+        is_minimum = scores[i] <= scores[i - 1] and (i + 1 == count or scores[i] <= scores[i + 1])
+        if duration >= max_seconds or (duration >= min_seconds and is_minimum and scores[i] < threshold):
+            windows.append((window_start, i))
+            window_start = i
+    windows.append((window_start, count))
+    return windows
+
+
+def chapter_windows(starts, chapters):
+    """
+    Map YouTube chapters onto segment index ranges.
+
+    Args:
+        starts (list of float): Segment start times in seconds, ascending.
+        chapters (list of dict): yt_dlp chapters with "start_time", "end_time" and "title".
+
+    Returns:
+        list of (int, int, str): First and last-plus-one segment index and title of every non-empty chapter.
+    """
+    starts = np.asarray(starts)
+    windows = []
+    for chapter in chapters:
+        first, last = np.searchsorted(starts, [chapter["start_time"], chapter["end_time"]], side="left")
+        if last > first:
+            windows.append((int(first), int(last), chapter.get("title") or ""))
+    return windows
+
+
+def summarize(texts, embeddings, centroid, max_sentences=2, max_chars=300):
+    """
+    Extractive summary: the sentences closest to the window centroid, in their original order.
+    """
+    closest = np.argsort(-(embeddings @ centroid))[:max_sentences]
+    summary = " ".join(texts[i].strip() for i in sorted(closest))
+    return summary if len(summary) <= max_chars else summary[:max_chars - 3].rstrip() + "..."
+
+
+class ChapterIndexService:
+    def __init__(self, chroma_client, collection_name="chapters", min_seconds=60, max_seconds=300):
+        """
+        Store a chapter index per video: topical windows of its segments with their centroid embedding,
+        title and short summary. Chroma fixes the dimension of a collection on its first insert, so
+        there is one collection per embedding model (`{collection_name}_{model}`), holding all videos.
+        Indexes built before that live in `collection_name`, they are no longer searched and are
+        replaced by the next build of the video.
+
+        Args:
+            chroma_client (chromadb.ClientAPI): client of the subtitle store.
+            collection_name (str): prefix of the chapter collection names.
+            min_seconds (float): shortest window cut without YouTube chapters.
+            max_seconds (float): longest window cut without YouTube chapters.
+        """
+        self.chroma_client = chroma_client
+        self.collection_name = collection_name
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+
+
+    def collection_name_for(self, embedding_model):
+        """
+        Returns:
+            str: name of the chapter collection of `embedding_model`, a valid Chroma name whatever the
+                characters of the model name. The hash keeps names that sanitize the same apart.
+        """
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", embedding_model).strip("_-")[:40]
+        digest = hashlib.sha1(embedding_model.encode("utf-8")).hexdigest()[:8]
+        return f"{self.collection_name}_{slug}_{digest}" if slug else f"{self.collection_name}_{digest}"
+
+
+    def __collection(self, embedding_model):
+        return self.chroma_client.get_or_create_collection(name=self.collection_name_for(embedding_model))
+
+
+    def __collections(self):
+        """
+        Returns:
+            list of chromadb.Collection: the chapter collections of every embedding model, the one of
+                indexes built before there was one collection per model included.
+        """
+        names = [getattr(c, "name", c) for c in self.chroma_client.list_collections()]
+        return [
+            self.chroma_client.get_collection(name=name) for name in sorted(names)
+            if name == self.collection_name or name.startswith(f"{self.collection_name}_")
+        ]
+
+
+    def build(self, video_id, segments, embeddings, embedding_model, youtube_chapters=None):
+        """
+        Build and store the chapter index of a video, replacing any previous one.
+
+        Args:
+            video_id (str): Id of the video.
+            segments (list of Segment): Segments in storage order.
+            embeddings (array-like): Segment embeddings in the same order. Arrays, e.g. memory-mapped ones,
+                are read one window at a time.
+            embedding_model (str): name of the backend of `embeddings`, only queries embedded with it match.
+            youtube_chapters (list of dict, optional): yt_dlp chapters, used as windows when present.
+
+        Returns:
+            list of dict: Metadata of the stored chapters.
+        """
+        # Chapters of other models stay, in shared mode the old configuration serves queries until the
+        # switch to a re-embedded collection
+        collection = self.__collection(embedding_model)
+        for stale in [collection] + [c for c in self.__collections() if c.name == self.collection_name]:
+            stale.delete(where={"video_id": video_id})
+        if not segments:
+            return []
+
+        vectors = embeddings if isinstance(embeddings, np.ndarray) else np.asarray(embeddings, dtype=np.float32)
+        starts = [seg.start for seg in segments]
+        windows = chapter_windows(starts, youtube_chapters) if youtube_chapters else []
+        if not windows:
+            windows = [(first, last, "") for first, last in topical_windows(starts, vectors, self.min_seconds, self.max_seconds)]
+
+        ids, centroids, metadatas = [], [], []
+        for i, (first, last, title) in enumerate(windows):
+            window = normalize_rows(vectors[first:last])
+            centroid = window.mean(axis=0)
+            centroid /= max(np.linalg.norm(centroid), 1e-12)
+            texts = [seg.text for seg in segments[first:last]]
+            ids.append(f"{video_id}_chapter_{i}")
+            centroids.append(centroid.tolist())
+            metadatas.append({
+                "video_id": video_id,
+                "embedding_model": embedding_model,
+                "title": title,
+                "summary": summarize(texts, window, centroid),
+                "start_seconds": float(segments[first].start),
+                "end_seconds": float(segments[last - 1].end),
+                "first_segment": first,
+                "last_segment": last,
+                "chapter_count": len(windows),
+            })
+        collection.add(ids=ids, embeddings=centroids, metadatas=metadatas)
+        return metadatas
+
+
+    def search(self, query_embedding, video_id, embedding_model, top_k=3):
+        """
+        Returns:
+            list of dict: Metadata of the `top_k` chapters closest to the query, with their "distance". Empty
+                if the video has no chapter index built with `embedding_model`, or one built before the
+                chapter count was recorded.
+        """
+        # Chroma resolves metadata filters over the rows of every collection, so a `video_id` filter gets
+        # slower with each stored video, while an id filter does not. The first chapter of a video
+        # records how many there are
+        collection = self.__collection(embedding_model)
+        first = collection.get(ids=[f"{video_id}_chapter_0"], include=["metadatas"])["metadatas"]
+        if not first or "chapter_count" not in first[0]:
+            return []
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_k,
+            ids=[f"{video_id}_chapter_{i}" for i in range(first[0]["chapter_count"])],
+            include=["metadatas", "distances"],
+        )
+        return [
+            {**metadata, "distance": distance}
+            for metadata, distance in zip(results["metadatas"][0], results["distances"][0])
+        ]
+
+
+    def youtube_chapters(self, video_id):
+        """
+        Returns:
+            list of dict: The stored chapters of a video that came from YouTube, in the yt_dlp format, so
+                they survive a rebuild, e.g. after re-embedding.
+        """
+        chapters = []
+        for collection in self.__collections():
+            chapters = collection.get(where={"video_id": video_id}, include=["metadatas"])["metadatas"]
+            if chapters:
+                break
+        return [
+            {"start_time": chapter["start_seconds"], "end_time": chapter["end_seconds"], "title": chapter["title"]}
+            for chapter in sorted(chapters, key=lambda c: c["start_seconds"])
+            if chapter.get("title")
+        ]
+
+
+    def delete(self, video_id):
+        """
+        Delete the chapter index of a video, whatever embedding model it was built with.
+        """
+        for collection in self.__collections():
+            collection.delete(where={"video_id": video_id})
+
+
+def format_chapters(chapters):
+    """
+    Render chapters as prompt lines ordered by time, e.g. `- 00:04:10 Gradient descent: summary`.
+    """
+    lines = []
+    for chapter in sorted(chapters, key=lambda c: c["start_seconds"]):
+        title = f" {chapter['title']}" if chapter.get("title") else ""
+        lines.append(f"- {format_hms(chapter['start_seconds'])}{title}: {chapter['summary']}")
+    return "\n".join(lines)
@@ -1,20 +1,86 @@
 import chromadb
 from chromadb.config import DEFAULT_TENANT, DEFAULT_DATABASE, Settings
-import ollama
-from app.utils import parse_srt
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.services.embedding_backend import OllamaEmbeddingBackend
+from app.metrics import metrics
+from app.utils import Segment, format_timestamp, parse_srt, parse_timestamp_seconds, reciprocal_rank_fusion
+
+PER_VIDEO = "per_video"
+SHARED = "shared"
+# Collections created before the embedding model was recorded were filled through Ollama's
+# /api/embeddings, whose vectors are not normalized unlike those of /api/embed used now, so they are
+# a vector space of their own and have to be re-embedded
+LEGACY_EMBEDDING_MODEL = "ollama-legacy:llama3.2"
+
+
+class EmbeddingModelMismatchError(ValueError):
+    """
+    A collection holds vectors from a different embedding model than the one configured.
+    """
+
+
+class VideoNotStoredError(LookupError):
+    """
+    The video has no stored subtitles or metadata, it has to be ingested first.
+    """
+
 
 class ChromaDBService:
-    def __init__(self, chroma_persist_dir="db/chroma"):
+    def __init__(self, chroma_persist_dir="db/chroma", embedding_batch_size=64, embedding_max_workers=4, chroma_client=None,
+                 storage_mode=PER_VIDEO, shared_collection_name="subtitles", embedding_cache=None, lexical_index=None,
+                 embedding_backend=None, metadata_embedding_function=None, ingest_embedding_backend=None, chapter_index=None,
+                 query_priority=None, result_cache=None):
         """
         Initialize ChromaDB manager.
+
+        Args:
+            chroma_persist_dir (str): path of the ChromaDB directory.
+            embedding_batch_size (int): number of segments embedded and added per chunk.
+            embedding_max_workers (int): max concurrent embedding requests when the batch API is unavailable.
+            chroma_client (chromadb.ClientAPI, optional): shared client to reuse instead of opening a new one.
+            storage_mode (str): "per_video" keeps one `subtitles_{video_id}` collection per video, "shared" keeps
+                all segments in one collection filtered by a `video_id` metadata field.
+            shared_collection_name (str): name of the collection used in "shared" mode.
+            embedding_cache (EmbeddingCache, optional): cache consulted before every embedding request.
+            lexical_index (LexicalIndexService, optional): per-video BM25 indexes built alongside stored subtitles.
+            embedding_backend (EmbeddingBackend, optional): model used for segment and query embeddings,
+                Ollama `llama3.2` by default.
+            metadata_embedding_function (chromadb.EmbeddingFunction, optional): embedding function of the
+                metadata collection, Chroma's default model when omitted.
+            ingest_embedding_backend (EmbeddingBackend, optional): backend for stored segments, e.g. a batching
+                wrapper of `embedding_backend`, so queries do not wait behind ingest batches. Must produce the
+                same vectors as `embedding_backend`.
+            chapter_index (ChapterIndexService, optional): per-video chapter index for coarse-to-fine search.
+            query_priority (QueryPriority, optional): queries in flight that `store_subtitle_segments`
+                gives way to between its steps.
+            result_cache (ResponseCache, optional): cache of results computed from the stored segments,
+                whose entries tagged with a video id are invalidated whenever that video's segments change.
         """
+        if storage_mode not in (PER_VIDEO, SHARED):
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        self.storage_mode = storage_mode
+        self.shared_collection_name = shared_collection_name
+        self.embedding_cache = embedding_cache
+        self.lexical_index = lexical_index
         self.chroma_persist_dir = chroma_persist_dir
-        self.chroma_client = chromadb.PersistentClient(
-            path=self.chroma_persist_dir,
-            settings=Settings(),
-            tenant=DEFAULT_TENANT,
-            database=DEFAULT_DATABASE,
-        )
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_max_workers = embedding_max_workers
+        self.embedding_backend = embedding_backend or OllamaEmbeddingBackend(max_workers=embedding_max_workers)
+        self.metadata_embedding_function = metadata_embedding_function
+        self.ingest_embedding_backend = ingest_embedding_backend or self.embedding_backend
+        self.chapter_index = chapter_index
+        self.query_priority = query_priority
+        self.result_cache = result_cache
+        if chroma_client is None:
+            chroma_client = chromadb.PersistentClient(
+                path=self.chroma_persist_dir,
+                settings=Settings(),
+                tenant=DEFAULT_TENANT,
+                database=DEFAULT_DATABASE,
+            )
+        self.chroma_client = chroma_client
 
 
     def video_exists(self, video_id):
@@ -27,21 +93,130 @@ class ChromaDBService:
         Returns:
             bool: True if the video data exists, False otherwise.
         """
-        collection_name = f"subtitles_{video_id}"
-        collections = self.chroma_client.list_collections()
-        return any(collection.name == collection_name for collection in collections)
+        # The collection alone proves nothing, a per-video one may have been left empty by a failed ingest
+        try:
+            collection, _ = self._subtitle_collection(video_id, check_model=False)
+        except VideoNotStoredError:
+            return False
+        return len(collection.get(ids=[f"{video_id}_segment_0"], include=[])["ids"]) > 0
+
+
+    def _subtitle_collection(self, video_id, check_model=True, create=False):
+        """
+        Get the collection holding the subtitles of a video and the filter selecting them.
+
+        Args:
+            video_id (str): Id of the video.
+            check_model (bool): raise if the collection was embedded with another model.
+            create (bool): create the collection if it is missing, only for writes.
+
+        Returns:
+            (chromadb.Collection, dict or None): The collection and its `where` filter.
+
+        Raises:
+            VideoNotStoredError: The collection does not exist and `create` is False.
+        """
+        if self.storage_mode == SHARED:
+            name, where = self.shared_collection_name, {"video_id": video_id}
+        else:
+            name, where = f"subtitles_{video_id}", None
+        if create:
+            collection = self.chroma_client.get_or_create_collection(name=name)
+        else:
+            try:
+                collection = self.chroma_client.get_collection(name=name)
+            except Exception as e:
+                raise VideoNotStoredError(f"{video_id} is not stored.") from e
+        if check_model:
+            self.__check_embedding_model(collection)
+        return collection, where
+
+
+    def collection_embedding_model(self, collection):
+        """
+        Get the embedding model recorded on a collection, recording the configured one on new
+        empty collections and the legacy model on older non-empty ones.
 
+        Returns:
+            str: Name of the embedding backend that produced the collection's vectors.
+        """
+        metadata = collection.metadata or {}
+        model = metadata.get("embedding_model")
+        if model is None:
+            model = self.embedding_backend.name if collection.count() == 0 else LEGACY_EMBEDDING_MODEL
+            collection.modify(metadata={**metadata, "embedding_model": model})
+        return model
+
+
+    def __check_embedding_model(self, collection):
+        model = self.collection_embedding_model(collection)
+        if model != self.embedding_backend.name:
+            raise EmbeddingModelMismatchError(
+                f"Collection {collection.name} was embedded with {model}, not {self.embedding_backend.name}. "
+                "Run `flask reembed` to migrate it."
+            )
+
+
+    def embed_texts(self, texts, backend=None):
+        """
+        Embed a list of texts in one batch.
+
+        Texts found in the embedding cache are not sent to the embedding backend.
+
+        Args:
+            texts (list of str): Texts to embed.
+            backend (EmbeddingBackend, optional): backend to compute missing embeddings, `embedding_backend`
+                by default.
 
-    def store_metadata(self, video_id, title, description):
+        Returns:
+            list of list of float: Embeddings in the same order as `texts`.
         """
-        Store title, description into a ChromaDB collection.
+        if not texts:
+            return []
+        backend = backend or self.embedding_backend
+        if self.embedding_cache is None:
+            with metrics.timed("embedding"):
+                return backend.embed(texts)
+
+        model = self.embedding_backend.name
+        embeddings = self.embedding_cache.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            with metrics.timed("embedding"):
+                computed = dict(zip(missing, backend.embed(missing)))
+            self.embedding_cache.put_many(model, missing, [computed[text] for text in missing])
+            embeddings = [computed[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+
+    def __metadata_collection(self):
+        if self.metadata_embedding_function is None:
+            return self.chroma_client.get_or_create_collection(name="metadata")
+        return self.chroma_client.get_or_create_collection(name="metadata", embedding_function=self.metadata_embedding_function)
+
+
+    def store_metadata(self, video_id, title, description, channel=None, upload_date=None, bundle_id=None):
         """
-        metadata_collection = self.chroma_client.get_or_create_collection(name="metadata")
-        metadata_collection.add(
+        Store title, description into a ChromaDB collection, replacing those of a previous ingest.
+
+        Args:
+            channel (str, optional): channel name, for library search filters.
+            upload_date (int, optional): upload date as YYYYMMDD, for library search filters.
+            bundle_id (str, optional): id of the bundle the video was imported from.
+        """
+        fields = {"video_id": video_id}
+        if bundle_id:
+            fields["bundle_id"] = bundle_id
+        if channel:
+            fields["channel"] = channel
+        if upload_date:
+            fields["upload_date"] = int(upload_date)
+        metadata_collection = self.__metadata_collection()
+        metadata_collection.upsert(
             documents=[title, description],
             metadatas=[
-                {"type": "title"},
-                {"type": "description"},
+                {"type": "title", **fields},
+                {"type": "description", **fields},
             ],
             ids=[f"{video_id}_title", f"{video_id}_description"]
         )
@@ -51,63 +226,571 @@ class ChromaDBService:
         """
         Store subtitles into a ChromaDB collection.
         """
-        segments = parse_srt(srt_text)
+        self.store_subtitle_segments(parse_srt(srt_text), video_id)
+        collection, _ = self._subtitle_collection(video_id)
+        return collection.name
+
+
+    def __invalidate_results(self, video_id):
+        if self.result_cache is not None:
+            self.result_cache.invalidate(video_id)
 
-        collection_name = f"subtitles_{video_id}"
-        collection = self.chroma_client.get_or_create_collection(name=collection_name)
 
-        for i, seg in enumerate(segments):
-            response = ollama.embeddings(model="llama3.2", prompt=seg["text"])
-            embedding = response["embedding"]
-            collection.add(
-                ids=[f"{video_id}_segment_{i}"],
-                embeddings=[embedding],
-                metadatas=[seg]
+    def __yield_to_queries(self):
+        if self.query_priority is not None:
+            self.query_priority.yield_to_queries()
+
+
+    def __add_segments(self, collection, video_id, offset, chunk):
+        self.__yield_to_queries()
+        embeddings = self.embed_texts([seg.text for seg in chunk], self.ingest_embedding_backend)
+        self.__yield_to_queries()
+        self.__upsert_segments(collection, video_id, offset, chunk, embeddings)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+    @staticmethod
+    def __upsert_segments(collection, video_id, offset, chunk, embeddings):
+        # Upserts, so a partial or repeated ingest overwrites the segments it already stored
+        with metrics.timed("chroma_add"):
+            collection.upsert(
+                ids=[f"{video_id}_segment_{i}" for i in range(offset, offset + len(chunk))],
+                embeddings=embeddings,
+                metadatas=[{**seg.to_metadata(), "video_id": video_id} for seg in chunk]
             )
-        return collection_name
-    
 
-    def find_subtitle_by_query(self, user_query, video_id, max_results_len=5, distance_threshold_ratio=1.03):
+
+    def store_subtitle_segments(self, segments, video_id, flush_interval=5.0, youtube_chapters=None):
+        """
+        Embed and store subtitle segments while they are still being produced.
+
+        Segments are consumed from any iterable, e.g. a transcription generator. A chunk is written
+        once it holds `embedding_batch_size` segments or `flush_interval` seconds have passed since the
+        last write, so early segments become queryable before the iterable is exhausted. Embedding of
+        one chunk runs in the background while the next one is being collected. The lexical and chapter
+        indexes of the video are built once all segments are stored.
+
+        Args:
+            segments (iterable of Segment): Merged subtitle segments.
+            video_id (str): Id of the video.
+            flush_interval (float): max seconds a partial chunk is held back.
+            youtube_chapters (list of dict, optional): yt_dlp chapters used as the video's chapter index.
+
+        Returns:
+            int: Number of stored segments.
         """
-        Find the most relevant subtitle segment based on user input.
+        collection, _ = self._subtitle_collection(video_id, create=True)
+        offset = 0
+        chunk = []
+        last_flush_time = time.time()
+        pending = None
+        stored_segments = []
+        # Kept for the chapter index, so it does not embed the segments a second time
+        stored_embeddings = []
+
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            for seg in segments:
+                chunk.append(seg)
+                stored_segments.append(seg)
+                if len(chunk) < self.embedding_batch_size and time.time() - last_flush_time < flush_interval:
+                    continue
+                # Keep at most one chunk in flight so memory stays bounded when embedding falls behind
+                if pending is not None:
+                    stored_embeddings.append(pending.result())
+                pending = writer.submit(self.__add_segments, collection, video_id, offset, chunk)
+                offset += len(chunk)
+                chunk = []
+                last_flush_time = time.time()
+
+            if pending is not None:
+                stored_embeddings.append(pending.result())
+            if chunk:
+                stored_embeddings.append(self.__add_segments(collection, video_id, offset, chunk))
+                offset += len(chunk)
+
+        if self.lexical_index is not None and stored_segments:
+            self.__yield_to_queries()
+            self.lexical_index.build(video_id, stored_segments)
+        if self.chapter_index is not None and stored_segments:
+            self.__yield_to_queries()
+            self.build_chapter_index(video_id, stored_segments, youtube_chapters, embeddings=np.concatenate(stored_embeddings))
+        self.__invalidate_results(video_id)
+        return offset
+
+
+    def delete_segments(self, video_id):
+        """
+        Delete the stored segments of a video with its lexical and chapter indexes, e.g. before it is
+        ingested again, so no segment of an earlier attempt outlives a shorter transcript. Its metadata
+        is kept.
 
         Args:
-            user_query (str): The user's text query.
+            video_id (str): Id of the video.
+        """
+        try:
+            collection, where = self._subtitle_collection(video_id, check_model=False)
+        except VideoNotStoredError:
+            collection = None
+        if collection is not None and self.storage_mode == PER_VIDEO:
+            self.chroma_client.delete_collection(name=collection.name)
+        elif collection is not None:
+            stored = collection.get(where=where, include=[])["ids"]
+            if stored:
+                collection.delete(ids=stored)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(video_id)
+        if self.chapter_index is not None:
+            self.chapter_index.delete(video_id)
+        self.__invalidate_results(video_id)
+
+
+    def get_segments(self, video_id):
+        """
+        Get the stored segments of a video in storage order.
+
+        Args:
+            video_id (str): Id of the video.
+
+        Returns:
+            list of Segment: The stored segments, empty if the video is not stored.
+        """
+        try:
+            collection, where = self._subtitle_collection(video_id, check_model=False)
+        except VideoNotStoredError:
+            return []
+        data = collection.get(where=where, include=["metadatas"])
+        prefix = f"{video_id}_segment_"
+        ordered = sorted(zip(data["ids"], data["metadatas"]), key=lambda item: int(item[0][len(prefix):]))
+        return [
+            Segment(
+                metadata.get("start_seconds", parse_timestamp_seconds(metadata["start"])),
+                metadata.get("end_seconds", parse_timestamp_seconds(metadata["start"])),
+                metadata["text"],
+            )
+            for _, metadata in ordered
+        ]
+
+
+    def get_segment_embeddings(self, video_id):
+        """
+        Get the stored segments of a video with their embeddings, e.g. to export them.
+
+        Args:
+            video_id (str): Id of the video.
+
+        Returns:
+            list of Segment, numpy.ndarray: The segments in storage order and their embeddings as a
+                float32 array of one row per segment.
+        """
+        collection, where = self._subtitle_collection(video_id)
+        data = collection.get(where=where, include=["metadatas", "embeddings"])
+        prefix = f"{video_id}_segment_"
+        order = sorted(range(len(data["ids"])), key=lambda i: int(data["ids"][i][len(prefix):]))
+        segments = [
+            Segment(
+                data["metadatas"][i].get("start_seconds", parse_timestamp_seconds(data["metadatas"][i]["start"])),
+                data["metadatas"][i].get("end_seconds", parse_timestamp_seconds(data["metadatas"][i]["start"])),
+                data["metadatas"][i]["text"],
+            )
+            for i in order
+        ]
+        embeddings = np.asarray([data["embeddings"][i] for i in order], dtype=np.float32)
+        return segments, embeddings
+
+
+    def store_segment_embeddings(self, segments, embeddings, video_id, youtube_chapters=None):
+        """
+        Store segments with precomputed embeddings, e.g. from an imported bundle, without calling the
+        embedding backend. Segments stored for the video before are replaced, so storing the same video
+        again is idempotent. The lexical and chapter indexes are rebuilt as after an ingest.
+
+        Args:
+            segments (list of Segment): Merged subtitle segments in storage order.
+            embeddings (array-like): One embedding per segment from the configured embedding model. Rows
+                are read one chunk at a time, so a memory-mapped array is never loaded whole.
+            video_id (str): Id of the video.
+            youtube_chapters (list of dict, optional): yt_dlp chapters used as the video's chapter index.
+
+        Returns:
+            int: Number of stored segments.
+        """
+        collection, where = self._subtitle_collection(video_id, create=True)
+        # Chroma rewrites existing vectors several times slower than it removes and adds them again
+        stored = collection.get(where=where, include=[])["ids"]
+        if stored:
+            collection.delete(ids=stored)
+        for offset in range(0, len(segments), self.embedding_batch_size):
+            end = offset + self.embedding_batch_size
+            chunk_embeddings = np.asarray(embeddings[offset:end], dtype=np.float32).tolist()
+            self.__upsert_segments(collection, video_id, offset, segments[offset:end], chunk_embeddings)
+
+        if self.lexical_index is not None and segments:
+            self.lexical_index.build(video_id, segments)
+        if self.chapter_index is not None and segments:
+            self.build_chapter_index(video_id, segments, youtube_chapters, embeddings=embeddings)
+        self.__invalidate_results(video_id)
+        return len(segments)
+
+
+    def build_chapter_index(self, video_id, segments, youtube_chapters=None, embeddings=None):
+        """
+        Build the chapter index of a video from its stored segments.
+
+        Args:
+            video_id (str): Id of the video.
+            segments (list of Segment): Segments in storage order.
+            youtube_chapters (list of dict, optional): yt_dlp chapters of the video. Defaults to the
+                YouTube chapters of the previous index, an empty list forces topical windows.
+            embeddings (array-like, optional): embeddings of `segments`, looked up or computed when omitted.
+
+        Returns:
+            list of dict: The stored chapters, empty without a chapter index service.
+        """
+        if self.chapter_index is None:
+            return []
+        if youtube_chapters is None:
+            youtube_chapters = self.chapter_index.youtube_chapters(video_id)
+        if embeddings is None:
+            embeddings = self.embed_texts([seg.text for seg in segments], self.ingest_embedding_backend)
+        with metrics.timed("chapter_index_build"):
+            return self.chapter_index.build(video_id, segments, embeddings, self.embedding_backend.name, youtube_chapters)
+
+
+    def search_chapters(self, query_text, video_id, top_k=3):
+        """
+        Returns:
+            list of dict: The `top_k` chapters of the video closest to the query, with "start_seconds",
+                "end_seconds", "title", "summary" and "distance". Empty if the video has no chapter index.
+        """
+        if self.chapter_index is None:
+            return []
+        query_embedding = self.embed_texts([query_text])[0]
+        with metrics.timed("chapter_search"):
+            return self.chapter_index.search(query_embedding, video_id, self.embedding_backend.name, top_k)
+
+
+    def vector_search(self, queries, video_id, max_results_len=5, segment_ranges=None):
+        """
+        Search subtitle segments by vector similarity with one batched embedding and one collection query.
+
+        Args:
+            queries (list of str): Query strings.
             video_id (str): The video ID for the corresponding subtitle collection.
+            max_results_len (int): number of segments retrieved per query.
+            segment_ranges (list of (int, int), optional): only search the segments whose index is within
+                one of these first and last-plus-one ranges, e.g. the top chapters of the query.
 
         Returns:
-            list of dict: The most relevant subtitle segment, including timestamps and text.
+            list of list of str, dict: Segment ids ranked per query, and "start", "text", "start_seconds",
+                "end_seconds" and the best "distance" of every retrieved segment by id.
         """
-        collection_name = f"subtitles_{video_id}"
-        collection = self.chroma_client.get_or_create_collection(name=collection_name)
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if not queries:
+            return [], {}
 
-        response = ollama.embeddings(model="llama3.2", prompt=user_query)
-        query_embedding = response["embedding"]
+        collection, where = self._subtitle_collection(video_id)
+        # Chroma resolves metadata filters over the rows of every collection, so a range filter gets
+        # slower with each stored video, while an id filter does not. Segment ids include the video id
+        ids = None
+        if segment_ranges:
+            ids = [f"{video_id}_segment_{i}" for first, last in segment_ranges for i in range(first, last)]
+            where = None
+        query_embeddings = self.embed_texts(queries)
+        with metrics.timed("chroma_query"):
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=max_results_len,
+                ids=ids,
+                where=where,
+                include=["metadatas", "distances"]
+            )
+        segments = {}
+        for ids, metadatas, distances in zip(results["ids"], results["metadatas"], results["distances"]):
+            for segment_id, metadata, distance in zip(ids, metadatas, distances):
+                if segment_id not in segments or distance < segments[segment_id]["distance"]:
+                    segments[segment_id] = {
+                        "start": metadata["start"],
+                        "text": metadata["text"],
+                        "start_seconds": metadata.get("start_seconds"),
+                        "end_seconds": metadata.get("end_seconds"),
+                        "distance": distance,
+                    }
+        return results["ids"], segments
 
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=max_results_len
-        )
 
-        # ret = []
-        # for i, distance in enumerate(results['distances'][0]):
-        #     if distance < results['distances'][0][0] * distance_threshold_ratio:
-        #         ret.append(results['metadatas'][0][i])
-        #     else:
-        #         break
-        
+    def lexical_search(self, queries, video_id, max_results_len=5):
+        """
+        Search subtitle segments in the video's BM25 index, without any model call.
+
+        Returns:
+            list of list of str, dict: As `vector_search`, with a None "distance" and no "end_seconds".
+                None if the video has no lexical index.
+        """
+        index = self.lexical_index.get(video_id) if self.lexical_index is not None else None
+        if index is None:
+            return None
+
+        ranked_lists = []
+        segments = {}
+        for query in dict.fromkeys(q.strip() for q in queries if q and q.strip()):
+            ranked = []
+            with metrics.timed("lexical_search"):
+                hits = index.search(query, max_results_len)
+            for doc, _ in hits:
+                segment_id = f"{video_id}_segment_{doc}"
+                ranked.append(segment_id)
+                if segment_id not in segments:
+                    start = format_timestamp(float(index.starts[doc]))
+                    segments[segment_id] = {"start": start, "text": index.texts[doc], "start_seconds": float(index.starts[doc]), "distance": None}
+            ranked_lists.append(ranked)
+        return ranked_lists, segments
+
+
+    @staticmethod
+    def fuse_search_results(results, rrf_k=60):
+        """
+        Merge `vector_search` and `lexical_search` results with reciprocal rank fusion.
+
+        Args:
+            results (list of (list of list of str, dict)): Ranked lists and segments of each search.
+            rrf_k (int): reciprocal rank fusion constant.
+
+        Returns:
+            list of dict: Deduplicated segments with "start", "text", the best "distance" over all vector
+                queries (None for lexical-only hits) and the fused "score", ordered by score.
+        """
+        ranked_lists = []
+        segments = {}
+        for search_ranked_lists, search_segments in results:
+            ranked_lists += search_ranked_lists
+            for segment_id, segment in search_segments.items():
+                current = segments.get(segment_id)
+                if current is None or (segment["distance"] is not None and (current["distance"] is None or segment["distance"] < current["distance"])):
+                    segments[segment_id] = segment
+
+        fused = reciprocal_rank_fusion(ranked_lists, k=rrf_k)
+        return [{**segments[segment_id], "score": score} for segment_id, score in fused]
+
+
+    def library_search(self, query_text, top_k=10, segments_per_video=3, channel=None, uploaded_after=None, uploaded_before=None,
+                       max_segments=200, rrf_k=60):
+        """
+        Search all stored videos: one query of the shared collection's ANN index for the best segments
+        of the whole library, one of the metadata collection for the best titles and descriptions, and
+        the two video rankings fused with reciprocal rank fusion.
+
+        Args:
+            query_text (str): Query string.
+            top_k (int): number of videos returned.
+            segments_per_video (int): number of timestamps returned per video.
+            channel (str, optional): only search videos of this channel.
+            uploaded_after (int, optional): only search videos uploaded on or after this YYYYMMDD date.
+            uploaded_before (int, optional): only search videos uploaded on or before this YYYYMMDD date.
+            max_segments (int): number of segments retrieved from the whole library.
+            rrf_k (int): reciprocal rank fusion constant.
+
+        Returns:
+            list of dict: "video_id", "title", "channel", "upload_date", fused "score" and "segments"
+                (dicts with "start", "text" and "distance", best first) of the best videos.
+        """
+        if self.storage_mode != SHARED:
+            raise ValueError("Library search needs CHROMA_STORAGE_MODE=shared, run `flask migrate-shared-collection` first.")
+
+        metadata_collection = self.__metadata_collection()
+        conditions = []
+        if channel:
+            conditions.append({"channel": channel})
+        if uploaded_after:
+            conditions.append({"upload_date": {"$gte": int(uploaded_after)}})
+        if uploaded_before:
+            conditions.append({"upload_date": {"$lte": int(uploaded_before)}})
+        metadata_where = None
+        segment_where = None
+        if conditions:
+            metadata_where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+            # Segments do not carry channel or date, so filters select videos through their metadata first
+            rows = metadata_collection.get(where={"$and": [{"type": "title"}, *conditions]}, include=["metadatas"])
+            video_ids = [metadata["video_id"] for metadata in rows["metadatas"]]
+            if not video_ids:
+                return []
+            segment_where = {"video_id": {"$in": video_ids}}
+
+        collection = self.chroma_client.get_or_create_collection(name=self.shared_collection_name)
+        self.__check_embedding_model(collection)
+        query_embedding = self.embed_texts([query_text])
+        with metrics.timed("library_search", index="segments"):
+            results = collection.query(
+                query_embeddings=query_embedding,
+                n_results=max_segments,
+                where=segment_where,
+                include=["metadatas", "distances"],
+            )
+        segments = {}
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+            video_segments = segments.setdefault(metadata["video_id"], [])
+            if len(video_segments) < segments_per_video:
+                video_segments.append({"start": metadata["start"], "text": metadata["text"], "distance": distance})
+
+        with metrics.timed("library_search", index="metadata"):
+            results = metadata_collection.query(
+                query_texts=[query_text],
+                n_results=top_k * 2,
+                where=metadata_where,
+                include=["metadatas"],
+            )
+        # Metadata stored before video ids were recorded is identified by its id, `{video_id}_title`
+        metadata_ranking = [metadata.get("video_id") or entry_id.rsplit("_", 1)[0]
+                            for entry_id, metadata in zip(results["ids"][0], results["metadatas"][0])]
+
+        fused = reciprocal_rank_fusion([list(segments), list(dict.fromkeys(metadata_ranking))], k=rrf_k)[:top_k]
+        video_ids = [video_id for video_id, _ in fused]
+        titles = metadata_collection.get(ids=[f"{video_id}_title" for video_id in video_ids], include=["documents", "metadatas"])
+        info = {entry_id[:-len("_title")]: (document, metadata)
+                for entry_id, document, metadata in zip(titles["ids"], titles["documents"], titles["metadatas"])}
+
+        videos = []
+        for video_id, score in fused:
+            if video_id not in segments:
+                # Matched on its title or description only
+                ranked, found = self.vector_search([query_text], video_id, segments_per_video)
+                segments[video_id] = [found[segment_id] for segment_id in ranked[0]] if ranked else []
+            title, metadata = info.get(video_id, (None, {}))
+            videos.append({
+                "video_id": video_id,
+                "title": title,
+                "channel": (metadata or {}).get("channel"),
+                "upload_date": (metadata or {}).get("upload_date"),
+                "score": score,
+                "segments": segments[video_id],
+            })
+        return videos
+
+
+    def list_video_ids(self):
+        """
+        List the ids of all videos with stored metadata.
+        """
+        metadata_collection = self.__metadata_collection()
+        ids = metadata_collection.get(include=[])["ids"]
+        return [i[:-len("_title")] for i in ids if i.endswith("_title")]
+
+
+    def get_video_metadata(self, video_id):
+        """
+        Returns:
+            dict: "title", "description", "channel", "upload_date" and "bundle_id" of a video, the last
+                three None if unknown, or None if the video has no stored metadata.
+        """
+        result = self.__metadata_collection().get(ids=[f"{video_id}_title", f"{video_id}_description"], include=["documents", "metadatas"])
+        if not result["ids"]:
+            return None
+        fields = {"title": None, "description": None, "channel": None, "upload_date": None, "bundle_id": None}
+        for document, metadata in zip(result["documents"], result["metadatas"]):
+            fields[metadata["type"]] = document
+            for name in ("channel", "upload_date", "bundle_id"):
+                fields[name] = metadata.get(name, fields[name])
+        return fields
+
 
-        return [(metadata['start'], metadata['text']) for metadata in results['metadatas'][0]]
-    
     def get_metadata_by_video_id(self, video_id):
         """
         Get metadata_by_video_id
         """
-        metadata_collection = self.chroma_client.get_or_create_collection(name="metadata")
+        metadata_collection = self.__metadata_collection()
         ids_to_query = [f"{video_id}_title", f"{video_id}_description"]
         result = metadata_collection.get(ids=ids_to_query)
+        if len(result["documents"]) != 2:
+            raise VideoNotStoredError(f"{video_id} has no stored metadata.")
 
         title, description = result["documents"]
         
         return title, description
 
+
+    def migrate_to_shared_collection(self, delete_source=False, logger=None):
+        """
+        Copy every per-video `subtitles_{video_id}` collection into the shared collection.
+
+        Embeddings are copied as stored, so no segment is re-embedded. Videos already present in
+        the shared collection are skipped, which makes the migration safe to re-run.
+
+        Args:
+            delete_source (bool): delete each per-video collection after it has been copied.
+            logger (logging.Logger, optional): logger for per-video progress.
+
+        Returns:
+            int: Number of migrated videos.
+        """
+        shared = self.chroma_client.get_or_create_collection(name=self.shared_collection_name)
+        self.__check_embedding_model(shared)
+        names = [getattr(c, "name", c) for c in self.chroma_client.list_collections()]
+        prefix = "subtitles_"
+        migrated = 0
+
+        for name in names:
+            if not name.startswith(prefix) or name == self.shared_collection_name:
+                continue
+            video_id = name[len(prefix):]
+            source = self.chroma_client.get_collection(name=name)
+            if self.collection_embedding_model(source) != self.embedding_backend.name:
+                raise EmbeddingModelMismatchError(
+                    f"Collection {name} was embedded with {self.collection_embedding_model(source)}, "
+                    f"not {self.embedding_backend.name}. Run `flask reembed` before migrating it."
+                )
+            data = source.get(include=["embeddings", "metadatas"])
+
+            if data["ids"] and len(shared.get(ids=data["ids"][:1], include=[])["ids"]) == 0:
+                for offset in range(0, len(data["ids"]), self.embedding_batch_size):
+                    end = offset + self.embedding_batch_size
+                    shared.add(
+                        ids=data["ids"][offset:end],
+                        embeddings=data["embeddings"][offset:end],
+                        metadatas=[{**metadata, "video_id": video_id} for metadata in data["metadatas"][offset:end]]
+                    )
+                migrated += 1
+                if logger is not None:
+                    logger.info(f"{video_id} Migrated {len(data['ids'])} segments to {self.shared_collection_name}.")
+
+            if delete_source:
+                self.chroma_client.delete_collection(name=name)
+        return migrated
+
+
+    def reembed_from(self, source, video_ids=None, logger=None):
+        """
+        Re-embed the stored segments of `source` with this service's embedding backend.
+
+        In per-video mode the old collection of each video is replaced once all of its segments have
+        been re-embedded, so a failing embedding backend leaves it untouched. In shared mode this
+        service must point at a different shared collection than `source`, so the old one keeps
+        serving queries until the configuration is switched over.
+
+        Args:
+            source (ChromaDBService): service configured with the old embedding backend and collections.
+            video_ids (list of str, optional): videos to migrate, all stored videos by default.
+            logger (logging.Logger, optional): logger for per-video progress.
+
+        Returns:
+            int: Number of re-embedded videos.
+        """
+        if self.storage_mode == SHARED and source.storage_mode == SHARED \
+                and self.shared_collection_name == source.shared_collection_name:
+            raise ValueError("Re-embedding a shared collection needs a new target collection name.")
+
+        count = 0
+        for video_id in video_ids or source.list_video_ids():
+            segments = source.get_segments(video_id)
+            if not segments:
+                continue
+            embeddings = self.embed_texts([seg.text for seg in segments], self.ingest_embedding_backend)
+            if self.storage_mode == PER_VIDEO:
+                try:
+                    self.chroma_client.delete_collection(name=f"subtitles_{video_id}")
+                except Exception:
+                    pass
+            self.store_segment_embeddings(segments, embeddings, video_id)
+            count += 1
+            if logger is not None:
+                logger.info(f"{video_id} Re-embedded {len(segments)} segments with {self.embedding_backend.name}.")
+        return count
+
@@ -0,0 +1,179 @@
+import math
+
+import numpy as np
+from app.utils import group_timestamps, parse_timestamp_seconds
+
+
+def fit_logistic(gaps, labels, iterations=50, l2=1e-3):
+    """
+    Fit `P(correct) = 1 / (1 + exp(-slope * (gap - midpoint)))` to labelled queries by Newton's method on
+    the log-likelihood, with a small L2 penalty so that perfectly separated labels still converge.
+
+    Args:
+        gaps (list of float): distance gaps of the queries, see `ConfidenceGate.gap`.
+        labels (list of bool): whether the best match of each query answered it.
+
+    Returns:
+        float, float: The midpoint and the slope.
+
+    Raises:
+        ValueError: All labels are the same, nothing separates correct from wrong answers.
+    """
+    x = np.asarray(gaps, dtype=np.float64)
+    y = np.asarray(labels, dtype=np.float64)
+    if not len(y) or y.min() == y.max():
+        raise ValueError("Calibration needs both correctly and wrongly answered queries.")
+    features = np.stack([np.ones_like(x), x], axis=1)
+    weights = np.zeros(2)
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-features @ weights))
+        gradient = features.T @ (y - p) - l2 * weights
+        hessian = (features * (p * (1 - p))[:, None]).T @ features + l2 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        weights += step
+        if np.abs(step).max() < 1e-8:
+            break
+    intercept, slope = weights
+    if slope <= 0:
+        raise ValueError("Larger gaps are not more often correct, the gap does not predict the answers.")
+    return float(-intercept / slope), float(slope)
+
+
+class ConfidenceGate:
+    def __init__(self, min_confidence=2.0, midpoint=0.15, slope=20.0, max_distance=0.0, distance_ratio=1.03, neighborhood_seconds=60.0):
+        """
+        Decides from the vector matches of a query whether the best segment is an obvious answer that
+        needs no LLM ranking.
+
+        The confidence is a logistic function of the relative gap between the distance of the best
+        segment and that of the best segment elsewhere in the video, i.e. more than
+        `neighborhood_seconds` away from it: `1 / (1 + exp(-slope * (gap - midpoint)))` with
+        `gap = (d_other - d_best) / d_other`. `midpoint` is the gap at which the confidence is 0.5.
+        Distances depend on the embedding model, so `midpoint` and `slope` are fitted on labelled queries
+        of that model with `calibrate`, which makes the confidence the share of queries the best match
+        answers. Until then the gate is off.
+
+        Args:
+            min_confidence (float): confidence from which the LLM is skipped, above 1 never skips.
+            midpoint (float): gap mapped to a confidence of 0.5.
+            slope (float): steepness of the logistic function.
+            max_distance (float): the LLM is never skipped if the best distance is larger, 0 for no limit.
+            distance_ratio (float): segments within this ratio of the best distance are answered too.
+            neighborhood_seconds (float): segments this close to the best one are the same moment of the video.
+        """
+        self.min_confidence = min_confidence
+        self.midpoint = midpoint
+        self.slope = slope
+        self.max_distance = max_distance
+        self.distance_ratio = distance_ratio
+        self.neighborhood_seconds = neighborhood_seconds
+
+
+    @property
+    def enabled(self):
+        return self.min_confidence <= 1
+
+
+    @staticmethod
+    def __ranked(results):
+        ranked_lists, segments = results
+        matches = [segments[segment_id] for segment_id in dict.fromkeys(sum(ranked_lists, []))]
+        return sorted((m for m in matches if m["distance"] is not None), key=lambda m: m["distance"])
+
+
+    def gap(self, results):
+        """
+        Args:
+            results (tuple): `ChromaDBService.vector_search` results of the query text.
+
+        Returns:
+            float: Relative distance gap between the best segment and the best one elsewhere in the
+                video, None if there is nothing to compare it with.
+        """
+        matches = self.__ranked(results)
+        if not matches:
+            return None
+        best = matches[0]
+        best_start = parse_timestamp_seconds(best["start"])
+        others = [m for m in matches[1:] if abs(parse_timestamp_seconds(m["start"]) - best_start) > self.neighborhood_seconds]
+        if not others or others[0]["distance"] <= 0:
+            return None
+        return (others[0]["distance"] - best["distance"]) / others[0]["distance"]
+
+
+    def confidence(self, results):
+        """
+        Args:
+            results (tuple): `ChromaDBService.vector_search` results of the query text.
+
+        Returns:
+            float: Confidence in [0, 1] that the best segment answers the query, 0 if there is nothing
+                to compare it with.
+        """
+        gap = self.gap(results)
+        if gap is None:
+            return 0.0
+        return 1 / (1 + math.exp(-self.slope * (gap - self.midpoint)))
+
+
+    def calibrate(self, samples, target_precision=0.9):
+        """
+        Fit `midpoint` and `slope` on labelled queries and pick the lowest `min_confidence` whose skipped
+        queries are answered correctly at least `target_precision` of the time. A query counts as correct
+        if its best match starts within `neighborhood_seconds` of the labelled range.
+
+        Args:
+            samples (list of (tuple, float, float)): `vector_search` results of each query text with the
+                start and end seconds of the moment that answers it.
+            target_precision (float): share of fast path answers that must be correct.
+
+        Returns:
+            dict: "samples", "correct" share, fitted "midpoint" and "slope", the chosen "min_confidence"
+                (None if no threshold reaches the precision) and the "skip_share" and "precision" of the
+                fast path at that threshold. The gate itself is left unchanged.
+        """
+        gaps, labels = [], []
+        for results, start_seconds, end_seconds in samples:
+            gap = self.gap(results)
+            if gap is None:
+                continue
+            best_start = parse_timestamp_seconds(self.__ranked(results)[0]["start"])
+            gaps.append(gap)
+            labels.append(start_seconds - self.neighborhood_seconds <= best_start <= end_seconds + self.neighborhood_seconds)
+        midpoint, slope = fit_logistic(gaps, labels)
+
+        confidences = 1 / (1 + np.exp(-slope * (np.asarray(gaps) - midpoint)))
+        correct = np.asarray(labels)
+        calibration = {"samples": len(samples), "correct": float(correct.mean()), "midpoint": midpoint, "slope": slope,
+                       "min_confidence": None, "skip_share": 0.0, "precision": None}
+        for threshold in np.sort(np.unique(confidences)):
+            skipped = confidences >= threshold
+            precision = correct[skipped].mean()
+            if precision >= target_precision:
+                calibration.update(min_confidence=float(threshold), skip_share=float(skipped.sum() / len(samples)),
+                                   precision=float(precision))
+                break
+        return calibration
+
+
+    def answer(self, results):
+        """
+        Args:
+            results (tuple): `ChromaDBService.vector_search` results of the query text.
+
+        Returns:
+            float, list of (str, str): The confidence, and the HH:MM:SS timestamps and texts of the best
+                segments if it is high enough to skip the LLM, else None.
+        """
+        confidence = self.confidence(results)
+        if confidence < self.min_confidence:
+            return confidence, None
+        matches = self.__ranked(results)
+        if self.max_distance and matches[0]["distance"] > self.max_distance:
+            return confidence, None
+        accepted = [m for m in matches if m["distance"] <= matches[0]["distance"] * self.distance_ratio]
+        return confidence, group_timestamps(
+            [int(parse_timestamp_seconds(m["start"])) for m in accepted],
+            [m["text"] for m in accepted],
+            interval_sec=self.neighborhood_seconds,
+        )
@@ -0,0 +1,132 @@
+import math
+from app.utils import parse_timestamp_seconds
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a text for prompt budgeting, about 4 characters per token for English.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut a text to about `max_tokens` tokens, at a word boundary where possible.
+    """
+    max_chars = max(max_tokens, 0) * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + " ..."
+
+
+def candidate_start_seconds(candidate):
+    """
+    Whole start seconds of a search result, from its "start_seconds" or else its "start" timestamp.
+    """
+    start = candidate.get("start_seconds")
+    if start is None:
+        start = parse_timestamp_seconds(candidate["start"])
+    return int(start)
+
+
+class ContextPacker:
+    def __init__(self, token_budget=1500, description_tokens=300, merge_gap_seconds=5.0, max_window_seconds=45.0):
+        """
+        Packs the retrieved segments and the video description of a timestamp prompt into a token budget.
+
+        Segments that overlap or follow each other within `merge_gap_seconds` are merged into one
+        time window, windows are ranked by the best fused score of their segments and added until the
+        budget is used up.
+
+        Args:
+            token_budget (int): max estimated tokens of the description and candidates together, 0 for no limit.
+            description_tokens (int): max estimated tokens of the description, 0 for no limit.
+            merge_gap_seconds (float): max silence between two segments of the same window.
+            max_window_seconds (float): max span of a window.
+        """
+        self.token_budget = token_budget
+        self.description_tokens = description_tokens
+        self.merge_gap_seconds = merge_gap_seconds
+        self.max_window_seconds = max_window_seconds
+
+
+    def truncate_description(self, description):
+        if not self.description_tokens:
+            return description or ""
+        return truncate_to_tokens(description or "", self.description_tokens)
+
+
+    def merge_windows(self, candidates):
+        """
+        Args:
+            candidates (list of dict): Fused search results with "start", "text", "score" and, where
+                known, "start_seconds" and "end_seconds".
+
+        Returns:
+            list of dict: Time windows with the whole "start_seconds" of their first segment, the joined
+                "text", "end_seconds" and the best "score", in time order.
+        """
+        segments = {}
+        for candidate in candidates:
+            start = candidate_start_seconds(candidate)
+            end = candidate.get("end_seconds")
+            segment = {
+                "text": candidate["text"],
+                "start_seconds": start,
+                "end_seconds": start if end is None else end,
+                "score": candidate.get("score") or 0.0,
+            }
+            # The same segment can come back from several searches
+            key = (start, segment["text"])
+            current = segments.get(key)
+            if current is None or segment["score"] > current["score"]:
+                segments[key] = segment
+
+        windows = []
+        for segment in sorted(segments.values(), key=lambda s: s["start_seconds"]):
+            window = windows[-1] if windows else None
+            if (
+                window is not None
+                and segment["start_seconds"] - window["end_seconds"] <= self.merge_gap_seconds
+                and segment["end_seconds"] - window["start_seconds"] <= self.max_window_seconds
+            ):
+                window["text"] += " " + segment["text"]
+                window["end_seconds"] = max(window["end_seconds"], segment["end_seconds"])
+                window["score"] = max(window["score"], segment["score"])
+            else:
+                windows.append(dict(segment))
+        return windows
+
+
+    def pack(self, description, candidates):
+        """
+        Args:
+            description (str): Video description.
+            candidates (list of dict): Fused search results, see `merge_windows`.
+
+        Returns:
+            str, list of (int, str): The truncated description, and the start seconds and text of the
+                windows that fit the budget, best first.
+        """
+        description = self.truncate_description(description)
+        windows = sorted(self.merge_windows(candidates), key=lambda w: -w["score"])
+        if not self.token_budget:
+            return description, [(w["start_seconds"], w["text"]) for w in windows]
+
+        remaining = self.token_budget - estimate_tokens(description)
+        packed = []
+        for window in windows:
+            line = f"- {window['start_seconds']}s: {window['text']}\n"
+            tokens = estimate_tokens(line)
+            if tokens <= remaining:
+                packed.append((window["start_seconds"], window["text"]))
+                remaining -= tokens
+            elif not packed:
+                # The best window is always kept, cut to what is left of the budget
+                text = truncate_to_tokens(window["text"], max(remaining, 32))
+                packed.append((window["start_seconds"], text))
+                remaining -= estimate_tokens(f"- {window['start_seconds']}s: {text}\n")
+        return description, packed
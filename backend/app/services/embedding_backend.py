@@ -0,0 +1,211 @@
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import ollama
+
+OLLAMA = "ollama"
+SENTENCE_TRANSFORMERS = "sentence-transformers"
+# Models trained with Matryoshka representation learning, whose leading components are an embedding of
+# their own. Ollama names are matched without their tag
+MATRYOSHKA_MODELS = frozenset({
+    "nomic-embed-text",
+    "nomic-ai/nomic-embed-text-v1.5",
+    "mxbai-embed-large",
+    "mixedbread-ai/mxbai-embed-large-v1",
+    "snowflake-arctic-embed2",
+    "Snowflake/snowflake-arctic-embed-m-v1.5",
+    "Snowflake/snowflake-arctic-embed-l-v2.0",
+})
+
+
+def supports_truncation(model):
+    """
+    Returns:
+        bool: True if the vectors of `model` can be cut to their first components, see `MATRYOSHKA_MODELS`.
+    """
+    return model in MATRYOSHKA_MODELS or model.split(":", 1)[0] in MATRYOSHKA_MODELS
+
+
+class EmbeddingBackend:
+    """
+    Base class of embedding backends.
+
+    Subclasses implement `_embed`. With `dimensions` set, vectors are truncated to their first
+    `dimensions` components and re-normalized, which shrinks what Chroma stores for every segment.
+    Only Matryoshka-trained models keep their quality when truncated, other models are refused.
+    """
+    def __init__(self, model, dimensions=None):
+        if dimensions and not supports_truncation(model):
+            raise ValueError(
+                f"EMBEDDING_DIMENSIONS needs a Matryoshka-trained embedding model, {model} is not one "
+                f"(known ones: {', '.join(sorted(MATRYOSHKA_MODELS))})."
+            )
+        self.model = model
+        self.dimensions = dimensions or None
+
+
+    @property
+    def name(self):
+        """
+        Identifier of the vector space produced by this backend, recorded on every collection.
+        """
+        name = f"{self.kind}:{self.model}"
+        return f"{name}@{self.dimensions}" if self.dimensions else name
+
+
+    def _embed(self, texts):
+        raise NotImplementedError
+
+
+    def embed(self, texts):
+        """
+        Args:
+            texts (list of str): Texts to embed.
+
+        Returns:
+            list of list of float: Embeddings in the same order as `texts`.
+        """
+        embeddings = self._embed(texts)
+        if self.dimensions is None:
+            return [list(embedding) for embedding in embeddings]
+
+        vectors = np.asarray(embeddings, dtype=np.float32)[:, :self.dimensions]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).tolist()
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    kind = OLLAMA
+
+    def __init__(self, model="llama3.2", dimensions=None, max_workers=4):
+        """
+        Embed through an Ollama server.
+
+        Args:
+            model (str): Ollama model name.
+            dimensions (int, optional): keep only the first `dimensions` components.
+            max_workers (int): max concurrent requests when the batch embed API is unavailable.
+        """
+        super().__init__(model, dimensions)
+        self.max_workers = max_workers
+
+
+    def _embed(self, texts):
+        if hasattr(ollama, "embed"):
+            return ollama.embed(model=self.model, input=texts)["embeddings"]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = executor.map(lambda text: ollama.embeddings(model=self.model, prompt=text), texts)
+            vectors = np.asarray([response["embedding"] for response in responses], dtype=np.float32)
+        # /api/embeddings does not normalize, /api/embed does, and both must give the same vector space
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class SentenceTransformerEmbeddingBackend(EmbeddingBackend):
+    kind = SENTENCE_TRANSFORMERS
+
+    def __init__(self, model="all-MiniLM-L6-v2", dimensions=None, batch_size=64, device="cpu"):
+        """
+        Embed locally with a small sentence-embedding model, in batches.
+
+        Requires the optional `sentence-transformers` package.
+
+        Args:
+            model (str): sentence-transformers model name or path.
+            dimensions (int, optional): keep only the first `dimensions` components.
+            batch_size (int): texts encoded per forward pass.
+            device (str): torch device.
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=sentence-transformers requires `pip install sentence-transformers`"
+            ) from e
+        super().__init__(model, dimensions)
+        self.batch_size = batch_size
+        self.encoder = SentenceTransformer(model, device=device)
+
+
+    def _embed(self, texts):
+        return self.encoder.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+
+
+class CoalescingEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, backend, max_batch_size=512, max_wait=0.0):
+        """
+        Merge concurrent embedding calls, e.g. from several videos ingested at once, into large batches
+        for the wrapped backend. Calls that arrive while a batch is running are sent together as the
+        next batch, so a lone caller is not delayed.
+
+        Args:
+            backend (EmbeddingBackend): backend that computes the embeddings.
+            max_batch_size (int): max texts per backend call. A larger single call is not split.
+            max_wait (float): seconds to wait for more calls before sending a batch that is not full.
+        """
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._dispatcher = threading.Thread(target=self.__dispatch, name="embedding-batcher", daemon=True)
+        self._dispatcher.start()
+
+
+    @property
+    def name(self):
+        return self.backend.name
+
+
+    def embed(self, texts):
+        if not texts:
+            return []
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+
+    def __next_batch(self):
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        while size < self.max_batch_size:
+            try:
+                texts, future = self._requests.get(timeout=self.max_wait) if self.max_wait else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append((texts, future))
+            size += len(texts)
+        return batch
+
+
+    def __dispatch(self):
+        while True:
+            batch = self.__next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                embeddings = self.backend.embed(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+def create_embedding_backend(kind, model=None, dimensions=None, max_workers=4, batch_size=64):
+    """
+    Build the embedding backend selected in the config.
+
+    Args:
+        kind (str): "ollama" or "sentence-transformers".
+        model (str, optional): model name, defaults to the backend's default model.
+        dimensions (int, optional): keep only the first `dimensions` components.
+    """
+    if kind == OLLAMA:
+        return OllamaEmbeddingBackend(model or "llama3.2", dimensions, max_workers=max_workers)
+    if kind == SENTENCE_TRANSFORMERS:
+        return SentenceTransformerEmbeddingBackend(model or "all-MiniLM-L6-v2", dimensions, batch_size=batch_size)
+    raise ValueError(f"Unknown embedding backend: {kind}")
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.metrics import metrics, trace
+
+QUEUED = "queued"
+FETCHING = "fetching"
+TRANSCRIBING = "transcribing"
+EMBEDDING = "embedding"
+DONE = "done"
+FAILED = "failed"
+
+ACTIVE_STATES = (QUEUED, FETCHING, TRANSCRIBING, EMBEDDING)
+
+
+class IngestError(Exception):
+    """
+    Permanent ingest failure that should not be retried.
+    """
+
+
+class IngestService:
+    def __init__(self, chroma_db, youtube, db_path="db/ingest_jobs.sqlite3", max_workers=2, max_retries=2, retry_backoff=5.0, logger=None,
+                 query_priority=None):
+        """
+        Run video ingest jobs on a bounded worker pool and persist their state.
+
+        Args:
+            chroma_db (ChromaDBService): store for metadata and subtitles.
+            youtube (YouTubeService): source of metadata and subtitles.
+            db_path (str): path of the SQLite job table.
+            max_workers (int): number of videos ingested concurrently.
+            max_retries (int): retries of a job after a transient error.
+            retry_backoff (float): base delay in seconds, doubled on every retry.
+            logger (logging.Logger, optional): logger for stage timings.
+            query_priority (QueryPriority, optional): queries in flight that jobs give way to between steps.
+        """
+        self.chroma_db = chroma_db
+        self.youtube = youtube
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.logger = logger
+        self.query_priority = query_priority
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "video_id TEXT PRIMARY KEY, youtube_url TEXT NOT NULL, state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "transcript_source" not in columns:
+            # Added after the first release of the table
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN transcript_source TEXT")
+        self._conn.commit()
+        self.__resume_jobs()
+
+
+    def __resume_jobs(self):
+        """
+        Requeue jobs that were still active when the process stopped.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT video_id, youtube_url FROM jobs WHERE state IN ({','.join('?' * len(ACTIVE_STATES))})",
+                ACTIVE_STATES,
+            ).fetchall()
+        for row in rows:
+            self.__set_state(row["video_id"], QUEUED)
+            self.executor.submit(self.__run, row["video_id"], row["youtube_url"])
+
+
+    def __set_state(self, video_id, state, error=None, attempts=None):
+        with self._lock:
+            if attempts is None:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE video_id = ?",
+                    (state, error, time.time(), video_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, attempts = ?, updated_at = ? WHERE video_id = ?",
+                    (state, error, attempts, time.time(), video_id),
+                )
+            self._conn.commit()
+
+
+    def get_job(self, video_id):
+        """
+        Get the ingest job of a video.
+
+        Args:
+            video_id (str): Id of the video.
+
+        Returns:
+            dict or None: The job row, or None if the video was never submitted.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+
+    def submit(self, video_id, youtube_url, requeue_done=False):
+        """
+        Queue a video for ingest unless it is already queued, running or done.
+
+        Args:
+            video_id (str): Id of the video.
+            youtube_url (str): The full URL of the YouTube video.
+            requeue_done (bool): queue it again even if its job is done, e.g. when its data is missing.
+
+        Returns:
+            dict: The job handle of the video.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+            if row is not None and row["state"] != FAILED and not (requeue_done and row["state"] == DONE):
+                enqueue = False
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (video_id, youtube_url, state, attempts, error, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 0, NULL, ?, ?)",
+                    (video_id, youtube_url, QUEUED, now, now),
+                )
+                self._conn.commit()
+                enqueue = True
+        if enqueue:
+            self.executor.submit(self.__run, video_id, youtube_url)
+        return self.get_job(video_id)
+
+
+    def mark_done(self, video_id, youtube_url):
+        """
+        Record a video whose data already exists in the store as done, e.g. after importing its bundle.
+        A failed job is marked done too, so the video is not ingested again. Active jobs are left running.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (video_id, youtube_url, state, attempts, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, NULL, ?, ?) "
+                "ON CONFLICT (video_id) DO UPDATE SET state = excluded.state, error = NULL, updated_at = excluded.updated_at "
+                "WHERE jobs.state = ?",
+                (video_id, youtube_url, DONE, now, now, FAILED),
+            )
+            self._conn.commit()
+        return self.get_job(video_id)
+
+
+    def __log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+
+    def __run(self, video_id, youtube_url):
+        job = self.get_job(video_id)
+        attempts = job["attempts"] + 1
+        trace_id = f"ingest-{video_id}-{attempts}"
+        try:
+            with trace(trace_id) as stages:
+                try:
+                    with metrics.timed("ingest"):
+                        self.__ingest(video_id, youtube_url, attempts)
+                finally:
+                    breakdown = " ".join(f"{stage}={elapsed:.2f}s" for stage, elapsed in stages)
+                    self.__log(f"{video_id} trace={trace_id} {breakdown}")
+            metrics.inc("ingest_attempts_total", help="Ingest attempts by outcome.", result=DONE)
+        except IngestError as e:
+            metrics.inc("ingest_attempts_total", help="Ingest attempts by outcome.", result=FAILED)
+            self.__set_state(video_id, FAILED, error=str(e), attempts=attempts)
+        except Exception as e:
+            if attempts > self.max_retries:
+                metrics.inc("ingest_attempts_total", help="Ingest attempts by outcome.", result=FAILED)
+                self.__set_state(video_id, FAILED, error=str(e), attempts=attempts)
+                return
+            metrics.inc("ingest_attempts_total", help="Ingest attempts by outcome.", result="retry")
+            self.__set_state(video_id, QUEUED, error=str(e), attempts=attempts)
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            self.__log(f"{video_id} Attempt {attempts} failed ({e}), retrying in {delay:.0f} seconds.")
+            timer = threading.Timer(delay, self.executor.submit, args=(self.__run, video_id, youtube_url))
+            timer.daemon = True
+            timer.start()
+
+
+    def __ingest(self, video_id, youtube_url, attempts):
+        self.__set_state(video_id, FETCHING, attempts=attempts)
+
+        info = self.youtube.fetch_info(youtube_url)
+        if self.query_priority is not None:
+            self.query_priority.yield_to_queries()
+        with metrics.timed("store_metadata"):
+            self.chroma_db.store_metadata(
+                video_id, info["title"], info["description"], channel=info.get("channel"), upload_date=info.get("upload_date"),
+            )
+
+        # Sentences are embedded and stored while the subtitle source is still producing them, so a
+        # transcribing job stays in that state until Whisper finishes
+        transcribing = []
+
+        def on_transcribe():
+            transcribing.append(True)
+            self.__set_state(video_id, TRANSCRIBING, attempts=attempts)
+
+        def on_source(source):
+            metrics.inc("transcript_source_total", help="Ingested subtitles by source.", source=source)
+            with self._lock:
+                self._conn.execute("UPDATE jobs SET transcript_source = ? WHERE video_id = ?", (source, video_id))
+                self._conn.commit()
+
+        def track_segments(segments):
+            for i, segment in enumerate(segments):
+                if i == 0 and not transcribing:
+                    self.__set_state(video_id, EMBEDDING, attempts=attempts)
+                yield segment
+
+        segments = self.youtube.stream_subtitle(
+            youtube_url, self.logger is not None, self.logger, force_download_audio=False, on_transcribe=on_transcribe,
+            on_source=on_source,
+            # Caption tracks that keep failing to load are retried with the job, and only transcribed on its last attempt
+            transcribe_on_error=attempts > self.max_retries,
+        )
+        # Segment writes are upserts by index, so the segments of an earlier attempt or ingest would
+        # outlive a shorter transcript, e.g. after a fallback to Whisper
+        self.chroma_db.delete_segments(video_id)
+        with metrics.timed("store_subtitles"):
+            stored = self.chroma_db.store_subtitle_segments(track_segments(segments), video_id, youtube_chapters=info["chapters"])
+        if stored == 0:
+            raise IngestError("Failed to fetch or generate subtitles.")
+
+        self.__set_state(video_id, DONE, attempts=attempts)
@@ -0,0 +1,245 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from how i in is it its of on or so that the this to was what "
+    "when where which who why with you".split()
+)
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens of a text without stopwords.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class PackedStrings:
+    def __init__(self, data, offsets):
+        """
+        Strings stored as one UTF-8 buffer, string `i` being `data[offsets[i]:offsets[i + 1]]`. Unlike a
+        numpy string array, which pads every entry to the longest one in UCS-4, this keeps the on-disk
+        and in-memory size close to the text itself; entries are decoded on access.
+        """
+        self.data = data
+        self.offsets = offsets
+
+
+    @classmethod
+    def pack(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, i):
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode("utf-8")
+
+
+    def tolist(self):
+        data = self.data.tobytes()
+        return [data[int(start):int(end)].decode("utf-8") for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+class LexicalIndex:
+    def __init__(self, terms, offsets, docs, tfs, doc_lengths, starts, texts):
+        """
+        BM25 inverted index over the segments of one video.
+
+        Postings of term `i` are `docs[offsets[i]:offsets[i + 1]]` (segment indexes) with their term
+        frequencies in `tfs`; segment `j` has id `{video_id}_segment_{j}`. `texts` (PackedStrings) holds
+        the segment texts for phrase matches and results.
+        """
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.starts = starts
+        self.texts = texts
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+
+    @classmethod
+    def build(cls, segments):
+        """
+        Args:
+            segments (list of Segment): Segments in storage order.
+        """
+        postings = {}
+        doc_lengths = []
+        for doc, seg in enumerate(segments):
+            tokens = tokenize(seg.text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+        docs, tfs = [], []
+        for i, term in enumerate(terms):
+            docs += [doc for doc, _ in postings[term]]
+            tfs += [tf for _, tf in postings[term]]
+            offsets[i + 1] = len(docs)
+        return cls(
+            terms,
+            offsets,
+            np.array(docs, dtype=np.uint32),
+            np.minimum(np.array(tfs, dtype=np.uint32), np.iinfo(np.uint16).max).astype(np.uint16),
+            np.array(doc_lengths, dtype=np.uint16),
+            np.array([seg.start for seg in segments], dtype=np.float64),
+            PackedStrings.pack([seg.text for seg in segments]),
+        )
+
+
+    def save(self, path):
+        terms = PackedStrings.pack(sorted(self.term_ids, key=self.term_ids.get))
+        np.savez(
+            path,
+            term_data=terms.data,
+            term_offsets=terms.offsets,
+            offsets=self.offsets,
+            docs=self.docs,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths,
+            starts=self.starts,
+            text_data=self.texts.data,
+            text_offsets=self.texts.offsets,
+        )
+
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if "term_data" in data:
+                terms = PackedStrings(data["term_data"], data["term_offsets"]).tolist()
+                texts = PackedStrings(data["text_data"], data["text_offsets"])
+            else:
+                # Indexes written before the packed format, as fixed-width string arrays
+                terms = data["terms"].tolist()
+                texts = PackedStrings.pack(data["texts"].tolist())
+            return cls(terms, data["offsets"], data["docs"], data["tfs"], data["doc_lengths"], data["starts"], texts)
+
+
+    def covers(self, query):
+        """
+        Whether every non-stopword term of the query occurs in the video.
+        """
+        tokens = tokenize(query)
+        return bool(tokens) and all(token in self.term_ids for token in tokens)
+
+
+    def search(self, query, top_k=5, k1=1.5, b=0.75, phrase_boost=1.0):
+        """
+        Rank segments for a query with BM25, boosting segments that contain the query verbatim.
+
+        Args:
+            query (str): Query or keyword.
+            top_k (int): Max number of results.
+
+        Returns:
+            list of (int, float): Segment indexes and scores, best first.
+        """
+        doc_count = len(self.doc_lengths)
+        if doc_count == 0:
+            return []
+        scores = np.zeros(doc_count, dtype=np.float32)
+        norms = k1 * (1 - b + b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (k1 + 1) / (tfs + norms[docs])
+
+        matched = np.flatnonzero(scores)
+        phrase = query.strip().lower()
+        if phrase_boost and phrase and len(matched):
+            for doc in matched:
+                if phrase in self.texts[doc].lower():
+                    scores[doc] += phrase_boost * scores[doc]
+
+        top = matched[np.argsort(-scores[matched], kind="stable")][:top_k]
+        return [(int(doc), float(scores[doc])) for doc in top]
+
+
+class LexicalIndexService:
+    def __init__(self, index_dir="db/lexical", max_loaded=256):
+        """
+        Persist per-video BM25 indexes and load them lazily on first use.
+
+        Args:
+            index_dir (str): directory of the `{video_id}.npz` index files.
+            max_loaded (int): max number of indexes kept in memory.
+        """
+        self.index_dir = index_dir
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+
+
+    def __path(self, video_id):
+        return os.path.join(self.index_dir, f"{video_id}.npz")
+
+
+    def build(self, video_id, segments):
+        """
+        Build and persist the index of a video.
+
+        Args:
+            video_id (str): Id of the video.
+            segments (list of Segment): Segments in storage order.
+        """
+        index = LexicalIndex.build(segments)
+        index.save(self.__path(video_id))
+        with self._lock:
+            self._loaded.pop(video_id, None)
+        return index
+
+
+    def get(self, video_id):
+        """
+        Returns:
+            LexicalIndex or None: The index of the video, or None if it was never built.
+        """
+        with self._lock:
+            if video_id in self._loaded:
+                self._loaded.move_to_end(video_id)
+                return self._loaded[video_id]
+
+        path = self.__path(video_id)
+        if not os.path.exists(path):
+            return None
+        index = LexicalIndex.load(path)
+        with self._lock:
+            self._loaded[video_id] = index
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+
+    def delete(self, video_id):
+        """
+        Delete the index of a video, if it has one.
+        """
+        with self._lock:
+            self._loaded.pop(video_id, None)
+        try:
+            os.remove(self.__path(video_id))
+        except FileNotFoundError:
+            pass
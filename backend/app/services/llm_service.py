@@ -1,27 +1,83 @@
 import os
 import openai
 from dotenv import load_dotenv
-from app.utils import extract_timestamps, extract_timestamps_explaination, group_timestamps_with_reasons
+from app.cache import ResponseCache
+from app.metrics import metrics, TOKEN_BUCKETS
+from app.services.chapter_index import format_chapters
+from app.services.context_packer import candidate_start_seconds, estimate_tokens
+from app.utils import group_timestamps, parse_timestamp_response
 
 class LLMService():
-    def __init__(self, model="llama-3.2-90b-vision-preview") -> None:
+    def __init__(self, model="llama-3.2-90b-vision-preview", client=None, cache=None, context_packer=None) -> None:
         load_dotenv()
         self.PUBLIC_API_MODEL = model
         self.PUBLIC_API_KEY = os.getenv("PUBLIC_API_KEY") or os.environ.get("PUBLIC_API_KEY")
-        self.API_URL = "https://api.groq.com/openai/v1"
+        self.API_URL = os.environ.get("LLM_API_URL", "https://api.groq.com/openai/v1")
+        self.client = client or openai.Client(base_url=self.API_URL, api_key=self.PUBLIC_API_KEY)
+        self.cache = cache
+        self.context_packer = context_packer
 
-    def __llm_generate(self, prompt):
-        client = openai.Client(base_url=self.API_URL, api_key=self.PUBLIC_API_KEY)
+    def __observe_prompt(self, prompt, call):
+        metrics.observe("llm_prompt_tokens", estimate_tokens(prompt), help="Estimated prompt tokens sent to the LLM.",
+                        buckets=TOKEN_BUCKETS, call=call)
 
-        response = client.chat.completions.create(
-            model=self.PUBLIC_API_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-        )
+    def __llm_generate(self, prompt, temperature=0, call="generate"):
+        # Responses are only deterministic, and therefore cacheable, at temperature 0
+        cacheable = self.cache is not None and temperature == 0
+        if cacheable:
+            cache_key = ResponseCache.make_key(self.PUBLIC_API_MODEL, prompt, {"temperature": temperature})
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        self.__observe_prompt(prompt, call)
+        with metrics.timed("llm_call", call=call):
+            response = self.client.chat.completions.create(
+                model=self.PUBLIC_API_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+
+        content = response.choices[0].message.content
+        if cacheable:
+            self.cache.set(cache_key, content)
+        return content
+
+    def __llm_stream(self, prompt, temperature=0, call="generate"):
+        """
+        Yield the response text in pieces as the model produces them. A cached response is yielded whole.
+        """
+        cacheable = self.cache is not None and temperature == 0
+        if cacheable:
+            cache_key = ResponseCache.make_key(self.PUBLIC_API_MODEL, prompt, {"temperature": temperature})
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        self.__observe_prompt(prompt, call)
+
+        def deltas():
+            stream = self.client.chat.completions.create(
+                model=self.PUBLIC_API_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
 
-        return response.choices[0].message.content
+        parts = []
+        for delta in metrics.timed_iter("llm_call", deltas(), call=call):
+            parts.append(delta)
+            yield delta
+        if cacheable:
+            self.cache.set(cache_key, "".join(parts))
 
     def generate_rag_keywords(self, title, description, user_query):
+        if self.context_packer is not None:
+            description = self.context_packer.truncate_description(description)
         prompt = (
             "You are a helpful assistant specialized in extracting specific and detailed keywords for document retrieval.\n"
             "Your task is to analyze the given video title, description, and user query to generate concise, specific, and "
@@ -43,13 +99,35 @@ class LLMService():
             "Provide the keywords as a comma-separated list."
         )
 
-        res = self.__llm_generate(prompt)
+        res = self.__llm_generate(prompt, call="keywords")
         res = [keyword.strip() for keyword in res.split(',')]
         return res
 
 
-    def get_recommended_timestamps(self, title, description, query_text, candidates):
-        candidates_str = "\n".join([f"- {ts}: {text}" for ts, text in candidates])
+    def __pack_context(self, description, candidates):
+        """
+        Returns:
+            str, list of (int, str): The description and the start seconds and text of the candidates to
+                put in the timestamp prompt, within the budget of the context packer if there is one.
+        """
+        unpacked = [(candidate_start_seconds(c), c["text"]) for c in candidates]
+        before = estimate_tokens(description or "") + sum(estimate_tokens(f"- {start}s: {text}\n") for start, text in unpacked)
+        if self.context_packer is not None:
+            description, packed = self.context_packer.pack(description, candidates)
+        else:
+            packed = unpacked
+        after = estimate_tokens(description or "") + sum(estimate_tokens(f"- {start}s: {text}\n") for start, text in packed)
+        for packing, tokens in (("before", before), ("after", after)):
+            metrics.observe("timestamps_context_tokens", tokens, help="Estimated tokens of the description and candidates of a timestamp prompt.",
+                            buckets=TOKEN_BUCKETS, packing=packing)
+        return description, packed
+
+
+    def __timestamps_prompt(self, title, description, query_text, candidates, chapters=None):
+        description, candidates = self.__pack_context(description, candidates)
+        candidates_str = "\n".join([f"- {start}s: {text}" for start, text in candidates])
+        # An overview of the chapters the candidates were drawn from, when the video has a chapter index
+        chapters_str = f"### Video Chapters:\n{format_chapters(chapters)}\n\n" if chapters else ""
 
         prompt = (
             "You are a helpful assistant tasked with identifying the most relevant video timestamps based on a user's query.\n"
@@ -58,33 +136,59 @@ class LLMService():
             f"{title}\n\n"
             "### Video Description:\n"
             f"{description}\n\n"
+            f"{chapters_str}"
             "### User Query:\n"
             f"{query_text}\n\n"
             "### Instructions:\n"
             "1. Carefully review the provided video title and description to understand the video's main topics.\n"
             "2. Analyze the user's query to infer their intent and identify the most relevant part of the video.\n"
-            "3. Evaluate the given timestamp-text pairs, selecting the segment(s) that best match the user's query.\n"
+            "3. Evaluate the given candidates, each a start time in seconds and the text said from there, selecting the segment(s) that best match the user's query.\n"
             "4. If multiple timestamps are relevant, prioritize those with clearer and more specific connections to the query.\n\n"
             "### Timestamp-Text Candidates:\n"
             f"{candidates_str}\n\n"
             "### Output Format:\n"
-            "Provide the relevant timestamp(s) and a brief, concise reason for your choice, formatted as follows:\n\n"
-            "- Timestamp: [HH:MM:SS]\n"
-            "- Reason: [Reason]\n\n"
-            "If no candidate is relevant, respond with:\n"
-            "\"No relevant timestamp found.\""
+            "Respond with a JSON array only, one object per relevant candidate, with its start time in seconds as an integer and a brief, concise reason for your choice:\n\n"
+            "[{\"start\": 125, \"reason\": \"...\"}]\n\n"
+            "If no candidate is relevant, respond with an empty array: []"
         )
+        return prompt
+
+
+    def __parse_timestamps(self, res):
+        parsed = parse_timestamp_response(res)
+        return group_timestamps([start for start, _ in parsed], [reason for _, reason in parsed], interval_sec=60)
+
+
+    def get_recommended_timestamps(self, title, description, query_text, candidates, chapters=None):
+        prompt = self.__timestamps_prompt(title, description, query_text, candidates, chapters)
+        res = self.__llm_generate(prompt, call="timestamps")
+        return self.__parse_timestamps(res)
 
-        res = self.__llm_generate(prompt)
-        # print(res)
-        res_list = extract_timestamps_explaination(res)
-        # print(res_list)
-        # timestamps = extract_timestamps(res)
-        for i in range(len(res_list)):
-            if res_list[i][0][2] != ':':
-                res_list[i][0] = '0' + res_list[i][0]
 
-        res_list.sort(key=lambda x: x[0])
-        res_list = group_timestamps_with_reasons(res_list, interval_sec=60)
+    def stream_recommended_timestamps(self, title, description, query_text, candidates, chapters=None):
+        """
+        Stream the ranking of `get_recommended_timestamps`.
 
-        return res_list
\ No newline at end of file
+        Yields:
+            list of (str, str): The timestamps and reasons parsed so far, each time the model completes
+                another one, and the same result as `get_recommended_timestamps` last. Results equal to
+                the previous one, e.g. when a new timestamp was grouped into an earlier one, are skipped.
+        """
+        prompt = self.__timestamps_prompt(title, description, query_text, candidates, chapters)
+        res = ""
+        completed = 0
+        partial = None
+        for delta in self.__llm_stream(prompt, call="timestamps"):
+            res += delta
+            # Only objects and blocks that have been closed are complete
+            complete = res[:max(res.rfind("}") + 1, res.rfind("\n\n"))]
+            parsed = parse_timestamp_response(complete)
+            if len(parsed) > completed:
+                completed = len(parsed)
+                timestamps = self.__parse_timestamps(complete)
+                if timestamps != partial:
+                    partial = timestamps
+                    yield partial
+        timestamps = self.__parse_timestamps(res)
+        if timestamps != partial:
+            yield timestamps
@@ -0,0 +1,166 @@
+import time
+
+import youtube_transcript_api
+from youtube_transcript_api import YouTubeTranscriptApi
+from app.metrics import metrics
+
+MANUAL = "manual"
+GENERATED = "generated"
+TRANSLATED = "translated"
+# A caption track in another language, used as is
+ORIGINAL = "original"
+WHISPER = "whisper"
+
+DEFAULT_POLICY = (MANUAL, GENERATED, TRANSLATED, ORIGINAL)
+
+# Errors that say the video has no usable caption track, retrying will not change that. Not every
+# version of youtube_transcript_api defines all of them.
+PERMANENT_ERRORS = tuple(
+    getattr(youtube_transcript_api, name)
+    for name in (
+        "AgeRestricted",
+        "InvalidVideoId",
+        "NoTranscriptAvailable",
+        "NoTranscriptFound",
+        "NotTranslatable",
+        "TranscriptsDisabled",
+        "TranslationLanguageNotAvailable",
+        "VideoUnavailable",
+        "VideoUnplayable",
+    )
+    if hasattr(youtube_transcript_api, name)
+)
+
+
+class NoTranscriptError(Exception):
+    """
+    The video has no caption track allowed by the policy.
+    """
+
+
+class TranscriptFetchError(Exception):
+    """
+    The caption tracks could not be listed or fetched, e.g. rate limiting or a network error, and
+    retries did not help.
+    """
+
+
+class TranscriptResolver:
+    def __init__(self, languages=("en",), policy=DEFAULT_POLICY, max_retries=3, retry_backoff=2.0, rate_limiter=None, api=None):
+        """
+        Pick the caption track of a video by policy instead of taking the default track or nothing.
+
+        The caption tracks of a video are listed once, then each source of `policy` is tried in order:
+        a manually created track in one of `languages`, an auto-generated one, a track translated into
+        one of `languages` by YouTube, and any track as is.
+
+        Args:
+            languages (list of str): preferred language codes, best first.
+            policy (list of str): sources to try, in order, out of "manual", "generated", "translated"
+                and "original".
+            max_retries (int): retries of a listing or fetch after a transient error.
+            retry_backoff (float): base delay in seconds, doubled on every retry.
+            rate_limiter (RateLimiter, optional): limiter acquired before every request to YouTube.
+            api (YouTubeTranscriptApi, optional): transcript API client.
+        """
+        unknown = set(policy) - set(DEFAULT_POLICY)
+        if unknown:
+            raise ValueError(f"Unknown transcript sources: {', '.join(sorted(unknown))}")
+        self.languages = list(languages)
+        self.policy = list(policy)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.rate_limiter = rate_limiter
+        self.api = api or YouTubeTranscriptApi()
+
+
+    def __request(self, call, *args):
+        """
+        Run a request to YouTube, retrying transient errors with exponential backoff.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                with metrics.timed("transcript_api"):
+                    return call(*args)
+            except PERMANENT_ERRORS:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise TranscriptFetchError(str(e)) from e
+                metrics.inc("transcript_api_retries_total", help="Transcript requests retried after a transient error.")
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+
+    def __list_transcripts(self, video_id):
+        # youtube_transcript_api 1.x lists through an instance, earlier versions through a classmethod
+        if hasattr(self.api, "list"):
+            return self.api.list(video_id)
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+
+
+    @staticmethod
+    def __fetch(transcript):
+        fetched = transcript.fetch()
+        # A FetchedTranscript in 1.x, a list of dicts before
+        entries = fetched.to_raw_data() if hasattr(fetched, "to_raw_data") else fetched
+        return [{"start": entry["start"], "duration": entry["duration"], "text": entry["text"]} for entry in entries]
+
+
+    def __select(self, transcripts, source):
+        """
+        Returns:
+            Transcript: The track of `source` in the preferred languages, or None.
+        """
+        if source == MANUAL:
+            candidates = [t for t in transcripts if not t.is_generated]
+        elif source == GENERATED:
+            candidates = [t for t in transcripts if t.is_generated]
+        elif source == TRANSLATED:
+            for transcript in sorted(transcripts, key=lambda t: t.is_generated):
+                if not transcript.is_translatable:
+                    continue
+                available = {language.language_code if hasattr(language, "language_code") else language["language_code"]
+                             for language in transcript.translation_languages}
+                for language in self.languages:
+                    if language in available:
+                        return transcript.translate(language)
+            return None
+        else:
+            return sorted(transcripts, key=lambda t: t.is_generated)[0] if transcripts else None
+
+        for language in self.languages:
+            for transcript in candidates:
+                if transcript.language_code == language:
+                    return transcript
+        return None
+
+
+    def resolve(self, video_id):
+        """
+        Fetch the caption track of a video chosen by the policy.
+
+        Args:
+            video_id (str): Id of the video.
+
+        Returns:
+            dict: The "source" of the track, its "language" code and its "entries" (dicts with "start",
+                "duration" and "text").
+
+        Raises:
+            NoTranscriptError: The video has no caption track allowed by the policy.
+            TranscriptFetchError: YouTube kept failing on a transient error.
+        """
+        try:
+            transcripts = list(self.__request(self.__list_transcripts, video_id))
+            for source in self.policy:
+                transcript = self.__select(transcripts, source)
+                if transcript is None:
+                    continue
+                entries = self.__request(self.__fetch, transcript)
+                if entries:
+                    return {"source": source, "language": transcript.language_code, "entries": entries}
+        except PERMANENT_ERRORS as e:
+            raise NoTranscriptError(str(e)) from e
+        raise NoTranscriptError(f"No caption track of {video_id} matches the transcript policy.")
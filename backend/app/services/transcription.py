@@ -0,0 +1,176 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from faster_whisper import WhisperModel, decode_audio
+
+SAMPLING_RATE = 16000
+
+
+class LazyWhisperModel:
+    def __init__(self, model_name="medium", idle_timeout=600, compute_type=None, cpu_threads=0, num_workers=1):
+        """
+        Hold a Whisper model that is loaded on first use and released after being idle.
+
+        Args:
+            model_name (str): Whisper model size.
+            idle_timeout (float): seconds without users before the model is evicted, None to keep it forever.
+            compute_type (str, optional): CTranslate2 compute type, defaults to float16 on GPU and int8 on CPU.
+            cpu_threads (int): threads per model worker, 0 for the CTranslate2 default.
+            num_workers (int): model workers, i.e. transcriptions that can run in parallel from different threads.
+        """
+        self.model_name = model_name
+        self.idle_timeout = idle_timeout
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self._lock = threading.Lock()
+        self._model = None
+        self._users = 0
+        self._evict_timer = None
+
+
+    def __load(self):
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        compute_type = self.compute_type or ("float16" if device == "cuda" else "int8")
+        return WhisperModel(
+            self.model_name,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.num_workers,
+        )
+
+
+    def __evict(self):
+        with self._lock:
+            if self._users == 0:
+                self._model = None
+                self._evict_timer = None
+
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+
+    @contextmanager
+    def acquire(self):
+        """
+        Borrow the model, loading it if it is not in memory.
+
+        Yields:
+            WhisperModel: The shared model instance.
+        """
+        with self._lock:
+            if self._evict_timer is not None:
+                self._evict_timer.cancel()
+                self._evict_timer = None
+            if self._model is None:
+                self._model = self.__load()
+            self._users += 1
+            model = self._model
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._users -= 1
+                if self._users == 0 and self.idle_timeout is not None:
+                    self._evict_timer = threading.Timer(self.idle_timeout, self.__evict)
+                    self._evict_timer.daemon = True
+                    self._evict_timer.start()
+
+
+def find_cut_points(audio, chunk_seconds=300, search_seconds=10, frame_seconds=0.03, sampling_rate=SAMPLING_RATE):
+    """
+    Pick chunk boundaries close to every `chunk_seconds`, moved to the quietest frame nearby.
+
+    Args:
+        audio (np.ndarray): Mono float32 samples.
+        chunk_seconds (float): Target chunk length.
+        search_seconds (float): How far around each target boundary to look for silence.
+        frame_seconds (float): Length of the frames whose energy is compared.
+        sampling_rate (int): Sampling rate of `audio`.
+
+    Returns:
+        list of int: Sample offsets of the boundaries, starting with 0 and ending with len(audio).
+    """
+    frame = max(1, int(frame_seconds * sampling_rate))
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return [0, len(audio)]
+    energy = np.sqrt(np.mean(audio[:frame_count * frame].reshape(frame_count, frame) ** 2, axis=1))
+
+    cuts = [0]
+    target = chunk_seconds
+    total_seconds = len(audio) / sampling_rate
+    while target < total_seconds - search_seconds:
+        low = max(int((target - search_seconds) / frame_seconds), 0)
+        high = min(int((target + search_seconds) / frame_seconds), frame_count)
+        cut = (low + int(np.argmin(energy[low:high]))) * frame
+        if cut > cuts[-1]:
+            cuts.append(cut)
+        target = cut / sampling_rate + chunk_seconds
+    cuts.append(len(audio))
+    return cuts
+
+
+def _transcribe_chunk(model, audio, start, end, overlap, beam_size):
+    """
+    Transcribe [start, end) plus `overlap` samples of context on each side.
+
+    Returns:
+        list of (float, float, str): Segments with absolute times whose midpoint falls in [start, end).
+    """
+    chunk_start = max(start - overlap, 0)
+    chunk_end = min(end + overlap, len(audio))
+    offset = chunk_start / SAMPLING_RATE
+    segments, _ = model.transcribe(audio[chunk_start:chunk_end], beam_size=beam_size)
+
+    kept = []
+    for segment in segments:
+        seg_start, seg_end = segment.start + offset, segment.end + offset
+        midpoint = (seg_start + seg_end) / 2 * SAMPLING_RATE
+        if start <= midpoint < end:
+            kept.append((seg_start, seg_end, segment.text))
+    return kept
+
+
+def transcribe_chunked(model, audio_file, workers=2, chunk_seconds=300, overlap_seconds=2, beam_size=5):
+    """
+    Transcribe an audio file as parallel chunks split on silence, yielding segments in order.
+
+    Each chunk is decoded with `overlap_seconds` of context on both sides so words at a boundary
+    are heard in full; a segment is then kept only by the chunk that owns its midpoint, and text
+    repeated verbatim across a boundary is dropped. CTranslate2 releases the GIL, so chunks submitted
+    from a thread pool run on separate cores as long as the model has `num_workers >= workers`.
+
+    Args:
+        model (WhisperModel): Loaded faster-whisper model.
+        audio_file (str): Path to the audio file.
+        workers (int): Number of chunks transcribed concurrently.
+        chunk_seconds (float): Target chunk length.
+        overlap_seconds (float): Context added on both sides of a chunk.
+        beam_size (int): Beam size used for decoding.
+
+    Yields:
+        (float, float, str): Start and end in seconds and text of each segment.
+    """
+    audio = decode_audio(audio_file, sampling_rate=SAMPLING_RATE)
+    cuts = find_cut_points(audio, chunk_seconds)
+    overlap = int(overlap_seconds * SAMPLING_RATE)
+
+    previous_text = None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as executor:
+        futures = [
+            executor.submit(_transcribe_chunk, model, audio, start, end, overlap, beam_size)
+            for start, end in zip(cuts, cuts[1:])
+        ]
+        for future in futures:
+            for i, (start, end, text) in enumerate(future.result()):
+                if i == 0 and previous_text is not None and text.strip() == previous_text:
+                    continue
+                previous_text = text.strip()
+                yield start, end, text
@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+from app.metrics import metrics
+from app.services.chromadb_service import EmbeddingModelMismatchError, VideoNotStoredError
+from app.utils import Segment
+
+BUNDLE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+TIMESTAMPS_FILE = "timestamps.npy"
+
+
+class BundleError(ValueError):
+    """
+    A bundle is missing, incomplete or written in an unsupported format version.
+    """
+
+
+class VideoBundleService:
+    def __init__(self, chroma_db, bundle_dir="db/bundles", logger=None):
+        """
+        Export and import the precomputed index of a video as a portable bundle, so a new node serves
+        popular videos without fetching, transcribing and embedding them again.
+
+        A bundle is a directory `{bundle_dir}/{video_id}` holding the segment embeddings as a float32
+        `embeddings.npy`, the segment start and end seconds as `timestamps.npy`, and a `manifest.json`
+        with the format version, embedding model, video metadata, segment texts and YouTube chapters.
+        Imports memory-map the embeddings and store them chunk by chunk, so they never hold a whole
+        video's vectors in memory. The imported bundle id is stored with the video metadata, and
+        importing the same bundle again is skipped, so an interrupted bulk import can simply be rerun.
+
+        Args:
+            chroma_db (ChromaDBService): service storing the imported videos, its embedding backend must
+                be the model the bundles were exported with.
+            bundle_dir (str): directory holding one bundle per video.
+            logger (logging.Logger, optional): logger for failed lazy imports.
+        """
+        self.chroma_db = chroma_db
+        self.bundle_dir = bundle_dir
+        self.logger = logger
+        self._checked = set()
+        self._failed = {}
+        # One lock per video, so a slow import does not hold back the first requests of other videos
+        self._video_locks = {}
+        self._lock = threading.Lock()
+
+
+    def path(self, video_id):
+        return os.path.join(self.bundle_dir, video_id)
+
+
+    def __video_lock(self, video_id):
+        with self._lock:
+            return self._video_locks.setdefault(video_id, threading.Lock())
+
+
+    def available(self, video_id):
+        return os.path.exists(os.path.join(self.path(video_id), MANIFEST_FILE))
+
+
+    def list_video_ids(self):
+        """
+        List the ids of all videos with a bundle in `bundle_dir`.
+        """
+        if not os.path.isdir(self.bundle_dir):
+            return []
+        return sorted(name for name in os.listdir(self.bundle_dir) if self.available(name))
+
+
+    def export(self, video_id):
+        """
+        Write the bundle of a stored video, replacing any previous one.
+
+        Args:
+            video_id (str): Id of the video.
+
+        Returns:
+            dict: The manifest of the bundle.
+
+        Raises:
+            BundleError: The video has no stored metadata or segments.
+        """
+        metadata = self.chroma_db.get_video_metadata(video_id)
+        try:
+            segments, embeddings = self.chroma_db.get_segment_embeddings(video_id)
+        except VideoNotStoredError:
+            segments = []
+        if metadata is None or not segments:
+            raise BundleError(f"{video_id} is not stored, nothing to export.")
+        chapter_index = self.chroma_db.chapter_index
+        manifest = {
+            "version": BUNDLE_VERSION,
+            "bundle_id": uuid.uuid4().hex,
+            "video_id": video_id,
+            "embedding_model": self.chroma_db.embedding_backend.name,
+            "dimensions": int(embeddings.shape[1]),
+            "segments": len(segments),
+            "created_at": time.time(),
+            "title": metadata["title"],
+            "description": metadata["description"],
+            "channel": metadata["channel"],
+            "upload_date": metadata["upload_date"],
+            "youtube_chapters": chapter_index.youtube_chapters(video_id) if chapter_index is not None else [],
+            "texts": [seg.text for seg in segments],
+        }
+
+        # Written next to the target and swapped in, so a reader never sees a half-written bundle
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.bundle_dir, prefix=f".{video_id}.")
+        try:
+            np.save(os.path.join(staging, EMBEDDINGS_FILE), embeddings)
+            np.save(os.path.join(staging, TIMESTAMPS_FILE), np.asarray([(seg.start, seg.end) for seg in segments], dtype=np.float64))
+            with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as file:
+                json.dump(manifest, file)
+            target = self.path(video_id)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(staging, target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return manifest
+
+
+    def load(self, video_id, force=False):
+        """
+        Import the bundle of a video into ChromaDB, replacing what is stored for it.
+
+        Args:
+            video_id (str): Id of the video.
+            force (bool): import the bundle even if the video was already imported from it.
+
+        Returns:
+            int: Number of imported segments, 0 if the bundle was already imported.
+
+        Raises:
+            BundleError: The bundle is missing, incomplete or of another format version.
+            EmbeddingModelMismatchError: The bundle was exported with another embedding model.
+        """
+        path = self.path(video_id)
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+            timestamps = np.load(os.path.join(path, TIMESTAMPS_FILE))
+        except (OSError, ValueError) as e:
+            raise BundleError(f"Bundle of {video_id} is unreadable: {e}") from e
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise BundleError(f"Bundle of {video_id} has version {manifest.get('version')}, expected {BUNDLE_VERSION}.")
+        if manifest["embedding_model"] != self.chroma_db.embedding_backend.name:
+            raise EmbeddingModelMismatchError(
+                f"Bundle of {video_id} was embedded with {manifest['embedding_model']}, not {self.chroma_db.embedding_backend.name}."
+            )
+        if not len(embeddings) == len(timestamps) == len(manifest["texts"]):
+            raise BundleError(f"Bundle of {video_id} has {len(embeddings)} embeddings for {len(manifest['texts'])} segments.")
+
+        stored = self.chroma_db.get_video_metadata(video_id)
+        if not force and stored is not None and stored["bundle_id"] == manifest["bundle_id"]:
+            return 0
+
+        segments = [Segment(float(start), float(end), text) for (start, end), text in zip(timestamps, manifest["texts"])]
+        with metrics.timed("bundle_import"):
+            count = self.chroma_db.store_segment_embeddings(segments, embeddings, video_id, manifest["youtube_chapters"])
+            # Last, so an import interrupted before is not mistaken for a complete one
+            self.chroma_db.store_metadata(video_id, manifest["title"], manifest["description"], manifest["channel"],
+                                          manifest["upload_date"], bundle_id=manifest["bundle_id"])
+        metrics.inc("bundle_imports_total", help="Videos imported from precomputed bundles.")
+        return count
+
+
+    def ensure_loaded(self, video_id):
+        """
+        Import the bundle of a video on its first request if the video is not stored yet. Later calls
+        for the same video only cost a set lookup, calls for videos without a bundle a file check. A
+        bundle that fails to import is not tried again until it is replaced, the video is then handled
+        as if it had no bundle, e.g. ingested from YouTube.
+
+        Returns:
+            bool: True if the bundle was imported by this call.
+        """
+        if video_id in self._checked:
+            return False
+        try:
+            version = os.stat(os.path.join(self.path(video_id), MANIFEST_FILE)).st_mtime_ns
+        except OSError:
+            return False
+        if self._failed.get(video_id) == version:
+            return False
+        with self.__video_lock(video_id):
+            if video_id in self._checked or self._failed.get(video_id) == version:
+                return False
+            try:
+                loaded = not self.chroma_db.video_exists(video_id)
+                if loaded:
+                    self.load(video_id)
+            except Exception as e:
+                self._failed[video_id] = version
+                metrics.inc("bundle_import_failures_total", help="Lazy bundle imports that failed.")
+                if self.logger is not None:
+                    self.logger.warning(f"{video_id} Import of its bundle failed, not retried until it is replaced: {e}")
+                return False
+            self._failed.pop(video_id, None)
+            self._checked.add(video_id)
+            return loaded
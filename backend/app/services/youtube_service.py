@@ -1,14 +1,19 @@
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import SRTFormatter
 from urllib.parse import urlparse, parse_qs
+import re
 import yt_dlp
-import torch
-from faster_whisper import WhisperModel
 import os
 import logging
-import time
 # from transformers import pipeline
-from app.utils import merge_srt_sentences
+from app.artifacts import ArtifactStore
+from app.utils import RateLimiter, Segment, SentenceMerger, write_srt
+from app.services.transcription import LazyWhisperModel, transcribe_chunked
+from app.services.transcript_resolver import WHISPER, NoTranscriptError, TranscriptFetchError, TranscriptResolver
+from app.metrics import metrics
+
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com")
+VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# Path prefixes followed by the video id, e.g. youtube.com/shorts/<id>
+VIDEO_PATH_PREFIXES = ("shorts", "embed", "live", "v")
 
 # logging.basicConfig(
 #     level=logging.INFO,
@@ -17,17 +22,39 @@ from app.utils import merge_srt_sentences
 #     filemode="a"
 # )
 class YouTubeService:
-    def __init__(self, save_dir="subtitles/"):
+    def __init__(self, save_dir="subtitles/", whisper_model=None, transcribe_workers=1, chunk_seconds=300, chunk_overlap=2, save_srt=True,
+                 requests_per_second=0, artifact_store=None, transcript_resolver=None):
         """
         Initialize the manager with a directory to save subtitles.
 
         Args:
             save_dir (str): path of the srt directory.
+            whisper_model (LazyWhisperModel, optional): shared Whisper model to borrow for transcription.
+            transcribe_workers (int): audio chunks transcribed in parallel, 1 transcribes the whole file at once.
+            chunk_seconds (float): target length of the audio chunks.
+            chunk_overlap (float): seconds of context added on both sides of a chunk.
+            save_srt (bool): keep an `.srt` copy of every streamed subtitle in `save_dir`.
+            requests_per_second (float): max rate of requests to YouTube shared by all ingest workers, 0 for no limit.
+            artifact_store (ArtifactStore, optional): store of the raw transcripts, audio files and Whisper
+                output reused across retries. Defaults to a store in `db/artifacts`.
+            transcript_resolver (TranscriptResolver, optional): picks the caption track of a video. Defaults
+                to English tracks in the default policy order.
 
         Returns:
             None
         """
         self.save_dir = save_dir
+        self.whisper_model = whisper_model
+        self.transcribe_workers = transcribe_workers
+        self.chunk_seconds = chunk_seconds
+        self.chunk_overlap = chunk_overlap
+        self.save_srt = save_srt
+        self.rate_limiter = RateLimiter(requests_per_second, burst=max(int(requests_per_second), 1))
+        self.artifact_store = artifact_store or ArtifactStore()
+        self.transcript_resolver = transcript_resolver or TranscriptResolver()
+        if self.transcript_resolver.rate_limiter is None:
+            # Caption requests count against the same limit as every other request to YouTube
+            self.transcript_resolver.rate_limiter = self.rate_limiter
         os.makedirs(self.save_dir, exist_ok=True)
 
     @classmethod
@@ -35,151 +62,309 @@ class YouTubeService:
         """
         Extract and return the video ID from a YouTube URL.
 
+        Recognizes `watch?v=` URLs on youtube.com, m.youtube.com and music.youtube.com, `youtu.be/<id>`
+        short links and `/shorts/`, `/embed/` and `/live/` paths.
+
         Args:
             youtube_url (str): URL of the YouTube video.
 
         Returns:
             str: The video ID if successfully extracted, else None.
         """
-        parsed_url = urlparse(youtube_url)
-        if parsed_url.hostname != "www.youtube.com":
+        parsed_url = urlparse(youtube_url.strip())
+        hostname = (parsed_url.hostname or "").lower()
+        path_parts = [part for part in parsed_url.path.split("/") if part]
+
+        if hostname == "youtu.be":
+            video_id = path_parts[0] if path_parts else None
+        elif hostname in YOUTUBE_HOSTS:
+            parameters = parse_qs(parsed_url.query)
+            if path_parts == ["watch"] and parameters.get("v"):
+                video_id = parameters["v"][0]
+            elif len(path_parts) >= 2 and path_parts[0] in VIDEO_PATH_PREFIXES:
+                video_id = path_parts[1]
+            else:
+                return None
+        else:
             return None
-        
-        parameters = parse_qs(parsed_url.query)
-        if 'v' not in parameters or len(parameters['v']) == 0:
+
+        if video_id is None or not VIDEO_ID_PATTERN.match(video_id):
             return None
-        return parameters['v'][0]
-    
+        return video_id
 
-    def __format_timestamp(self, seconds):
+
+    @staticmethod
+    def watch_url(video_id):
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+
+    def expand_url(self, url, max_videos=None):
         """
-        Format a given time in seconds to SRT timestamp format.
+        Expand a video, playlist or channel URL into the videos it refers to. Playlists and channels are
+        listed with yt_dlp flat extraction, which reads the listing pages without visiting every video.
 
         Args:
-            seconds (float): Time in seconds.
+            url (str): URL of a video, a playlist (`list=` parameter) or a channel.
+            max_videos (int, optional): stop after this many videos.
 
         Returns:
-            str: Timestamp in SRT format (HH:MM:SS,mmm).
+            list of (str, str): Video ids with their watch URLs, in listing order and without duplicates.
+                Empty for URLs outside YouTube.
         """
-        millisec = int((seconds - int(seconds)) * 1000)
-        hours, seconds = divmod(int(seconds), 3600)
-        minutes, seconds = divmod(seconds, 60)
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millisec:03d}"
-    
+        video_id = self.extract_video_id(url)
+        if video_id is not None and "list" not in parse_qs(urlparse(url).query):
+            return [(video_id, self.watch_url(video_id))]
+        if (urlparse(url.strip()).hostname or "").lower() not in YOUTUBE_HOSTS:
+            return []
+
+        videos = {}
+        pending = [url]
+        ydl_opts = {"quiet": True, "extract_flat": "in_playlist", "skip_download": True}
+        if max_videos:
+            ydl_opts["playlistend"] = max_videos
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # A channel lists its tabs (videos, shorts, live) as nested playlists
+            while pending and (not max_videos or len(videos) < max_videos):
+                self.rate_limiter.acquire()
+                with metrics.timed("playlist_expand"):
+                    info = ydl.extract_info(pending.pop(0), download=False)
+                for entry in info.get("entries") or [info]:
+                    if entry is None:
+                        continue
+                    entry_id = entry.get("id")
+                    if entry.get("ie_key", "Youtube") == "Youtube" and entry_id and VIDEO_ID_PATTERN.match(entry_id):
+                        videos.setdefault(entry_id, self.watch_url(entry_id))
+                    elif entry.get("url") and entry.get("_type") in ("url", "playlist"):
+                        pending.append(entry["url"])
+                    if max_videos and len(videos) >= max_videos:
+                        break
+        return list(videos.items())
 
-    def __generate_subtitles_from_audio(self, audio_file, model_name="medium"):
+    
+    def __transcribe_audio(self, audio_file, model_name="medium"):
         """
-        Transcribe an audio file to subtitles in SRT using faster Whisper.
+        Transcribe an audio file with faster Whisper, yielding segments as they are decoded.
 
         Args:
             audio_file (str): Path to the audio file.
             model_name (str): Whisper model size (default is "medium").
 
-        Returns:
-            str: Subtitles in SRT format.
+        Yields:
+            Segment: Each transcribed segment, with times in seconds.
         """
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        compute_type = "float16" if device == "cuda" else "int8"
-        model = WhisperModel(model_name, device=device, compute_type=compute_type)
-        
-        segments, _ = model.transcribe(audio_file, beam_size=5)
-        
-        srt_str = ''
-        
-        for i, segment in enumerate(segments, start=1):
-            srt_str += f"{i}\n"
-            srt_str += f"{self.__format_timestamp(segment.start)} --> {self.__format_timestamp(segment.end)}\n"
-            srt_str += f"{segment.text.strip()}\n\n"
-        return srt_str
-    
+        if self.whisper_model is None:
+            self.whisper_model = LazyWhisperModel(model_name, idle_timeout=None, num_workers=self.transcribe_workers)
+
+        with self.whisper_model.acquire() as model:
+            if self.transcribe_workers > 1:
+                segments = transcribe_chunked(
+                    model, audio_file, self.transcribe_workers, self.chunk_seconds, self.chunk_overlap, beam_size=5
+                )
+            else:
+                segments, _ = model.transcribe(audio_file, beam_size=5)
+                segments = ((segment.start, segment.end, segment.text) for segment in segments)
+            for start, end, text in segments:
+                yield Segment(start, end, text)
+
+
+    def __whisper_key(self, model_name="medium"):
+        """
+        Settings that change the Whisper output, to key transcriptions in the artifact store.
+        """
+        if self.whisper_model is None:
+            return f"{model_name}:auto"
+        return f"{self.whisper_model.model_name}:{self.whisper_model.compute_type or 'auto'}"
+
+
+    def __transcript_key(self):
+        """
+        Settings that change the picked caption track, to key transcripts in the artifact store.
+        """
+        return f"{','.join(self.transcript_resolver.policy)}:{','.join(self.transcript_resolver.languages)}"
+
 
     def __download_audio(self, youtube_url, video_id=None):
         """
-        Download the audio track of a YouTube video.
+        Download the audio track of a YouTube video into the artifact store.
 
         Args:
             youtube_url (str): The full URL of the YouTube video.
             video_id (str, optional): The video ID. If None, it will be extracted from the URL.
 
         Returns:
-            None
+            dict: The "path", "format" and "size" of the stored audio file.
         """
-        output_path = "audio/"
         if video_id is None:
             video_id = self.extract_video_id(youtube_url)
 
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': output_path + video_id + '.%(ext)s',
-            'quiet': True
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([youtube_url])
+        with self.artifact_store.staging_dir() as staging:
+            ydl_opts = {
+                'format': 'bestaudio/best',
+                'outtmpl': os.path.join(staging, video_id + '.%(ext)s'),
+                'quiet': True
+            }
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(youtube_url, download=True)
+                # bestaudio is usually .webm or .m4a, only yt_dlp knows which
+                downloads = info.get("requested_downloads") or [{}]
+                audio_file = downloads[0].get("filepath") or ydl.prepare_filename(info)
+            return self.artifact_store.put_file("audio", video_id, audio_file)
+
+
+    def stream_subtitle(self, youtube_url, log=False, logger=None, force_download_audio=False, on_transcribe=None, save_srt=None,
+                        on_source=None, transcribe_on_error=False):
+        """
+        Yield the merged subtitle segments of a YouTube video. If the video has no caption track, download
+        the audio and yield sentences while the Whisper model is still transcribing, so they can be
+        embedded and stored before the whole video is processed.
+
+        Args: youtube_url (str): The full URL of the YouTube video.
+              on_transcribe (callable, optional): called before falling back to audio transcription.
+              save_srt (bool, optional): write the merged segments to `{save_dir}/{video_id}.srt` once
+                  they are all produced. Defaults to the service setting.
+              on_source (callable, optional): called with the source of the subtitles, a caption track
+                  source of `TranscriptResolver` or "whisper".
+              transcribe_on_error (bool): fall back to audio transcription when the caption tracks could
+                  not be fetched, instead of raising `TranscriptFetchError` for the caller to retry later.
+
+        Yields: Segment for each merged sentence
+        """
+        video_id = self.extract_video_id(youtube_url)
+        if video_id is None:
+            return
+
+        if save_srt is None:
+            save_srt = self.save_srt
+        srt_file_path = os.path.join(self.save_dir, f"{video_id}.srt")
+        merger = SentenceMerger()
+        merged_segments = []
 
+        # Whisper only runs when the video has no caption track at all
+        transcript = None
+        transcript_key = self.__transcript_key()
+        if not force_download_audio:
+            transcript = self.artifact_store.get_json("transcript", video_id, transcript_key)
+        if not force_download_audio and transcript is None:
+            try:
+                transcript = self.transcript_resolver.resolve(video_id)
+                self.artifact_store.put_json("transcript", video_id, transcript, transcript_key)
+            except NoTranscriptError as e:
+                if log:
+                    logger.info(f"{video_id} No caption track: {e}")
+            except TranscriptFetchError as e:
+                if not transcribe_on_error:
+                    raise
+                if log:
+                    logger.info(f"{video_id} Caption tracks unavailable, transcribing instead: {e}")
+
+        if transcript:
+            if on_source is not None:
+                on_source(transcript["source"])
+            for entry in transcript["entries"]:
+                merged_segments += merger.feed(entry["start"], entry["start"] + entry["duration"], entry["text"])
+            merged_segments += merger.flush()
+            if save_srt:
+                write_srt(srt_file_path, merged_segments)
+                print(f"Generated and saved subtitles: {srt_file_path}")
+            if log:
+                logger.info(f"{video_id} Fetched {transcript['source']} {transcript['language']} subtitles from the API.")
+            yield from merged_segments
+            return
+
+        if on_transcribe is not None:
+            on_transcribe()
+        if on_source is not None:
+            on_source(WHISPER)
+        whisper_key = self.__whisper_key()
+        fragments = self.artifact_store.get_json("whisper", video_id, whisper_key)
+        if fragments is not None:
+            if log:
+                logger.info(f"{video_id} Reused a stored transcription.")
+            for start, end, text in fragments:
+                merged_segments += merger.feed(start, end, text)
+            merged_segments += merger.flush()
+            yield from merged_segments
+        else:
+            # generate subtitle from audio, keeping the file from eviction until it is transcribed
+            with self.artifact_store.use("audio", video_id) as audio:
+                if audio is None:
+                    print(f"Donwnloading audio of {youtube_url}...")
+                    self.rate_limiter.acquire()
+                    with metrics.timed("audio_download"):
+                        audio = self.__download_audio(youtube_url, video_id)
+                    if log:
+                        logger.info(f"{video_id} Audio downloaded.")
+                elif log:
+                    logger.info(f"{video_id} Reused stored audio.")
+
+                print("Transcribing...")
+
+                fragments = []
+                # Only the time spent inside Whisper counts, not the embedding done by the consumer between yields
+                for fragment in metrics.timed_iter("whisper", self.__transcribe_audio(audio["path"])):
+                    fragments.append((fragment.start, fragment.end, fragment.text))
+                    for segment in merger.feed(fragment.start, fragment.end, fragment.text):
+                        merged_segments.append(segment)
+                        yield segment
+                for segment in merger.flush():
+                    merged_segments.append(segment)
+                    yield segment
+            if fragments:
+                self.artifact_store.put_json("whisper", video_id, fragments, whisper_key)
+
+        if not merged_segments:
+            print("Failed to generate subtitles.")
+            return
+
+        if save_srt:
+            write_srt(srt_file_path, merged_segments)
+            print(f"Generated and saved subtitles: {srt_file_path}")
+        if log:
+            logger.info(f"{video_id} Audio transcription completed.")
 
-    def fetch_subtitle(self, youtube_url, log=False, logger=None, force_download_audio=False):
+
+    def fetch_subtitle(self, youtube_url, log=False, logger=None, force_download_audio=False, on_transcribe=None):
         """
         Fetch and save the subtitle in SRT format for a YouTube video. If unavailable, download the audio 
         and generate subtitles using a Whisper model.
 
         Args: youtube_url (str): The full URL of the YouTube video.
+              on_transcribe (callable, optional): called before falling back to audio transcription.
 
         Returns: str (srt file path) or None
         """
-        start_time = time.time()
         video_id = self.extract_video_id(youtube_url)
         if video_id is None:
             return False
-        
-        srt_file_path = os.path.join(self.save_dir, f"{video_id}.srt")
-        
-        # Attempt to fetch subtitles using YouTubeTranscriptApi
-        if not force_download_audio:
-            try:
-                transcript = YouTubeTranscriptApi.get_transcript(video_id)
-                formatter = SRTFormatter()
 
-                srt_formatted = formatter.format_transcript(transcript)
-                with open(srt_file_path, "w", encoding="utf-8") as srt_file:
-                    srt_file.write(srt_formatted)
-                merge_srt_sentences(srt_file_path)
-                print(f"Generated and saved subtitles: {srt_file_path}")
-                end_time = time.time()
-                if log:
-                    logger.info(f"{video_id} Fetched subtitles directly from API. Time taken: {end_time - start_time:.2f} seconds.")
-                return srt_file_path
-            except:
-                pass
-        
-        start_download_time = time.time()
-        # generate subtitle from audio
-        audio_file = f"audio/{video_id}.webm"
-        print(f"Donwnloading audio of {youtube_url}...")
-        self.__download_audio(youtube_url, video_id)
+        segments = list(self.stream_subtitle(youtube_url, log, logger, force_download_audio, on_transcribe, save_srt=True, transcribe_on_error=True))
+        if not segments:
+            return None
+        return os.path.join(self.save_dir, f"{video_id}.srt")
+    
 
-        end_download_time = time.time()
-        if log:
-            logger.info(f"{video_id} Audio downloaded. Time taken: {end_download_time - start_download_time:.2f} seconds.")
+    def fetch_info(self, youtube_url):
+        """
+        Fetch the title, description and chapters of a YouTube video in one request.
 
-        print("Transcribing...")
+        Args: youtube_url (str): The full URL of the YouTube video.
+
+        Returns: dict with "title" (str), "description" (str), "chapters" (list of dict with
+                 "start_time", "end_time" and "title", empty when the video has none), "channel" (str or None)
+                 and "upload_date" (int YYYYMMDD or None)
+        """
+        ydl_opts = {"quiet": True}
+        self.rate_limiter.acquire()
+        with metrics.timed("metadata_fetch"), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=False)
+        return {
+            "title": info.get("title", "Unknown"),
+            "description": info.get("description", "No description"),
+            "chapters": info.get("chapters") or [],
+            "channel": info.get("channel") or info.get("uploader"),
+            "upload_date": int(info["upload_date"]) if info.get("upload_date") else None,
+        }
 
-        srt_content = self.__generate_subtitles_from_audio(audio_file)
-        if srt_content:
-            with open(srt_file_path, "w", encoding="utf-8") as srt_file:
-                srt_file.write(srt_content)
-            merge_srt_sentences(srt_file_path)
-            
-            print(f"Generated and saved subtitles: {srt_file_path}")
-            end_transcribe_time = time.time()
-            
-            if log:
-                logger.info(f"{video_id} Audio transcription completed. Time taken: {end_transcribe_time - end_download_time:.2f} seconds.")
-            return srt_file_path
-        
-        print("Failed to generate subtitles.")
-        return None
-    
 
     def fetch_metadata(self, youtube_url):
         """ 
@@ -189,12 +374,8 @@ class YouTubeService:
 
         Returns: title (str), description (str)
         """
-        ydl_opts = {"quiet": True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=False)
-            title = info.get("title", "Unknown")
-            description = info.get("description", "No description")
-        return title, description
+        info = self.fetch_info(youtube_url)
+        return info["title"], info["description"]
 
 
     # def summarize_subtitle(self, srt_file, max_length=150):
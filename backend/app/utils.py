@@ -1,94 +1,326 @@
+import json
 import srt
 import re
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+
+class Segment:
+    """
+    A subtitle segment with start and end in seconds.
+    """
+    __slots__ = ("start", "end", "text")
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+
+    def __repr__(self):
+        return f"Segment({self.start:.3f}, {self.end:.3f}, {self.text!r})"
+
+
+    @property
+    def start_timestamp(self):
+        """
+        Start formatted as H:MM:SS[.ffffff], the format stored in segment metadata.
+        """
+        return format_timestamp(self.start)
+
+
+    def to_metadata(self):
+        return {
+            "start": self.start_timestamp,
+            "text": self.text,
+            "start_seconds": self.start,
+            "end_seconds": self.end,
+        }
+
+
+def format_timestamp(seconds):
+    """
+    Format seconds as an H:MM:SS[.ffffff] timestamp.
+    """
+    return str(timedelta(seconds=seconds))
+
+
+def format_hms(seconds):
+    """
+    Format seconds as an HH:MM:SS timestamp, the form shown by the extension.
+    """
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_timestamp_seconds(timestamp):
+    """
+    Parse an H:MM:SS[.ffffff] timestamp into seconds.
+    """
+    hours, minutes, seconds = timestamp.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
 
 def parse_srt(srt_text):
     """
     Parse SRT subtitles into structured segments. 
     """
-    subtitles = list(srt.parse(srt_text))
-    return [{"start": str(sub.start), "text": sub.content} for sub in subtitles]
+    return [
+        Segment(sub.start.total_seconds(), sub.end.total_seconds(), sub.content)
+        for sub in srt.parse(srt_text)
+    ]
 
 
-def merge_srt_sentences(file_path: str):
+def format_srt_timestamp(seconds):
     """
-    Reads an SRT file, merges subtitle fragments into complete sentences,
-    and rewrites the SRT file with adjusted timestamps.
+    Format a given time in seconds to SRT timestamp format (HH:MM:SS,mmm).
+    """
+    millisec = int(round(seconds * 1000))
+    hours, millisec = divmod(millisec, 3600000)
+    minutes, millisec = divmod(millisec, 60000)
+    seconds, millisec = divmod(millisec, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millisec:03d}"
 
-    Args:
-        file_path (str): Path to the SRT file to process.
-    """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        subtitles = list(srt.parse(file.read()))
-    
-    merged_subtitles = []
-    buffer_text = ""
-    start_time = None
-
-    for subtitle in subtitles:
-        buffer_text += " " + subtitle.content.strip()
-        buffer_text = buffer_text.strip()  
-        
-        if start_time is None:
-            start_time = subtitle.start
-        
-        if buffer_text.endswith(('.', '!', '?')):
-            merged_subtitles.append(
-                srt.Subtitle(
-                    index=len(merged_subtitles) + 1,
-                    start=start_time,
-                    end=subtitle.end,
-                    content=buffer_text
-                )
-            )
-            buffer_text = ""
-            start_time = None
 
+def compose_srt(segments):
+    """
+    Compose segments into SRT text.
+    """
+    return "".join(
+        f"{i}\n{format_srt_timestamp(seg.start)} --> {format_srt_timestamp(seg.end)}\n{seg.text}\n\n"
+        for i, seg in enumerate(segments, start=1)
+    )
+
+
+class SentenceMerger:
+    """
+    Incrementally merge subtitle fragments into complete sentences.
+
+    Fragments are fed one at a time, e.g. straight from a transcription generator, and each
+    call returns the sentences completed by that fragment.
+    """
+    def __init__(self):
+        self.parts = []
+        self.start_time = None
+        self.end_time = None
+
+
+    def __emit(self):
+        segment = Segment(self.start_time, self.end_time, " ".join(self.parts))
+        self.parts = []
+        self.start_time = None
+        return segment
+
+
+    def feed(self, start, end, text):
+        """
+        Args:
+            start (float): Start of the fragment in seconds.
+            end (float): End of the fragment in seconds.
+            text (str): Fragment text.
+
+        Returns:
+            list of Segment: Sentences completed by this fragment.
+        """
+        text = text.strip()
+        if text:
+            self.parts.append(text)
+        if not self.parts:
+            return []
+        if self.start_time is None:
+            self.start_time = start
+        self.end_time = end
+
+        if text.endswith(('.', '!', '?')):
+            return [self.__emit()]
+        return []
+
+
+    def flush(self):
+        """
+        Returns:
+            list of Segment: The trailing fragment that never ended a sentence, if any.
+        """
+        if self.parts:
+            return [self.__emit()]
+        return []
+
+
+def write_srt(file_path, segments):
+    """
+    Write segments to an SRT file.
+    """
     with open(file_path, 'w', encoding='utf-8') as file:
-        file.write(srt.compose(merged_subtitles))
+        file.write(compose_srt(segments))
+
+
+TIMESTAMP_PATTERN = re.compile(r'\b(?:(\d{1,2}):)?([0-5]?\d):([0-5]\d)(?:\.\d+)?\b')
+JSON_DECODER = json.JSONDecoder()
+REASON_PATTERN = re.compile(r'Reason:\s*(.*)', flags=re.IGNORECASE)
+BLOCK_SEPARATOR_PATTERN = re.compile(r'\n\s*\n')
+
 
+def timestamp_to_seconds(value):
+    """
+    Convert a number of seconds, a numeric string or an H:MM:SS / MM:SS timestamp into whole seconds.
+
+    Returns:
+        int: The seconds, or None if the value is not a timestamp.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return max(int(value), 0)
+    if isinstance(value, str):
+        value = value.strip().rstrip("s")
+        if value.isdigit():
+            return int(value)
+        match = TIMESTAMP_PATTERN.search(value)
+        if match is not None:
+            hours, minutes, seconds = match.groups()
+            return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    return None
 
-def extract_timestamps(input_string):
-    pattern = r'\b(?:[0-9]|[0-9]{2}):[0-5][0-9]:[0-5][0-9]\b'
 
-    timestamps = re.findall(pattern, input_string)
-    return timestamps
+def parse_timestamp_response(text):
+    """
+    Parse the timestamps an LLM picked and its reasons.
+
+    JSON objects with a "start" (seconds or a timestamp string) and a "reason" are read wherever they
+    appear, e.g. inside a code fence or an unfinished streamed array. Without any, blocks of
+    "- Timestamp: HH:MM:SS" and "- Reason: ..." lines separated by blank lines are parsed instead.
 
+    Args:
+        text (str): LLM response.
 
-def extract_timestamps_explaination(input_str):
-    chunks = [chunk.strip() for chunk in input_str.strip().split("\n\n")]
+    Returns:
+        list of (int, str): Start seconds and reason of each timestamp, in response order.
+    """
+    parsed = []
+    # Objects are decoded from every opening brace, as a reason can hold braces of its own and a
+    # wrapping object, e.g. {"timestamps": [...]}, holds the timestamp objects
+    position = text.find("{")
+    while position != -1:
+        try:
+            item, end = JSON_DECODER.raw_decode(text, position)
+        except ValueError:
+            item, end = None, position + 1
+        start = None
+        if isinstance(item, dict):
+            start = next((item[key] for key in ("start", "seconds", "timestamp", "time") if key in item), None)
+            start = timestamp_to_seconds(start)
+        if start is not None:
+            parsed.append((start, str(item.get("reason") or "").strip()))
+        else:
+            end = position + 1
+        position = text.find("{", end)
+    if parsed:
+        return parsed
 
-    parsed_data = []
-    unique_data = {}
-    for chunk in chunks:
-        lines = chunk.split("\n")
-        timestamp = lines[0].replace("- Timestamp: ", "").strip()
-        pattern = r'\b(?:[0-9]|[0-9]{2}):[0-5][0-9]:[0-5][0-9]\b'
+    for block in BLOCK_SEPARATOR_PATTERN.split(text.strip()):
+        match = TIMESTAMP_PATTERN.search(block)
+        if match is None:
+            continue
+        reason = REASON_PATTERN.search(block)
+        reason = reason.group(1) if reason is not None else block[match.end():]
+        parsed.append((timestamp_to_seconds(match.group(0)), reason.strip(" \n:-[]")))
+    return parsed
 
-        timestamp = re.findall(pattern, timestamp)
-        if len(timestamp):
-            timestamp = timestamp[0]
-        reason = lines[1].replace("- Reason: ", "").strip()
-        unique_data[timestamp] = reason
 
-    parsed_data = [[timestamp, reason] for timestamp, reason in unique_data.items()]
-    
-    return parsed_data
+def group_timestamps(seconds, reasons, interval_sec=60):
+    """
+    Sort timestamps and drop the ones closer than `interval_sec` to the previous timestamp, so that a
+    run of close timestamps is reduced to its first one. A timestamp given more than once keeps its
+    last reason.
 
+    Args:
+        seconds (list of int): Start seconds.
+        reasons (list of str): Reason of each timestamp.
+        interval_sec (int): Min distance between two returned timestamps.
 
-def group_timestamps_with_reasons(data, interval_sec=60):
-    # Extract timestamps and convert them to datetime objects
-    time_objects = [(datetime.strptime(ts, "%H:%M:%S"), reason) for ts, reason in data]
-    grouped = []
-    previous_time = None
+    Returns:
+        list of (str, str): HH:MM:SS timestamps and their reasons, in time order.
+    """
+    seconds = np.maximum(np.asarray(seconds, dtype=np.int64), 0)
+    if not seconds.size:
+        return []
+    # np.unique of the reversed array finds the last occurrence of every timestamp
+    unique, reversed_index = np.unique(seconds[::-1], return_index=True)
+    last_index = seconds.size - 1 - reversed_index
+    keep = np.ones(unique.size, dtype=bool)
+    keep[1:] = np.diff(unique) >= interval_sec
+    return [(format_hms(start), reasons[i]) for start, i in zip(unique[keep].tolist(), last_index[keep].tolist())]
 
-    for current_time, reason in time_objects:
-        # If this is the first timestamp or the time difference is >= 1 minute, add to the group
-        if previous_time is None or current_time - previous_time >= timedelta(seconds=interval_sec):
-            grouped.append((current_time, reason))
-        previous_time = current_time
 
-    # Convert grouped datetime objects back to strings
-    grouped_timestamps = [(time.strftime("%H:%M:%S"), reason) for time, reason in grouped]
-    return grouped_timestamps
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """
+    Fuse several ranked lists of ids with reciprocal rank fusion.
+
+    Args:
+        ranked_lists (list of list of str): Ids ordered from best to worst, one list per query.
+        k (int): RRF damping constant.
+
+    Returns:
+        list of (str, float): Ids with their fused score, best first. Ties keep first-seen order.
+    """
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, item_id in enumerate(ranked):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def parse_upload_date(value):
+    """
+    Parse a YYYY-MM-DD or YYYYMMDD date into the YYYYMMDD integer stored with video metadata.
+
+    Returns:
+        int: The date, or None for an empty value.
+    """
+    if value in (None, ""):
+        return None
+    digits = str(value).replace("-", "")
+    if len(digits) != 8 or not digits.isdigit():
+        raise ValueError(f"Invalid date: {value}, expected YYYY-MM-DD")
+    return int(digits)
+
+
+def normalize_query(query_text):
+    """
+    Normalize a user query for cache lookups: lowercase and collapse whitespace.
+    """
+    return " ".join(query_text.lower().split())
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: at most `rate` calls per second on average, with bursts of `burst`.
+    A rate of 0 disables limiting.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
 
+    def acquire(self):
+        """
+        Block until a call is allowed.
+        """
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,121 @@
+"""
+Warm-up of a new node from precomputed bundles: ingest videos into one ChromaDB store, export them as
+bundles, then time the bulk import into a fresh store, a re-import over it (skipped as already
+imported) and a forced one, and the lazy import of single videos on their first request. Transcripts, metadata and embeddings come from the
+local stand-ins in benchmarks.fakes, so no model or network is needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_bundles --videos 1000 --output benchmarks/results/bundles.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import chromadb
+
+from benchmarks.offline_suite import percentiles, rss_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=200, help="videos exported and imported")
+    parser.add_argument("--lazy-samples", type=int, default=20, help="videos imported one by one on first request")
+    parser.add_argument("--embedding-dimensions", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=512, help="segments upserted per chunk")
+    parser.add_argument("--storage-mode", choices=["per_video", "shared"], default="shared")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from app.services import ChromaDBService, VideoBundleService
+        from benchmarks.fakes import FakeYouTubeService, HashEmbeddingBackend, HashEmbeddingFunction
+
+        embedding_backend = HashEmbeddingBackend(args.embedding_dimensions)
+
+        def make_store(name):
+            return ChromaDBService(
+                chroma_client=chromadb.PersistentClient(path=os.path.join(workdir, name)),
+                storage_mode=args.storage_mode,
+                embedding_batch_size=args.batch_size,
+                embedding_backend=embedding_backend,
+                metadata_embedding_function=HashEmbeddingFunction(embedding_backend),
+            )
+
+        youtube = FakeYouTubeService(os.path.join(workdir, "subtitles"))
+        source = make_store("source")
+        video_ids = [f"bundle{i:06d}" for i in range(args.videos + args.lazy_samples)]
+        segment_count = 0
+        start_time = time.perf_counter()
+        for video_id in video_ids:
+            info = youtube.fetch_info(youtube.watch_url(video_id))
+            source.store_metadata(video_id, info["title"], info["description"], info["channel"], info["upload_date"])
+            segment_count += source.store_subtitle_segments(youtube.transcript(video_id), video_id)
+        ingest_seconds = time.perf_counter() - start_time
+
+        bundle_dir = os.path.join(workdir, "bundles")
+        exporter = VideoBundleService(source, bundle_dir)
+        start_time = time.perf_counter()
+        for video_id in video_ids:
+            exporter.export(video_id)
+        export_seconds = time.perf_counter() - start_time
+        bundle_bytes = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(bundle_dir) for name in names)
+
+        bulk_ids, lazy_ids = video_ids[:args.videos], video_ids[args.videos:]
+        target = make_store("target")
+        importer = VideoBundleService(target, bundle_dir)
+        start_time = time.perf_counter()
+        for video_id in bulk_ids:
+            importer.load(video_id)
+        import_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for video_id in bulk_ids:
+            importer.load(video_id)
+        reimport_seconds = time.perf_counter() - start_time
+        forced_ids = bulk_ids[:args.lazy_samples]
+        start_time = time.perf_counter()
+        for video_id in forced_ids:
+            importer.load(video_id, force=True)
+        forced_seconds = time.perf_counter() - start_time
+
+        lazy_samples = []
+        for video_id in lazy_ids:
+            lazy_start = time.perf_counter()
+            importer.ensure_loaded(video_id)
+            lazy_samples.append(time.perf_counter() - lazy_start)
+        mismatched = [video_id for video_id in video_ids if len(target.get_segments(video_id)) != len(source.get_segments(video_id))]
+
+        bulk_segments = sum(len(source.get_segments(video_id)) for video_id in bulk_ids)
+        results = {
+            "videos": len(bulk_ids),
+            "segments": bulk_segments,
+            "ingest_seconds": ingest_seconds,
+            "export": {"seconds": export_seconds, "videos_per_second": len(video_ids) / export_seconds, "bytes": bundle_bytes},
+            "import": {"seconds": import_seconds, "videos_per_second": len(bulk_ids) / import_seconds,
+                       "segments_per_second": bulk_segments / import_seconds},
+            "reimport": {"seconds": reimport_seconds, "videos_per_second": len(bulk_ids) / reimport_seconds},
+            "forced_reimport": {"seconds": forced_seconds, "videos_per_second": len(forced_ids) / forced_seconds},
+            "lazy_load": percentiles(lazy_samples),
+            "mismatched_videos": mismatched,
+            "rss_mb": rss_mb(),
+        }
+        print(f"ingested {len(video_ids)} videos ({segment_count} segments) in {ingest_seconds:.1f} s")
+        print(f"exported {len(video_ids)} bundles ({bundle_bytes / 1024 ** 2:.1f} MB) in {export_seconds:.1f} s")
+        print(f"imported {len(bulk_ids)} videos ({bulk_segments} segments) in {import_seconds:.1f} s "
+              f"({len(bulk_ids) / import_seconds:.0f} videos/s), re-imported in {reimport_seconds:.1f} s")
+        print(f"forced re-import of {len(forced_ids)} videos in {forced_seconds:.1f} s ({len(forced_ids) / forced_seconds:.0f} videos/s)")
+        print(f"lazy load p50 {results['lazy_load']['p50_ms']:.1f} ms, p95 {results['lazy_load']['p95_ms']:.1f} ms, "
+              f"{len(mismatched)} mismatched videos, rss {rss_mb():.0f} MB")
+
+    if output is not None:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump({"generated_at": time.time(), "args": vars(args), "results": results}, file, indent=2)
+        print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
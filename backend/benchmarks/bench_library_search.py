@@ -0,0 +1,104 @@
+"""
+Library search at increasing corpus sizes: time to add the segments of more videos to the shared
+collection's ANN index, then latency of ChromaDBService.library_search without filters, with a
+channel filter and with an upload date range. Transcripts, metadata and embeddings come from the
+local stand-ins in benchmarks.fakes, so no model or network is needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_library_search --segments 10000 100000 1000000 --queries 50 \\
+        --output benchmarks/results/library_search.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import chromadb
+
+from benchmarks.offline_suite import percentiles, rss_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, nargs="+", default=[10000, 100000],
+                        help="corpus sizes in segments, measured in increasing order on one growing index")
+    parser.add_argument("--queries", type=int, default=50, help="queries per corpus size and filter")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--embedding-dimensions", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=512, help="segments embedded and added per chunk")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from app.services import ChromaDBService
+        from benchmarks.fakes import FakeYouTubeService, HashEmbeddingBackend, HashEmbeddingFunction
+
+        embedding_backend = HashEmbeddingBackend(args.embedding_dimensions)
+        chroma_db = ChromaDBService(
+            chroma_client=chromadb.PersistentClient(path=os.path.join(workdir, "chroma")),
+            storage_mode="shared",
+            embedding_batch_size=args.batch_size,
+            embedding_backend=embedding_backend,
+            metadata_embedding_function=HashEmbeddingFunction(embedding_backend),
+        )
+        youtube = FakeYouTubeService(os.path.join(workdir, "subtitles"))
+        queries = youtube.info["queries"]
+        rng = random.Random(0)
+
+        results = []
+        video_count = 0
+        segment_count = 0
+        for size in sorted(set(args.segments)):
+            start_time = time.perf_counter()
+            added = 0
+            while segment_count < size:
+                video_id = f"lib{video_count:07d}"
+                info = youtube.fetch_info(youtube.watch_url(video_id))
+                segments = youtube.transcript(video_id)
+                chroma_db.store_metadata(video_id, info["title"], info["description"], info["channel"], info["upload_date"])
+                chroma_db.store_subtitle_segments(segments, video_id)
+                video_count += 1
+                segment_count += len(segments)
+                added += len(segments)
+            build_seconds = time.perf_counter() - start_time
+
+            channels = [youtube.fetch_info(youtube.watch_url(f"lib{rng.randrange(video_count):07d}"))["channel"] for _ in range(args.queries)]
+            filters = {
+                "none": [{} for _ in range(args.queries)],
+                "channel": [{"channel": channel} for channel in channels],
+                "upload_date": [{"uploaded_after": 20220101, "uploaded_before": 20221231} for _ in range(args.queries)],
+            }
+            latency = {}
+            for name, kwargs_list in filters.items():
+                samples = []
+                for i, kwargs in enumerate(kwargs_list):
+                    query_start = time.perf_counter()
+                    chroma_db.library_search(queries[i % len(queries)], top_k=args.top_k, **kwargs)
+                    samples.append(time.perf_counter() - query_start)
+                latency[name] = percentiles(samples)
+
+            results.append({
+                "segments": segment_count,
+                "videos": video_count,
+                "build": {"segments": added, "seconds": build_seconds, "segments_per_second": added / build_seconds if build_seconds else None},
+                "query": latency,
+                "rss_mb": rss_mb(),
+            })
+            print(f"{segment_count:>8} segments ({video_count} videos): built {added} in {build_seconds:.1f} s "
+                  f"({added / build_seconds:.0f} segments/s), rss {rss_mb():.0f} MB")
+            for name, stats in latency.items():
+                print(f"    filter {name:<12} p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms")
+
+    if output is not None:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump({"generated_at": time.time(), "args": vars(args), "results": results}, file, indent=2)
+        print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
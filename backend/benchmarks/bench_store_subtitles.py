@@ -0,0 +1,63 @@
+"""
+Compare subtitle ingest throughput of the per-segment embedding loop against
+the batched path in ChromaDBService.store_subtitles.
+
+Usage (from the backend directory, with Ollama running):
+    python -m benchmarks.bench_store_subtitles subtitles/<video_id>.srt --batch-size 64
+"""
+import argparse
+import tempfile
+import time
+
+import ollama
+
+from app.services import ChromaDBService
+from app.utils import parse_srt
+
+
+def store_subtitles_loop(chroma_db, srt_text, video_id):
+    """
+    Previous ingest path: one embedding request and one add per segment.
+    """
+    segments = parse_srt(srt_text)
+    collection = chroma_db.chroma_client.get_or_create_collection(name=f"subtitles_{video_id}")
+    for i, seg in enumerate(segments):
+        response = ollama.embeddings(model="llama3.2", prompt=seg.text)
+        collection.add(
+            ids=[f"{video_id}_segment_{i}"],
+            embeddings=[response["embedding"]],
+            metadatas=[seg.to_metadata()]
+        )
+
+
+def run(label, fn, segment_count):
+    start_time = time.time()
+    fn()
+    elapsed = time.time() - start_time
+    print(f"{label:<10} {segment_count} segments in {elapsed:.2f} seconds ({segment_count / elapsed:.1f} segments/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("srt_file")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.srt_file, 'r', encoding='utf-8') as file:
+        srt_text = file.read()
+    segment_count = len(parse_srt(srt_text))
+
+    with tempfile.TemporaryDirectory() as loop_dir, tempfile.TemporaryDirectory() as batch_dir:
+        loop_db = ChromaDBService(chroma_persist_dir=loop_dir)
+        batch_db = ChromaDBService(
+            chroma_persist_dir=batch_dir,
+            embedding_batch_size=args.batch_size,
+            embedding_max_workers=args.max_workers,
+        )
+        run("loop", lambda: store_subtitles_loop(loop_db, srt_text, "bench"), segment_count)
+        run("batched", lambda: batch_db.store_subtitles(srt_text, "bench"), segment_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare Whisper transcription throughput of a single pass over the whole file against
+parallel chunked transcription.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_transcription audio/<video_id>.webm --workers 4 --threads 2 --model medium --compute-type int8
+"""
+import argparse
+import time
+
+from faster_whisper import decode_audio
+
+from app.services.transcription import SAMPLING_RATE, LazyWhisperModel, transcribe_chunked
+
+
+def run(label, segments, audio_seconds):
+    start_time = time.time()
+    count = sum(1 for _ in segments)
+    elapsed = time.time() - start_time
+    print(f"{label:<10} {count} segments in {elapsed:.1f} seconds ({audio_seconds / elapsed:.2f}x real time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_file")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads per worker, 0 for the default")
+    parser.add_argument("--model", default="medium")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--chunk-seconds", type=float, default=300)
+    parser.add_argument("--overlap", type=float, default=2)
+    parser.add_argument("--skip-single", action="store_true", help="only run the chunked transcription")
+    args = parser.parse_args()
+
+    audio_seconds = len(decode_audio(args.audio_file, sampling_rate=SAMPLING_RATE)) / SAMPLING_RATE
+    print(f"{args.audio_file}: {audio_seconds:.0f} seconds of audio, model {args.model} ({args.compute_type})")
+
+    if not args.skip_single:
+        single = LazyWhisperModel(args.model, idle_timeout=None, compute_type=args.compute_type)
+        with single.acquire() as model:
+            segments, _ = model.transcribe(args.audio_file, beam_size=5)
+            run("single", segments, audio_seconds)
+
+    chunked = LazyWhisperModel(
+        args.model, idle_timeout=None, compute_type=args.compute_type, cpu_threads=args.threads, num_workers=args.workers
+    )
+    with chunked.acquire() as model:
+        segments = transcribe_chunked(model, args.audio_file, args.workers, args.chunk_seconds, args.overlap)
+        run("chunked", segments, audio_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Local stand-ins for YouTube and the embedding model, so the benchmarks run without network access
+and produce comparable numbers between runs. The LLM stand-in is in benchmarks.mock_llm.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import numpy as np
+from chromadb import EmbeddingFunction
+
+from app.metrics import metrics
+from app.services import YouTubeService
+from app.services.embedding_backend import EmbeddingBackend
+from app.services.transcript_resolver import MANUAL
+from app.utils import Segment, parse_srt
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name="neural_network_lecture"):
+    """
+    Returns:
+        list of Segment, dict: The fixture's subtitle segments and its title, description and sample queries.
+    """
+    with open(os.path.join(FIXTURES_DIR, f"{name}.srt"), "r", encoding="utf-8") as file:
+        segments = parse_srt(file.read())
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), "r", encoding="utf-8") as file:
+        info = json.load(file)
+    return segments, info
+
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    kind = "hash"
+
+    def __init__(self, dimensions=384, latency=0.0):
+        """
+        Deterministic bag-of-words embeddings: every token is hashed to a random unit vector and the
+        vectors of a text are summed and normalized. Texts sharing words end up close to each other.
+
+        Args:
+            dimensions (int): vector size.
+            latency (float): seconds slept per call, to stand in for a model server.
+        """
+        super().__init__(f"bow{dimensions}")
+        self.size = dimensions
+        self.latency = latency
+        self._token_vectors = {}
+
+
+    def __token_vector(self, token):
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+
+    def _embed(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = np.zeros((len(texts), self.size), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                vectors[i] += self.__token_vector(token)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).tolist()
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """
+    Chroma embedding function over a HashEmbeddingBackend, for the metadata collection.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+
+    def __call__(self, input):
+        return [np.asarray(vector, dtype=np.float32) for vector in self.backend.embed(list(input))]
+
+
+    @staticmethod
+    def name():
+        return "hash"
+
+
+    def get_config(self):
+        return {"dimensions": self.backend.size}
+
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction(HashEmbeddingBackend(config["dimensions"]))
+
+
+    def is_legacy(self):
+        return False
+
+
+class FakeYouTubeService(YouTubeService):
+    def __init__(self, save_dir, fixture="neural_network_lecture", latency=0.0):
+        """
+        Serve the fixture transcript for the first video and a synthetic one, built from the fixture's
+        vocabulary and seeded by the video id, for every other video, so growing libraries do not
+        collapse into embedding cache hits.
+
+        Args:
+            save_dir (str): path of the srt directory.
+            fixture (str): name of the fixture in `benchmarks/fixtures`.
+            latency (float): seconds slept per transcript and metadata fetch.
+        """
+        super().__init__(save_dir=save_dir, save_srt=False)
+        self.segments, self.info = load_fixture(fixture)
+        self.fixture_video_id = None
+        self.latency = latency
+        self._vocabulary = sorted({word for seg in self.segments for word in re.findall(r"[A-Za-z]+", seg.text.lower())})
+        self._lock = threading.Lock()
+
+
+    def transcript(self, video_id):
+        with self._lock:
+            if self.fixture_video_id is None:
+                self.fixture_video_id = video_id
+        if video_id == self.fixture_video_id:
+            return self.segments
+
+        rng = random.Random(video_id)
+        segments = []
+        for seg in self.segments:
+            words = rng.choices(self._vocabulary, k=max(len(seg.text.split()), 3))
+            segments.append(Segment(seg.start, seg.end, " ".join(words).capitalize() + "."))
+        return segments
+
+
+    def stream_subtitle(self, youtube_url, log=False, logger=None, force_download_audio=False, on_transcribe=None, save_srt=None,
+                        on_source=None, transcribe_on_error=False):
+        video_id = self.extract_video_id(youtube_url)
+        if video_id is None:
+            return
+        if on_source is not None:
+            on_source(MANUAL)
+        with metrics.timed("transcript_api"):
+            if self.latency:
+                time.sleep(self.latency)
+            segments = self.transcript(video_id)
+        yield from segments
+
+
+    def fetch_info(self, youtube_url):
+        with metrics.timed("metadata_fetch"):
+            if self.latency:
+                time.sleep(self.latency)
+        video_id = self.extract_video_id(youtube_url)
+        if video_id == self.fixture_video_id:
+            return {
+                "title": self.info["title"],
+                "description": self.info["description"],
+                "chapters": self.info.get("chapters", []),
+                "channel": self.info.get("channel"),
+                "upload_date": self.info.get("upload_date"),
+            }
+        rng = random.Random(video_id)
+        return {
+            "title": f"Synthetic lecture {video_id}",
+            "description": f"Generated transcript for benchmark video {video_id}.",
+            "chapters": [],
+            "channel": f"Channel {rng.randrange(10)}",
+            "upload_date": 20200101 + rng.randrange(5) * 10000 + rng.randrange(12) * 100 + rng.randrange(28),
+        }
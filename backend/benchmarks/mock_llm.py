@@ -0,0 +1,105 @@
+"""
+OpenAI-compatible chat completions endpoint for the offline benchmarks.
+
+It does not import the app, so it can be started before the app reads its config.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = body["messages"][-1]["content"]
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        candidates = re.findall(r"^- (\d+)s: (.*)$", prompt, flags=re.MULTILINE)
+        if candidates:
+            content = json.dumps([{"start": int(start), "reason": text} for start, text in candidates[:2]], indent=1)
+        else:
+            query = re.search(r'User Query: "(.*)"', prompt)
+            words = re.findall(r"\w+", query.group(1) if query else prompt)
+            content = ", ".join(" ".join(words[i:i + 2]) for i in range(0, len(words), 2))
+
+        if body.get("stream"):
+            self.__stream(body, content)
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def __stream(self, body, content):
+        """
+        Send the content word by word as chat.completion.chunk server-sent events.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = re.findall(r"\S+\s*|\s+", content) + [None]
+        for piece in pieces:
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.server.token_latency:
+                time.sleep(self.server.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockLLMServer:
+    def __init__(self, latency=0.0, token_latency=0.0):
+        """
+        OpenAI-compatible chat completions endpoint on a free local port. Keyword prompts are
+        answered with word pairs from the query, timestamp prompts with a JSON array of the first two
+        candidates.
+
+        Args:
+            latency (float): seconds slept per completion, to stand in for the hosted model.
+            token_latency (float): seconds slept per word of a streamed completion.
+        """
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockLLMHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.token_latency = token_latency
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
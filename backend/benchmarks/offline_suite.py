@@ -0,0 +1,340 @@
+"""
+Offline benchmark suite: ingest throughput, /query_timestamp latency under concurrent load and
+memory use as the library grows, with YouTube, the embedding model and the LLM replaced by the
+local stand-ins in benchmarks.fakes. Results are written as JSON so runs can be compared.
+
+Usage (from the backend directory):
+    python -m benchmarks.offline_suite --videos 1 10 50 --requests 200 --concurrency 8 \\
+        --output benchmarks/results/latest.json --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def rss_mb():
+    """
+    Current resident set size of the process, falling back to the peak where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(workdir, llm_url, warm_cache):
+    """
+    Point every store of the app at `workdir` and the LLM client at the mock server. Must run before
+    `app` is imported, since the config is read at import time.
+    """
+    os.environ.update({
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical"),
+        "INGEST_DB_PATH": os.path.join(workdir, "ingest_jobs.sqlite3"),
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "BUNDLE_DIR": os.path.join(workdir, "bundles"),
+        "SUBTITLE_DIR": os.path.join(workdir, "subtitles"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "LLM_API_URL": llm_url,
+        "PUBLIC_API_KEY": "offline",
+        "SAVE_SRT": "0",
+    })
+    if not warm_cache:
+        # A zero TTL expires entries as soon as they are written, so every request does the full work
+        os.environ["LLM_CACHE_TTL"] = "0"
+        os.environ["QUERY_CACHE_TTL"] = "0"
+
+
+def ingest_videos(client, ingest_service, video_ids, poll_interval=0.05):
+    """
+    Submit videos through /store_video_data and wait until every job has finished.
+
+    Returns:
+        float: Seconds from the first submit until the last job finished.
+    """
+    from app.services.ingest_service import DONE, FAILED
+
+    start_time = time.perf_counter()
+    for video_id in video_ids:
+        response = client.post("/store_video_data", json={"youtube_url": f"https://www.youtube.com/watch?v={video_id}"})
+        if response.status_code >= 400:
+            raise RuntimeError(f"{video_id}: {response.get_json()}")
+    # Jobs finish roughly in submit order, so each poll only reads up to the first unfinished one. The
+    # suite shares the CPU with the server, and polling every job of a large batch would show up as
+    # query latency
+    pending = list(video_ids)
+    while pending:
+        while pending:
+            job = ingest_service.get_job(pending[0])
+            if job["state"] == FAILED:
+                raise RuntimeError(f"{pending[0]}: {job['error']}")
+            if job["state"] != DONE:
+                break
+            pending.pop(0)
+        time.sleep(poll_interval)
+    return time.perf_counter() - start_time
+
+
+def labelled_queries(segments, count, seed=0):
+    """
+    Queries made of three words of two adjacent fixture segments and two words from anywhere in the
+    fixture, each labelled with the time range of the two segments, to calibrate the fast path without
+    hand-labelled data.
+
+    Returns:
+        list of (str, float, float): The query texts with the start and end seconds that answer them.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted({word for seg in segments for word in re.findall(r"[a-z']+", seg.text.lower())})
+    queries = []
+    for _ in range(count):
+        i = rng.randrange(len(segments) - 1)
+        words = re.findall(r"[a-z']+", f"{segments[i].text} {segments[i + 1].text}".lower())
+        query_words = rng.sample(words, min(3, len(words))) + rng.sample(vocabulary, 2)
+        rng.shuffle(query_words)
+        queries.append((" ".join(query_words), segments[i].start, segments[i + 1].end))
+    return queries
+
+
+def load_test(url, video_id, queries, requests, concurrency):
+    """
+    Send `requests` queries with `concurrency` clients against a running server.
+
+    Returns:
+        dict: Latency percentiles, error count and throughput.
+    """
+    import httpx
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+
+    with httpx.Client(timeout=60, limits=httpx.Limits(max_connections=concurrency)) as http:
+        def send(i):
+            start_time = time.perf_counter()
+            response = http.post(f"{url}/query_timestamp", json={"query_text": queries[i % len(queries)], "youtube_url": youtube_url})
+            elapsed = time.perf_counter() - start_time
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(response.text)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send, range(requests)))
+        wall_time = time.perf_counter() - start_time
+
+    return {
+        **percentiles(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "concurrency": concurrency,
+        "requests_per_second": requests / wall_time,
+    }
+
+
+def print_query(label, query):
+    print(
+        f"{label}: p50 {query.get('p50_ms', 0):.1f} ms, p95 {query.get('p95_ms', 0):.1f} ms, "
+        f"p99 {query.get('p99_ms', 0):.1f} ms, {query['requests_per_second']:.1f} req/s, {query['errors']} errors"
+    )
+    if query.get("fast_path_share") is not None:
+        print(f"{label}: {query['fast_path_share']:.0%} answered without the LLM")
+
+
+def compare(results, baseline):
+    """
+    Print the relative change of the headline numbers against a previous results file.
+    """
+    def headline(run):
+        numbers = {"ingest segments/s": run["ingest"]["segments_per_second"]}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            numbers[f"query {key}"] = run["query"].get(key)
+        if run.get("query_during_ingest"):
+            numbers["query p95_ms while ingesting"] = run["query_during_ingest"].get("p95_ms")
+        numbers["rss MB at largest library"] = run["memory"][-1]["rss_mb"]
+        return numbers
+
+    current, previous = headline(results), headline(baseline)
+    print(f"\ncompared with {baseline.get('git_revision')} ({baseline.get('timestamp')})")
+    for name, value in current.items():
+        before = previous.get(name)
+        if value is None or not before:
+            continue
+        print(f"  {name:<28} {before:>10.2f} -> {value:>10.2f} ({(value - before) / before * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, nargs="+", default=[1, 10, 50], help="library sizes to grow through")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedding-dimensions", type=int, default=384)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per LLM completion")
+    parser.add_argument("--youtube-latency", type=float, default=0.0, help="seconds per transcript or metadata fetch")
+    parser.add_argument("--ingest-during-query", type=int, default=0, metavar="N",
+                        help="repeat the load test while N more videos are being ingested")
+    parser.add_argument("--fast-path-labels", type=int, default=0, metavar="N",
+                        help="calibrate the fast path on N labelled queries of the fixture before the load test")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the LLM and query result caches enabled")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    from benchmarks.mock_llm import MockLLMServer
+
+    revision = git_revision()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    with tempfile.TemporaryDirectory() as workdir, MockLLMServer(args.llm_latency) as llm_server:
+        configure_environment(workdir, llm_server.url, args.warm_cache)
+        os.chdir(workdir)
+        baseline_rss = rss_mb()
+
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        from app import app
+        from app import routes
+        from app.metrics import metrics
+        from app.services.embedding_backend import CoalescingEmbeddingBackend
+        from benchmarks.fakes import FakeYouTubeService, HashEmbeddingBackend, HashEmbeddingFunction
+
+        embedding_backend = HashEmbeddingBackend(args.embedding_dimensions, latency=args.embedding_latency)
+        routes.chroma_db.embedding_backend = embedding_backend
+        routes.chroma_db.ingest_embedding_backend = CoalescingEmbeddingBackend(embedding_backend)
+        routes.chroma_db.metadata_embedding_function = HashEmbeddingFunction(embedding_backend)
+        youtube = FakeYouTubeService(os.path.join(workdir, "subtitles"), latency=args.youtube_latency)
+        routes.ingest_service.youtube = youtube
+        client = app.test_client()
+
+        sizes = sorted(set(args.videos))
+        video_ids = [f"bench{i:06d}" for i in range(sizes[-1])]
+        memory = []
+        ingest_seconds = 0.0
+        ingested = 0
+        for size in sizes:
+            ingest_seconds += ingest_videos(client, routes.ingest_service, video_ids[ingested:size])
+            ingested = size
+            memory.append({"videos": size, "rss_mb": rss_mb(), "rss_growth_mb": rss_mb() - baseline_rss})
+            print(f"{size:>5} videos ingested, rss {memory[-1]['rss_mb']:.0f} MB")
+
+        segments = ingested * len(youtube.segments)
+        ingest = {
+            "videos": ingested,
+            "segments": segments,
+            "seconds": ingest_seconds,
+            "videos_per_second": ingested / ingest_seconds,
+            "segments_per_second": segments / ingest_seconds,
+        }
+        print(f"ingest: {segments} segments in {ingest_seconds:.2f} seconds ({ingest['segments_per_second']:.0f} segments/s)")
+
+        fast_path = None
+        if args.fast_path_labels:
+            samples = [
+                (routes.search_query_text(video_ids[0], query_text)[1], start, end)
+                for query_text, start, end in labelled_queries(youtube.segments, args.fast_path_labels)
+            ]
+            fast_path = routes.confidence_gate.calibrate(samples)
+            if fast_path["min_confidence"] is not None:
+                routes.confidence_gate.midpoint = fast_path["midpoint"]
+                routes.confidence_gate.slope = fast_path["slope"]
+                routes.confidence_gate.min_confidence = fast_path["min_confidence"]
+            print(f"fast path: midpoint {fast_path['midpoint']:.3f}, slope {fast_path['slope']:.1f}, "
+                  f"min confidence {fast_path['min_confidence']}, {fast_path['skip_share']:.0%} of the labelled queries skip the LLM")
+
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        server_url = f"http://127.0.0.1:{server.server_port}"
+        query_during_ingest = None
+        try:
+            query = load_test(server_url, video_ids[0], youtube.info["queries"], args.requests, args.concurrency)
+            counters = metrics.counters()
+            fast = counters.get('query_path_total{path="fast"}', 0)
+            answered = fast + counters.get('query_path_total{path="llm"}', 0)
+            query["fast_path_share"] = fast / answered if answered else None
+            print_query("query", query)
+
+            if args.ingest_during_query:
+                extra_ids = [f"bench{i:06d}" for i in range(len(video_ids), len(video_ids) + args.ingest_during_query)]
+                ingest_thread = threading.Thread(target=ingest_videos, args=(client, routes.ingest_service, extra_ids), daemon=True)
+                ingest_thread.start()
+                query_during_ingest = load_test(server_url, video_ids[0], youtube.info["queries"], args.requests, args.concurrency)
+                # Only meaningful if the ingest was still running when the load test ended
+                query_during_ingest["overlapped_ingest"] = ingest_thread.is_alive()
+                ingest_thread.join()
+                print_query("query while ingesting", query_during_ingest)
+        finally:
+            server.shutdown()
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": revision,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": vars(args),
+            "ingest": ingest,
+            "query": query,
+            "query_during_ingest": query_during_ingest,
+            "fast_path_calibration": fast_path,
+            "memory": memory,
+            "stages": metrics.summary(),
+        }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
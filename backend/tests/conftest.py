@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+# Importing any `app` module builds the Flask app, whose config is read at import time, so every store
+# it opens is pointed at a scratch directory first
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="vidlocator-tests-")
+
+os.environ.update({
+    "CHROMA_PERSIST_DIR": os.path.join(WORKDIR, "chroma"),
+    "EMBEDDING_CACHE_PATH": os.path.join(WORKDIR, "embedding_cache.sqlite3"),
+    "LEXICAL_INDEX_DIR": os.path.join(WORKDIR, "lexical"),
+    "INGEST_DB_PATH": os.path.join(WORKDIR, "ingest_jobs.sqlite3"),
+    "ARTIFACT_DIR": os.path.join(WORKDIR, "artifacts"),
+    "BUNDLE_DIR": os.path.join(WORKDIR, "bundles"),
+    "SUBTITLE_DIR": os.path.join(WORKDIR, "subtitles"),
+    "LOG_DIR": os.path.join(WORKDIR, "logs"),
+    "PUBLIC_API_KEY": "test",
+    "SAVE_SRT": "0",
+})
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,85 @@
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app import artifacts
+from app.artifacts import ArtifactStore
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Every put and get gets a later time, so the LRU order does not depend on the clock resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(artifacts, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def put(store, video_id):
+    # 10 bytes of JSON
+    return store.put_json("transcript", video_id, "x" * 8)
+
+
+def test_put_and_get_json(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=0)
+    store.put_json("transcript", "v", [{"start": 1.0, "text": "hello"}], model="en")
+
+    assert store.get_json("transcript", "v", model="en") == [{"start": 1.0, "text": "hello"}]
+    assert store.get_json("transcript", "v") is None
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_beyond_quota(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=25)
+    a = put(store, "a")
+    b = put(store, "b")
+    store.get("transcript", "a")
+    put(store, "c")
+
+    assert store.get("transcript", "b") is None
+    assert not os.path.exists(b["path"])
+    assert os.path.exists(a["path"])
+    assert store.get("transcript", "c") is not None
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] == 20
+
+
+def test_artifacts_in_use_are_not_evicted(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=25)
+    put(store, "a")
+    put(store, "b")
+
+    with store.use("transcript", "a") as entry:
+        put(store, "c")
+        assert os.path.exists(entry["path"])
+
+    assert store.get("transcript", "a") is not None
+    assert store.get("transcript", "b") is None
+
+
+def test_the_new_artifact_is_kept_even_above_quota(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=5)
+    put(store, "a")
+
+    assert store.get("transcript", "a") is not None
+    assert store.stats()["evictions"] == 0
+
+
+def test_files_removed_behind_the_manifest_are_misses(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=0)
+    os.remove(put(store, "a")["path"])
+
+    assert store.get("transcript", "a") is None
+    assert store.stats()["items"] == 0
+
+
+def test_delete_removes_every_artifact_of_a_video(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=0)
+    paths = [store.put_json(kind, "a", kind)["path"] for kind in ("transcript", "whisper")]
+    put(store, "b")
+
+    store.delete("a")
+
+    assert not any(os.path.exists(path) for path in paths)
+    assert store.stats()["items"] == 1
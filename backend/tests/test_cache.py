@@ -0,0 +1,124 @@
+import chromadb
+import pytest
+
+from app import cache as cache_module
+from app.cache import EmbeddingCache, ResponseCache
+from app.services.chromadb_service import ChromaDBService
+from benchmarks.fakes import HashEmbeddingBackend
+
+
+def test_embedding_cache_tiers(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many("model", ["a", "b"], [[0.5, 1.0], [2.0, -1.0]])
+
+    assert cache.get_many("model", ["a", "c", "a"]) == [[0.5, 1.0], None, [0.5, 1.0]]
+    assert cache.stats() == {"memory_hits": 2, "disk_hits": 0, "misses": 1, "memory_items": 2}
+
+    # A new process only has the disk tier
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many("model", ["b", "b"]) == [[2.0, -1.0], [2.0, -1.0]]
+    assert reopened.stats()["disk_hits"] == 2
+    assert reopened.get_many("model", ["b"]) == [[2.0, -1.0]]
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_embedding_cache_keys_include_the_model():
+    cache = EmbeddingCache(None)
+    cache.put_many("small", ["a"], [[1.0]])
+
+    assert cache.get_many("large", ["a"]) == [None]
+
+
+def test_embedding_cache_stores_float32_vectors(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(path).put_many("model", ["a"], [[0.1]])
+
+    assert EmbeddingCache(path).get_many("model", ["a"])[0] == [pytest.approx(0.1, rel=1e-6)]
+
+
+def test_embedding_cache_evicts_least_recently_used_vectors_from_memory():
+    cache = EmbeddingCache(None, max_memory_items=2)
+    cache.put_many("model", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("model", ["a"])
+    cache.put_many("model", ["c"], [[3.0]])
+
+    assert cache.get_many("model", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_embedding_cache_evicts_least_recently_used_vectors_from_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, max_disk_items=2)
+    for text in ["a", "b", "c"]:
+        cache.put_many("model", [text], [[1.0]])
+
+    assert EmbeddingCache(path).get_many("model", ["a", "b", "c"]) == [None, [1.0], [1.0]]
+
+
+def test_response_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.set("key", [["00:00:10", "reason"]])
+
+    assert cache.get("key") == [["00:00:10", "reason"]]
+    now[0] += 10
+    assert cache.get("key") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "memory_items": 0}
+
+
+def test_response_cache_persists_entries(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    ResponseCache(path=path).set("key", {"answer": 42})
+
+    assert ResponseCache(path=path).get("key") == {"answer": 42}
+    assert ResponseCache(path=path).get("other") is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert [cache.get(key) for key in ["a", "b", "c"]] == [1, None, 3]
+
+
+def test_response_cache_invalidates_a_tag():
+    cache = ResponseCache()
+    cache.set("a1", 1, tag="a")
+    cache.set("b1", 2, tag="b")
+    cache.set("untagged", 3)
+    cache.invalidate("a")
+
+    assert [cache.get(key) for key in ["a1", "b1", "untagged"]] == [None, 2, 3]
+    cache.set("a1", 4, tag="a")
+    assert cache.get("a1") == 4
+
+
+def test_response_cache_sees_invalidations_of_other_processes(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    server = ResponseCache(path=path)
+    server.set("a1", 1, tag="a")
+    server.set("b1", 2, tag="b")
+
+    ResponseCache(path=path).invalidate("a")
+
+    assert server.get("a1") is None
+    assert server.get("b1") == 2
+
+
+def test_rewriting_segments_invalidates_the_query_results_of_the_video():
+    results = ResponseCache()
+    chroma_db = ChromaDBService(
+        chroma_client=chromadb.EphemeralClient(), storage_mode="shared", shared_collection_name="subtitles_invalidate",
+        embedding_backend=HashEmbeddingBackend(8), result_cache=results,
+    )
+    results.set("a-query", [["00:00:10", "reason"]], tag="a")
+    results.set("b-query", [["00:00:20", "reason"]], tag="b")
+
+    chroma_db.delete_segments("a")
+
+    assert results.get("a-query") is None
+    assert results.get("b-query") == [["00:00:20", "reason"]]
@@ -0,0 +1,35 @@
+import chromadb
+import numpy as np
+
+from app.services.chapter_index import ChapterIndexService
+from app.utils import Segment
+
+
+def build_library(service, video_ids, count=40):
+    segments = [Segment(i * 5.0, i * 5.0 + 5, f"sentence {i}") for i in range(count)]
+    embeddings = np.random.default_rng(0).normal(size=(count, 8)).astype(np.float32)
+    for video_id in video_ids:
+        chapters = service.build(video_id, segments, embeddings, "model")
+    return embeddings, chapters
+
+
+def test_search_only_returns_chapters_of_the_video():
+    client = chromadb.EphemeralClient()
+    service = ChapterIndexService(client, collection_name="chapters_search", min_seconds=10, max_seconds=30)
+    embeddings, chapters = build_library(service, ["a", "b"])
+
+    found = service.search(embeddings[3].tolist(), "a", "model", top_k=2)
+
+    assert len(found) == 2
+    assert {chapter["video_id"] for chapter in found} == {"a"}
+    assert found[0]["distance"] <= found[1]["distance"]
+    assert all(chapter["chapter_count"] == len(chapters) for chapter in found)
+
+
+def test_search_of_a_video_without_an_index_is_empty():
+    client = chromadb.EphemeralClient()
+    service = ChapterIndexService(client, collection_name="chapters_missing", min_seconds=10, max_seconds=30)
+    embeddings, _ = build_library(service, ["a"])
+
+    assert service.search(embeddings[0].tolist(), "b", "model") == []
+    assert service.search(embeddings[0].tolist(), "a", "other-model") == []
@@ -0,0 +1,69 @@
+import chromadb
+
+from app.services.chromadb_service import ChromaDBService
+from app.utils import Segment
+from benchmarks.fakes import HashEmbeddingBackend
+
+
+def shared_service(collection_name, **kwargs):
+    return ChromaDBService(
+        chroma_client=chromadb.EphemeralClient(), storage_mode="shared", shared_collection_name=collection_name,
+        embedding_backend=HashEmbeddingBackend(16), **kwargs,
+    )
+
+
+def test_fuse_search_results_merges_vector_and_lexical_hits():
+    vector = (
+        [["v_segment_1", "v_segment_2"]],
+        {
+            "v_segment_1": {"start": "0:00:10", "text": "one", "distance": 0.2},
+            "v_segment_2": {"start": "0:00:20", "text": "two", "distance": 0.5},
+        },
+    )
+    lexical = (
+        [["v_segment_2", "v_segment_3"]],
+        {
+            "v_segment_2": {"start": "0:00:20", "text": "two", "distance": None},
+            "v_segment_3": {"start": "0:00:30", "text": "three", "distance": None},
+        },
+    )
+
+    fused = ChromaDBService.fuse_search_results([vector, lexical], rrf_k=60)
+
+    assert [segment["text"] for segment in fused] == ["two", "one", "three"]
+    # A lexical hit does not hide the distance of the same segment's vector match
+    assert [segment["distance"] for segment in fused] == [0.5, 0.2, None]
+    assert fused[0]["score"] == 1 / 62 + 1 / 61
+
+
+def test_fuse_search_results_keeps_the_best_distance():
+    first = ([["s"]], {"s": {"start": "0:00:10", "text": "s", "distance": 0.4}})
+    second = ([["s"]], {"s": {"start": "0:00:10", "text": "s", "distance": 0.1}})
+
+    fused = ChromaDBService.fuse_search_results([first, second])
+
+    assert len(fused) == 1
+    assert fused[0]["distance"] == 0.1
+
+
+def test_store_subtitle_segments_stores_chunks_while_the_stream_is_open():
+    chroma_db = shared_service("subtitles_streaming", embedding_batch_size=2)
+    stored_while_streaming = []
+
+    def transcribe():
+        for i in range(5):
+            if i == 4:
+                stored_while_streaming.append(len(chroma_db.get_segments("a")))
+            yield Segment(i * 2.0, i * 2.0 + 2, f"sentence number {i}.")
+
+    assert chroma_db.store_subtitle_segments(transcribe(), "a") == 5
+    # The first chunk is written once the second one is handed to the writer
+    assert stored_while_streaming[0] >= 2
+    assert [seg.text for seg in chroma_db.get_segments("a")] == [f"sentence number {i}." for i in range(5)]
+
+
+def test_stored_segments_keep_their_times_in_seconds():
+    chroma_db = shared_service("subtitles_segment_times")
+    chroma_db.store_subtitle_segments([Segment(0.5, 2.25, "one."), Segment(2.25, 4.125, "two.")], "a")
+
+    assert [(seg.start, seg.end, seg.text) for seg in chroma_db.get_segments("a")] == [(0.5, 2.25, "one."), (2.25, 4.125, "two.")]
@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.services.confidence import ConfidenceGate, fit_logistic
+from app.utils import format_timestamp
+
+
+def search_results(*matches):
+    """
+    `vector_search` results of one query from (start seconds, distance, text) matches, best first.
+    """
+    ranked = [f"v_segment_{i}" for i in range(len(matches))]
+    segments = {
+        segment_id: {"start": format_timestamp(start), "text": text, "distance": distance}
+        for segment_id, (start, distance, text) in zip(ranked, matches)
+    }
+    return [ranked], segments
+
+
+def test_gap_compares_with_the_best_match_elsewhere_in_the_video():
+    gate = ConfidenceGate()
+    # The second match is the same moment of the video, the third is elsewhere
+    results = search_results((10, 0.1, "best"), (30, 0.12, "near"), (300, 0.5, "far"))
+
+    assert gate.gap(results) == pytest.approx(0.8)
+    assert gate.confidence(results) == pytest.approx(1 / (1 + math.exp(-20 * (0.8 - 0.15))))
+
+
+def test_no_confidence_without_a_match_elsewhere():
+    gate = ConfidenceGate()
+    results = search_results((10, 0.1, "best"), (30, 0.12, "near"))
+
+    assert gate.gap(results) is None
+    assert gate.confidence(results) == 0.0
+
+
+def test_answer_returns_the_best_matches_when_confident():
+    gate = ConfidenceGate(min_confidence=0.5, distance_ratio=1.5)
+    results = search_results((10, 0.1, "best"), (130, 0.14, "close second"), (300, 0.5, "far"))
+
+    confidence, timestamps = gate.answer(results)
+
+    assert confidence > 0.5
+    assert timestamps == [("00:00:10", "best"), ("00:02:10", "close second")]
+
+
+def test_answer_defers_to_the_llm():
+    results = search_results((10, 0.1, "best"), (300, 0.5, "far"))
+
+    # Off by default
+    assert not ConfidenceGate().enabled
+    assert ConfidenceGate().answer(results)[1] is None
+    # Best match too far away in absolute terms
+    assert ConfidenceGate(min_confidence=0.5, max_distance=0.05).answer(results)[1] is None
+    # Gap too small
+    assert ConfidenceGate(min_confidence=0.5).answer(search_results((10, 0.48, "best"), (300, 0.5, "far")))[1] is None
+
+
+def test_fit_logistic_recovers_the_midpoint():
+    rng = np.random.default_rng(0)
+    gaps = rng.uniform(0, 1, 2000)
+    labels = rng.uniform(0, 1, 2000) < 1 / (1 + np.exp(-10 * (gaps - 0.4)))
+
+    midpoint, slope = fit_logistic(gaps, labels)
+
+    assert midpoint == pytest.approx(0.4, abs=0.05)
+    assert slope == pytest.approx(10, rel=0.3)
+
+
+def test_fit_logistic_needs_both_outcomes_and_a_positive_slope():
+    with pytest.raises(ValueError):
+        fit_logistic([0.1, 0.5], [True, True])
+    with pytest.raises(ValueError):
+        fit_logistic([0.1, 0.2, 0.8, 0.9], [True, True, False, False])
+
+
+def test_calibrate_picks_the_lowest_threshold_reaching_the_precision():
+    gate = ConfidenceGate()
+    samples = []
+    for i in range(40):
+        gap = i / 40
+        # Large gaps answer the query, small ones point elsewhere, with a few exceptions either way
+        correct = (gap > 0.5) != (i in (5, 35))
+        best_distance = 0.5 * (1 - gap)
+        results = search_results((100, best_distance, "best"), (900, 0.5, "other"))
+        samples.append((results, 90, 110) if correct else (results, 500, 520))
+
+    calibration = gate.calibrate(samples, target_precision=0.9)
+
+    assert calibration["samples"] == 40
+    assert calibration["correct"] == pytest.approx(19 / 40)
+    assert 0.3 < calibration["midpoint"] < 0.7
+    assert calibration["slope"] > 0
+    assert calibration["precision"] >= 0.9
+    assert 0 < calibration["skip_share"] <= 0.5
+    # The gate itself is left unchanged
+    assert (gate.midpoint, gate.slope, gate.min_confidence) == (0.15, 20.0, 2.0)
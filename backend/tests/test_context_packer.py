@@ -0,0 +1,68 @@
+from app.services.context_packer import ContextPacker, estimate_tokens, truncate_to_tokens
+
+
+def candidate(start, end, text, score):
+    return {"start": f"0:00:{start:02d}", "start_seconds": float(start), "end_seconds": float(end), "text": text, "score": score}
+
+
+def test_truncate_to_tokens_cuts_at_a_word_boundary():
+    assert truncate_to_tokens("short text", 10) == "short text"
+    assert truncate_to_tokens("one two three four five", 3) == "one two ..."
+    assert estimate_tokens("12345") == 2
+
+
+def test_merge_windows_joins_adjacent_segments_and_drops_duplicates():
+    packer = ContextPacker(merge_gap_seconds=5, max_window_seconds=20)
+    windows = packer.merge_windows([
+        candidate(10, 14, "b", 0.2),
+        candidate(0, 4, "a", 0.1),
+        candidate(10, 14, "b", 0.5),
+        candidate(16, 19, "c", 0.3),
+        candidate(30, 34, "d", 0.4),
+    ])
+
+    assert [(w["start_seconds"], w["end_seconds"], w["text"], w["score"]) for w in windows] == [
+        (0, 4, "a", 0.1),
+        (10, 19, "b c", 0.5),
+        (30, 34, "d", 0.4),
+    ]
+
+
+def test_merge_windows_splits_windows_longer_than_the_max_span():
+    packer = ContextPacker(merge_gap_seconds=5, max_window_seconds=10)
+    windows = packer.merge_windows([candidate(0, 4, "a", 0.1), candidate(5, 9, "b", 0.1), candidate(10, 14, "c", 0.1)])
+
+    assert [w["text"] for w in windows] == ["a b", "c"]
+
+
+def test_pack_fills_the_budget_best_window_first():
+    packer = ContextPacker(token_budget=31, description_tokens=5)
+    best, second, third = "x" * 40, "y" * 40, "z" * 40
+    description, packed = packer.pack("word " * 20, [
+        candidate(0, 4, second, 0.2),
+        candidate(100, 104, best, 0.9),
+        candidate(200, 204, third, 0.1),
+    ])
+
+    assert description == "word word word word ..."
+    # Every window line costs 13 tokens, and the description takes 6 of the 30
+    assert packed == [(100, best), (0, second)]
+
+
+def test_pack_always_keeps_the_best_window():
+    packer = ContextPacker(token_budget=40, description_tokens=0)
+    text = "word " * 100
+
+    _, packed = packer.pack("", [candidate(0, 4, text, 0.9), candidate(60, 64, "short", 0.1)])
+
+    assert packed[0][0] == 0
+    assert packed[0][1].endswith(" ...") and estimate_tokens(packed[0][1]) <= 41
+    assert len(packed) == 1
+
+
+def test_pack_without_a_budget_keeps_everything():
+    packer = ContextPacker(token_budget=0, description_tokens=0)
+    description, packed = packer.pack("long " * 1000, [candidate(0, 4, "a", 0.1), candidate(60, 64, "b", 0.9)])
+
+    assert description == "long " * 1000
+    assert packed == [(60, "b"), (0, "a")]
@@ -0,0 +1,27 @@
+import pytest
+
+from app.services.embedding_backend import EmbeddingBackend, supports_truncation
+
+
+class FixedEmbeddingBackend(EmbeddingBackend):
+    kind = "fixed"
+
+    def _embed(self, texts):
+        return [[3.0, 4.0, 12.0] for _ in texts]
+
+
+def test_truncation_is_limited_to_matryoshka_models():
+    assert supports_truncation("nomic-embed-text")
+    assert supports_truncation("nomic-embed-text:v1.5")
+    assert not supports_truncation("llama3.2")
+    assert not supports_truncation("all-MiniLM-L6-v2")
+    with pytest.raises(ValueError):
+        FixedEmbeddingBackend("llama3.2", dimensions=2)
+
+
+def test_truncated_vectors_are_renormalized():
+    backend = FixedEmbeddingBackend("nomic-embed-text", dimensions=2)
+
+    assert backend.name == "fixed:nomic-embed-text@2"
+    assert backend.embed(["text"]) == [pytest.approx([0.6, 0.8])]
+    assert FixedEmbeddingBackend("llama3.2").embed(["text"]) == [[3.0, 4.0, 12.0]]
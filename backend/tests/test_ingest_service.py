@@ -0,0 +1,143 @@
+import time
+from types import SimpleNamespace
+
+from app.services.ingest_service import DONE, EMBEDDING, FAILED, QUEUED, TRANSCRIBING, IngestService
+
+
+def insert_job(service, video_id, state):
+    service._conn.execute(
+        "INSERT INTO jobs (video_id, youtube_url, state, attempts, error, created_at, updated_at) VALUES (?, ?, ?, 1, 'boom', 0, 0)",
+        (video_id, f"https://youtu.be/{video_id}", state),
+    )
+    service._conn.commit()
+
+
+def test_mark_done_records_new_and_failed_jobs_as_done(tmp_path):
+    service = IngestService(None, None, db_path=str(tmp_path / "jobs.sqlite3"))
+    insert_job(service, "failed", FAILED)
+
+    assert service.mark_done("new", "https://youtu.be/new")["state"] == DONE
+    job = service.mark_done("failed", "https://youtu.be/failed")
+    assert (job["state"], job["error"]) == (DONE, None)
+
+
+def test_mark_done_leaves_active_jobs_running(tmp_path):
+    service = IngestService(None, None, db_path=str(tmp_path / "jobs.sqlite3"))
+    insert_job(service, "running", "embedding")
+
+    assert service.mark_done("running", "https://youtu.be/running")["state"] == "embedding"
+
+
+class FakeYouTube:
+    def __init__(self, failures=0, segments=("Hello there.",), error=RuntimeError("caption track timed out")):
+        self.failures = failures
+        self.segments = segments
+        self.error = error
+        self.calls = 0
+
+
+    def fetch_info(self, youtube_url):
+        return {"title": "Title", "description": "", "chapters": []}
+
+
+    def stream_subtitle(self, youtube_url, log, logger, force_download_audio=False, on_transcribe=None, on_source=None,
+                        transcribe_on_error=False):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        on_source("manual")
+        yield from self.segments
+
+
+class FakeStore:
+    def __init__(self, ingest_states=None):
+        self.ingest_states = ingest_states
+        self.service = None
+        self.deleted = []
+
+
+    def store_metadata(self, video_id, title, description, channel=None, upload_date=None):
+        pass
+
+
+    def delete_segments(self, video_id):
+        self.deleted.append(video_id)
+
+
+    def store_subtitle_segments(self, segments, video_id, youtube_chapters=None):
+        stored = 0
+        for segment in segments:
+            if self.ingest_states is not None:
+                self.ingest_states.append(self.service.get_job(video_id)["state"])
+            stored += 1
+        return stored
+
+
+def ingest(tmp_path, youtube, video_id="abc", **kwargs):
+    states = []
+    store = FakeStore(states)
+    service = IngestService(store, youtube, db_path=str(tmp_path / "jobs.sqlite3"), retry_backoff=0, **kwargs)
+    store.service = service
+    service.submit(video_id, f"https://youtu.be/{video_id}")
+    deadline = time.time() + 5
+    while service.get_job(video_id)["state"] not in (DONE, FAILED):
+        assert time.time() < deadline, "ingest job did not finish"
+        time.sleep(0.01)
+    return service, store, states
+
+
+def test_ingest_job_runs_to_done(tmp_path):
+    service, store, states = ingest(tmp_path, FakeYouTube())
+
+    job = service.get_job("abc")
+    assert (job["state"], job["attempts"], job["error"], job["transcript_source"]) == (DONE, 1, None, "manual")
+    assert states == [EMBEDDING]
+    assert store.deleted == ["abc"]
+
+
+def test_ingest_job_without_subtitles_fails_without_retry(tmp_path):
+    service, _, _ = ingest(tmp_path, FakeYouTube(segments=()))
+
+    job = service.get_job("abc")
+    assert (job["state"], job["attempts"], job["error"]) == (FAILED, 1, "Failed to fetch or generate subtitles.")
+
+
+def test_ingest_job_retries_transient_errors(tmp_path):
+    youtube = FakeYouTube(failures=2)
+    service, _, _ = ingest(tmp_path, youtube, max_retries=2)
+
+    job = service.get_job("abc")
+    assert (job["state"], job["attempts"], job["error"]) == (DONE, 3, None)
+    assert youtube.calls == 3
+
+
+def test_ingest_job_fails_after_max_retries(tmp_path):
+    service, _, _ = ingest(tmp_path, FakeYouTube(failures=3), max_retries=1)
+
+    job = service.get_job("abc")
+    assert (job["state"], job["attempts"], job["error"]) == (FAILED, 2, "caption track timed out")
+
+
+def test_submit_requeues_only_failed_or_forced_done_jobs(tmp_path):
+    service = IngestService(None, None, db_path=str(tmp_path / "jobs.sqlite3"))
+    service.executor.shutdown()
+    service.executor = SimpleNamespace(submit=lambda *args: None)
+    insert_job(service, "running", EMBEDDING)
+    insert_job(service, "done", DONE)
+    insert_job(service, "failed", FAILED)
+
+    assert service.submit("running", "https://youtu.be/running")["state"] == EMBEDDING
+    assert service.submit("done", "https://youtu.be/done")["state"] == DONE
+    assert service.submit("done", "https://youtu.be/done", requeue_done=True)["state"] == QUEUED
+    job = service.submit("failed", "https://youtu.be/failed")
+    assert (job["state"], job["attempts"], job["error"]) == (QUEUED, 0, None)
+
+
+def test_active_jobs_resume_on_startup(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    insert_job(IngestService(None, None, db_path=db_path), "abc", TRANSCRIBING)
+
+    service = IngestService(FakeStore(), FakeYouTube(), db_path=db_path)
+    service.executor.shutdown(wait=True)
+
+    assert service.get_job("abc")["state"] == DONE
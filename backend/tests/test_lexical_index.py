@@ -0,0 +1,68 @@
+import numpy as np
+
+from app.services.chromadb_service import ChromaDBService
+from app.services.lexical_index import LexicalIndex, LexicalIndexService, tokenize
+from app.utils import Segment
+
+SEGMENTS = [
+    Segment(0.0, 5.0, "Welcome to the lecture on neural networks."),
+    Segment(5.0, 10.0, "Each gradient update moves the weights."),
+    Segment(10.0, 15.0, "The learning rate scales each gradient descent step."),
+    Segment(15.0, 20.0, "Thanks for watching."),
+]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the Learning-Rate?") == ["learning", "rate"]
+
+
+def test_search_ranks_segments_by_bm25():
+    index = LexicalIndex.build(SEGMENTS)
+
+    ranked = index.search("gradient descent")
+    assert [doc for doc, _ in ranked] == [2, 1]
+    assert ranked[0][1] > ranked[1][1] > 0
+    assert index.search("transformers") == []
+    assert index.search("the") == []
+
+
+def test_search_boosts_verbatim_phrases():
+    index = LexicalIndex.build([Segment(0, 1, "rate of learning"), Segment(1, 2, "learning rate")])
+
+    assert [doc for doc, _ in index.search("learning rate")] == [1, 0]
+    assert index.search("learning rate", phrase_boost=0)[0][1] == index.search("learning rate", phrase_boost=0)[1][1]
+
+
+def test_covers_requires_every_query_term():
+    index = LexicalIndex.build(SEGMENTS)
+
+    assert index.covers("the learning rate")
+    assert not index.covers("learning momentum")
+    assert not index.covers("the")
+
+
+def test_index_round_trips_through_its_file(tmp_path):
+    service = LexicalIndexService(str(tmp_path))
+    built = service.build("a", SEGMENTS)
+
+    loaded = LexicalIndexService(str(tmp_path)).get("a")
+    assert loaded.search("learning rate") == built.search("learning rate")
+    assert loaded.texts.tolist() == [seg.text for seg in SEGMENTS]
+    assert np.array_equal(loaded.starts, [0.0, 5.0, 10.0, 15.0])
+
+    service.delete("a")
+    assert service.get("a") is None
+
+
+def test_lexical_search_returns_ranked_segments_of_every_query(tmp_path):
+    lexical_index = LexicalIndexService(str(tmp_path))
+    lexical_index.build("a", SEGMENTS)
+    chroma_db = ChromaDBService(chroma_client=object(), lexical_index=lexical_index)
+
+    ranked_lists, segments = chroma_db.lexical_search(["gradient descent", " gradient descent ", "", "welcome"], "a")
+
+    assert ranked_lists == [["a_segment_2", "a_segment_1"], ["a_segment_0"]]
+    assert segments["a_segment_2"] == {
+        "start": "0:00:10", "text": SEGMENTS[2].text, "start_seconds": 10.0, "distance": None,
+    }
+    assert chroma_db.lexical_search(["gradient"], "b") is None
@@ -0,0 +1,59 @@
+import chromadb
+import pytest
+
+from app.services.chromadb_service import ChromaDBService
+from app.utils import Segment
+from benchmarks.fakes import HashEmbeddingBackend, HashEmbeddingFunction
+
+VIDEOS = {
+    "a": ("Intro to tensors", "chan-x", 20230101),
+    "b": ("Tensors in practice", "chan-y", 20240101),
+    "c": ("Training tensors", "chan-x", 20240601),
+}
+
+
+@pytest.fixture
+def library(tmp_path):
+    backend = HashEmbeddingBackend(16)
+    chroma_db = ChromaDBService(
+        chroma_client=chromadb.PersistentClient(path=str(tmp_path / "chroma")), storage_mode="shared",
+        embedding_backend=backend, metadata_embedding_function=HashEmbeddingFunction(backend),
+    )
+    for video_id, (title, channel, upload_date) in VIDEOS.items():
+        chroma_db.store_metadata(video_id, title, f"{title} lecture", channel=channel, upload_date=upload_date)
+        segments = [Segment(i * 10.0, i * 10.0 + 10, f"{title} part {i} about tensors.") for i in range(4)]
+        chroma_db.store_subtitle_segments(segments, video_id)
+    return chroma_db
+
+
+def found(videos):
+    return sorted(video["video_id"] for video in videos)
+
+
+def test_library_search_returns_videos_with_their_best_segments(library):
+    videos = library.library_search("tensors", top_k=10, segments_per_video=2)
+
+    assert found(videos) == ["a", "b", "c"]
+    assert all(len(video["segments"]) == 2 for video in videos)
+    assert [video["score"] for video in videos] == sorted((video["score"] for video in videos), reverse=True)
+    by_id = {video["video_id"]: video for video in videos}
+    assert (by_id["b"]["title"], by_id["b"]["channel"], by_id["b"]["upload_date"]) == ("Tensors in practice", "chan-y", 20240101)
+
+
+def test_library_search_filters_by_channel_and_upload_date(library):
+    assert found(library.library_search("tensors", channel="chan-x")) == ["a", "c"]
+    assert found(library.library_search("tensors", uploaded_after=20240101)) == ["b", "c"]
+    assert found(library.library_search("tensors", uploaded_before=20240101)) == ["a", "b"]
+    assert found(library.library_search("tensors", channel="chan-x", uploaded_after=20240101)) == ["c"]
+    assert library.library_search("tensors", channel="chan-z") == []
+
+
+def test_library_search_limits_the_number_of_videos(library):
+    assert len(library.library_search("tensors", top_k=2)) == 2
+
+
+def test_library_search_needs_the_shared_collection():
+    chroma_db = ChromaDBService(chroma_client=object(), embedding_backend=HashEmbeddingBackend(16))
+
+    with pytest.raises(ValueError):
+        chroma_db.library_search("tensors")
@@ -0,0 +1,72 @@
+import pytest
+
+from app.metrics import MetricsRegistry, trace
+
+
+def test_counters_are_kept_per_label_set():
+    registry = MetricsRegistry()
+    registry.inc("requests_total", endpoint="query", status=200)
+    registry.inc("requests_total", 2, status=200, endpoint="query")
+    registry.inc("requests_total", endpoint="query", status=400)
+
+    assert registry.counters() == {
+        'requests_total{endpoint="query",status="200"}': 3,
+        'requests_total{endpoint="query",status="400"}': 1,
+    }
+
+
+def test_summary_of_a_histogram():
+    registry = MetricsRegistry()
+    for value in range(1, 101):
+        registry.observe("request_seconds", value / 100)
+
+    summary = registry.summary()["request_seconds"]
+    assert summary["count"] == 100
+    assert summary["mean"] == pytest.approx(0.505)
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (0.51, 0.96, 1.0)
+
+
+def test_timed_records_stages_in_the_current_trace():
+    registry = MetricsRegistry()
+    with trace("trace-1") as stages:
+        with registry.timed("embed"):
+            pass
+        with pytest.raises(ValueError):
+            with registry.timed("llm"):
+                raise ValueError("timeout")
+        assert list(registry.timed_iter("stream", iter([1, 2]))) == [1, 2]
+
+    assert [stage for stage, _ in stages] == ["embed", "llm", "stream"]
+    assert registry.counters() == {'stage_errors_total{stage="llm"}': 1}
+    assert registry.summary()['stage_seconds{stage="embed"}']["count"] == 1
+
+
+def test_timed_outside_a_trace_only_records_the_histogram():
+    registry = MetricsRegistry()
+    with registry.timed("embed"):
+        pass
+
+    assert registry.summary()['stage_seconds{stage="embed"}']["count"] == 1
+
+
+def test_render_in_the_prometheus_text_format():
+    registry = MetricsRegistry(prefix="test")
+    registry.inc("ingest_total", help="Ingests.", result="done")
+    registry.observe("latency", 0.3, buckets=(0.1, 0.5))
+    registry.register_gauge("cache", lambda: {(("stat", "hits"),): 7})
+
+    assert registry.render().splitlines() == [
+        "# HELP test_ingest_total Ingests.",
+        "# TYPE test_ingest_total counter",
+        'test_ingest_total{result="done"} 1',
+        "# HELP test_latency latency",
+        "# TYPE test_latency histogram",
+        'test_latency_bucket{le="0.1"} 0',
+        'test_latency_bucket{le="0.5"} 1',
+        'test_latency_bucket{le="+Inf"} 1',
+        "test_latency_sum 0.3",
+        "test_latency_count 1",
+        "# HELP test_cache cache",
+        "# TYPE test_cache gauge",
+        'test_cache{stat="hits"} 7',
+    ]
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from app import app, routes
+from app.metrics import metrics
+
+YOUTUBE_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+ORIGINAL_SEARCH_QUERY_TEXT = routes.search_query_text
+CANDIDATES = (
+    [["dQw4w9WgXcQ_segment_0", "dQw4w9WgXcQ_segment_1"]],
+    {
+        "dQw4w9WgXcQ_segment_0": {"start": "0:00:10", "text": "first match", "distance": 0.2},
+        "dQw4w9WgXcQ_segment_1": {"start": "0:01:00", "text": "second match", "distance": 0.4},
+    },
+)
+
+
+class FakeStore:
+    embedding_backend = type("Backend", (), {"name": "fake"})()
+    fuse_search_results = staticmethod(routes.ChromaDBService.fuse_search_results)
+
+    def video_exists(self, video_id):
+        return True
+
+
+    def get_metadata_by_video_id(self, video_id):
+        return "Title", "Description"
+
+
+class FakeLLM:
+    partials = []
+    queries_in_flight = []
+
+    def __init__(self, **kwargs):
+        pass
+
+
+    def stream_recommended_timestamps(self, title, description, query_text, candidates, chapters=None):
+        self.queries_in_flight.append(routes.resources.query_priority._active)
+        yield from self.partials
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(routes, "chroma_db", FakeStore())
+    monkeypatch.setattr(routes, "LLMService", FakeLLM)
+    monkeypatch.setattr(routes.confidence_gate, "min_confidence", 1.0)
+    monkeypatch.setattr(routes, "fast_path_answer", lambda query_results: None)
+    monkeypatch.setattr(routes, "search_query_text", lambda video_id, query_text: ([], CANDIDATES))
+    monkeypatch.setattr(routes, "retrieve_candidates", lambda *args: (list(CANDIDATES[1].values()), []))
+    return app.test_client()
+
+
+def stream(client, query_text):
+    response = client.post("/query_timestamp/stream", json={"query_text": query_text, "youtube_url": YOUTUBE_URL})
+    assert response.status_code == 200
+    events = []
+    for message in response.get_data(as_text=True).split("\n\n")[:-1]:
+        event, data = message.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_stream_sends_candidates_partials_and_done(client):
+    FakeLLM.partials = [[["00:00:10", "a"]], [["00:00:10", "a"], ["00:01:00", "b"]]]
+
+    events = stream(client, "sequence query")
+
+    assert events == [
+        ("candidates", [["00:00:10", "first match"], ["00:01:00", "second match"]]),
+        ("timestamps", [["00:00:10", "a"]]),
+        ("done", [["00:00:10", "a"], ["00:01:00", "b"]]),
+    ]
+    # The result is cached and answered without running the query again
+    assert stream(client, "Sequence query ") == [("done", [["00:00:10", "a"], ["00:01:00", "b"]])]
+
+
+def test_stream_without_timestamps_ends_with_an_error_and_caches_nothing(client):
+    FakeLLM.partials = []
+
+    events = stream(client, "empty query")
+
+    assert [event for event, _ in events] == ["candidates", "error"]
+    assert [event for event, _ in stream(client, "empty query")] == ["candidates", "error"]
+
+
+def test_stream_failures_end_with_an_error(client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("model server is down")
+
+    monkeypatch.setattr(routes, "retrieve_candidates", fail)
+
+    assert stream(client, "failing query")[-1] == ("error", {"error": "model server is down"})
+
+
+def test_stream_is_recorded_once_it_has_run(client):
+    FakeLLM.partials = [[["00:00:10", "a"]]]
+    series = 'requests_total{endpoint="query_timestamp_stream",status="200"}'
+    before = metrics.counters().get(series, 0)
+
+    response = client.post("/query_timestamp/stream", json={"query_text": "recorded query", "youtube_url": YOUTUBE_URL})
+    assert metrics.counters().get(series, 0) == before
+    assert response.get_data(as_text=True).endswith('event: done\ndata: [["00:00:10", "a"]]\n\n')
+    assert metrics.counters()[series] == before + 1
+
+
+def test_ingest_only_yields_to_the_search_steps_of_a_query(client, monkeypatch):
+    FakeLLM.partials = [[["00:00:10", "a"]]]
+    FakeLLM.queries_in_flight = []
+    searches_in_flight = []
+
+    def vector_search(queries, video_id, segment_ranges=None):
+        searches_in_flight.append(routes.resources.query_priority._active)
+        return CANDIDATES
+
+    monkeypatch.setattr(routes.chroma_db, "search_chapters", lambda *args: [], raising=False)
+    monkeypatch.setattr(routes.chroma_db, "vector_search", vector_search, raising=False)
+    monkeypatch.setattr(routes, "search_query_text", ORIGINAL_SEARCH_QUERY_TEXT)
+
+    stream(client, "priority query")
+
+    assert searches_in_flight == [1]
+    assert FakeLLM.queries_in_flight == [0]
@@ -0,0 +1,112 @@
+import pytest
+from youtube_transcript_api import TranscriptsDisabled
+
+from app.services.transcript_resolver import (
+    GENERATED, MANUAL, ORIGINAL, TRANSLATED, NoTranscriptError, TranscriptFetchError, TranscriptResolver,
+)
+
+
+class FakeTranscript:
+    def __init__(self, language_code, is_generated=False, translation_languages=(), entries=None):
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.is_translatable = bool(translation_languages)
+        self.translation_languages = [{"language_code": code} for code in translation_languages]
+        self.entries = [{"start": 0.0, "duration": 1.0, "text": f"{language_code} text"}] if entries is None else entries
+
+    def translate(self, language_code):
+        return FakeTranscript(language_code, self.is_generated)
+
+    def fetch(self):
+        return self.entries
+
+
+class FakeApi:
+    def __init__(self, transcripts, failures=0, error=RuntimeError("rate limited")):
+        self.transcripts = transcripts
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def list(self, video_id):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return self.transcripts
+
+
+def resolve(transcripts, **kwargs):
+    kwargs.setdefault("retry_backoff", 0)
+    return TranscriptResolver(api=FakeApi(transcripts), **kwargs).resolve("video")
+
+
+def test_prefers_manual_tracks_in_language_order():
+    transcripts = [FakeTranscript("de", is_generated=True), FakeTranscript("en")]
+
+    result = resolve(transcripts, languages=["de", "en"])
+
+    assert (result["source"], result["language"]) == (MANUAL, "en")
+    assert result["entries"] == [{"start": 0.0, "duration": 1.0, "text": "en text"}]
+
+
+def test_follows_the_policy_order():
+    transcripts = [FakeTranscript("de", is_generated=True), FakeTranscript("en")]
+
+    result = resolve(transcripts, languages=["de", "en"], policy=[GENERATED, MANUAL])
+
+    assert (result["source"], result["language"]) == (GENERATED, "de")
+
+
+def test_translates_when_no_track_is_in_a_preferred_language():
+    result = resolve([FakeTranscript("fr", translation_languages=["de", "en"])], languages=["en"])
+
+    assert (result["source"], result["language"]) == (TRANSLATED, "en")
+
+
+def test_falls_back_to_any_track_as_is():
+    transcripts = [FakeTranscript("ja", is_generated=True), FakeTranscript("fr")]
+
+    result = resolve(transcripts, languages=["en"])
+
+    assert (result["source"], result["language"]) == (ORIGINAL, "fr")
+
+
+def test_skips_tracks_without_entries():
+    transcripts = [FakeTranscript("en", entries=[]), FakeTranscript("en", is_generated=True)]
+
+    assert resolve(transcripts)["source"] == GENERATED
+
+
+def test_raises_when_the_policy_allows_no_track():
+    with pytest.raises(NoTranscriptError):
+        resolve([FakeTranscript("fr")], languages=["en"], policy=[MANUAL, GENERATED])
+
+
+def test_rejects_unknown_sources():
+    with pytest.raises(ValueError):
+        TranscriptResolver(policy=[MANUAL, "subtitles"], api=FakeApi([]))
+
+
+def test_retries_transient_errors():
+    api = FakeApi([FakeTranscript("en")], failures=2)
+
+    result = TranscriptResolver(max_retries=2, retry_backoff=0, api=api).resolve("video")
+
+    assert result["source"] == MANUAL
+    assert api.calls == 3
+
+
+def test_gives_up_after_the_last_retry():
+    api = FakeApi([FakeTranscript("en")], failures=3)
+
+    with pytest.raises(TranscriptFetchError):
+        TranscriptResolver(max_retries=2, retry_backoff=0, api=api).resolve("video")
+    assert api.calls == 3
+
+
+def test_does_not_retry_permanent_errors():
+    api = FakeApi([], failures=1, error=TranscriptsDisabled("video"))
+
+    with pytest.raises(NoTranscriptError):
+        TranscriptResolver(max_retries=2, retry_backoff=0, api=api).resolve("video")
+    assert api.calls == 1
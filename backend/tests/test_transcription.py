@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services import transcription
+from app.services.transcription import SAMPLING_RATE, find_cut_points, transcribe_chunked
+
+
+def noise_with_silence(seconds, silent_at):
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLING_RATE)).astype(np.float32)
+    for second in silent_at:
+        audio[int(second * SAMPLING_RATE):int((second + 0.5) * SAMPLING_RATE)] = 0
+    return audio
+
+
+def test_find_cut_points_moves_boundaries_to_silence():
+    audio = noise_with_silence(90, silent_at=[33, 62])
+
+    cuts = find_cut_points(audio, chunk_seconds=30, search_seconds=5)
+
+    # No boundary is placed within `search_seconds` of the end
+    assert [round(cut / SAMPLING_RATE) for cut in cuts] == [0, 33, 62, 90]
+    assert cuts[-1] == len(audio)
+    assert all(np.all(audio[cut:cut + 10] == 0) for cut in cuts[1:-1])
+
+
+def test_find_cut_points_of_short_audio():
+    assert find_cut_points(np.zeros(10, dtype=np.float32)) == [0, 10]
+    audio = noise_with_silence(20, silent_at=[])
+    assert find_cut_points(audio, chunk_seconds=30) == [0, len(audio)]
+
+
+class FakeWhisper:
+    def __init__(self, words):
+        # (start, end, text) of every word in absolute seconds
+        self.words = words
+
+
+    def transcribe(self, audio, beam_size=5):
+        # Chunks are located by their first sample, which encodes its absolute offset in seconds
+        offset = float(audio[0])
+        duration = len(audio) / SAMPLING_RATE
+        segments = [
+            SimpleNamespace(start=start - offset, end=end - offset, text=text)
+            for start, end, text in self.words
+            if end > offset and start < offset + duration
+        ]
+        return segments, None
+
+
+def test_transcribe_chunked_keeps_each_segment_once(monkeypatch):
+    audio = np.repeat(np.arange(0, 60, dtype=np.float32), SAMPLING_RATE)
+    monkeypatch.setattr(transcription, "decode_audio", lambda path, sampling_rate: audio)
+    monkeypatch.setattr(transcription, "find_cut_points", lambda audio, chunk_seconds: [0, 20 * SAMPLING_RATE, len(audio)])
+    words = [(0, 5, " intro"), (18, 21, " across"), (21, 22, " across"), (30, 40, " middle"), (55, 60, " end")]
+
+    segments = list(transcribe_chunked(FakeWhisper(words), "audio.m4a", workers=2, chunk_seconds=20, overlap_seconds=2))
+
+    # The word spanning the boundary comes from the chunk holding its midpoint, and the same text
+    # heard again right after the boundary is dropped
+    assert segments == [(0, 5, " intro"), (18, 21, " across"), (30, 40, " middle"), (55, 60, " end")]
@@ -0,0 +1,153 @@
+import pytest
+
+from app import utils
+from app.utils import (
+    RateLimiter, Segment, SentenceMerger, compose_srt, group_timestamps, parse_srt, parse_timestamp_response, parse_timestamp_seconds,
+    reciprocal_rank_fusion, timestamp_to_seconds, write_srt,
+)
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+
+    assert [item_id for item_id, _ in fused] == ["b", "a", "c"]
+    scores = dict(fused)
+    assert scores["a"] == 1 / 61
+    assert scores["b"] == 1 / 62 + 1 / 61
+    assert scores["c"] == 1 / 62
+
+
+def test_reciprocal_rank_fusion_keeps_first_seen_order_on_ties():
+    assert [item_id for item_id, _ in reciprocal_rank_fusion([["x", "y"], ["y", "x"]])] == ["x", "y"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_sentence_merger_emits_sentences_as_they_complete():
+    merger = SentenceMerger()
+
+    assert merger.feed(0.0, 1.5, "So today we") == []
+    assert merger.feed(1.5, 3.0, " ") == []
+    completed = merger.feed(3.0, 4.0, "look at tensors. ")
+    assert [(seg.start, seg.end, seg.text) for seg in completed] == [(0.0, 4.0, "So today we look at tensors.")]
+    assert [seg.text for seg in merger.feed(4.0, 5.0, "Ready?")] == ["Ready?"]
+    assert merger.flush() == []
+
+
+def test_sentence_merger_flushes_a_trailing_fragment():
+    merger = SentenceMerger()
+    merger.feed(0.0, 1.0, "Done.")
+    merger.feed(1.0, 2.0, "and then")
+
+    assert [(seg.start, seg.end, seg.text) for seg in merger.flush()] == [(1.0, 2.0, "and then")]
+    assert merger.flush() == []
+
+
+def test_segment_metadata_keeps_numeric_and_formatted_times():
+    segment = Segment(3723.25, 3725.0, "text")
+
+    assert segment.to_metadata() == {"start": "1:02:03.250000", "text": "text", "start_seconds": 3723.25, "end_seconds": 3725.0}
+    assert parse_timestamp_seconds(segment.start_timestamp) == 3723.25
+
+
+def test_compose_srt_round_trips_through_parse_srt(tmp_path):
+    segments = [Segment(0.0, 1.5, "First sentence."), Segment(3661.001, 3662.0, "Second one.")]
+
+    text = compose_srt(segments)
+    assert text.startswith("1\n00:00:00,000 --> 00:00:01,500\nFirst sentence.\n\n2\n01:01:01,001 --> 01:01:02,000\n")
+    parsed = parse_srt(text)
+    assert [(seg.start, seg.end, seg.text) for seg in parsed] == [(0.0, 1.5, "First sentence."), (3661.001, 3662.0, "Second one.")]
+
+    path = tmp_path / "video.srt"
+    write_srt(str(path), segments)
+    assert path.read_text(encoding="utf-8") == text
+
+
+def test_rate_limiter_spaces_calls_after_a_burst(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(utils.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(utils.time, "sleep", sleep)
+    limiter = RateLimiter(2, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+
+    assert sleeps == [0.5, 0.5]
+    assert clock[0] == 1.0
+
+
+def test_rate_limiter_of_rate_zero_never_waits(monkeypatch):
+    monkeypatch.setattr(utils.time, "sleep", lambda seconds: pytest.fail("slept"))
+    limiter = RateLimiter(0)
+    for _ in range(100):
+        limiter.acquire()
+
+
+def test_group_timestamps_sorts_and_drops_close_timestamps():
+    grouped = group_timestamps([300, 10, 40, 10, 200], ["a", "b", "c", "d", "e"], interval_sec=60)
+
+    # 40 is within a minute of 10; 10 was given twice and keeps its last reason
+    assert grouped == [("00:00:10", "d"), ("00:03:20", "e"), ("00:05:00", "a")]
+
+
+def test_group_timestamps_reduces_a_run_to_its_first_timestamp():
+    assert group_timestamps([0, 50, 100, 150], ["a", "b", "c", "d"], interval_sec=60) == [("00:00:00", "a")]
+
+
+def test_group_timestamps_clamps_negative_and_handles_empty_input():
+    assert group_timestamps([-5], ["a"]) == [("00:00:00", "a")]
+    assert group_timestamps([], []) == []
+
+
+def test_timestamp_to_seconds():
+    assert timestamp_to_seconds(125) == 125
+    assert timestamp_to_seconds(12.7) == 12
+    assert timestamp_to_seconds("90s") == 90
+    assert timestamp_to_seconds("02:05") == 125
+    assert timestamp_to_seconds("1:02:03") == 3723
+    assert timestamp_to_seconds(True) is None
+    assert timestamp_to_seconds("soon") is None
+    assert timestamp_to_seconds(None) is None
+
+
+def test_parse_timestamp_response_reads_json_objects():
+    text = 'Here you go:\n```json\n[{"start": 125, "reason": "defines the cost"}, {"start": "00:03:10", "reason": " gradient "}]\n```'
+
+    assert parse_timestamp_response(text) == [(125, "defines the cost"), (190, "gradient")]
+
+
+def test_parse_timestamp_response_reads_unfinished_streamed_arrays():
+    assert parse_timestamp_response('[{"start": 10, "reason": "a"}, {"start": 7') == [(10, "a")]
+
+
+def test_parse_timestamp_response_skips_objects_without_a_start():
+    text = '[{"reason": "no start"}, {"start": true, "reason": "bool"}, {"seconds": 42}]'
+
+    assert parse_timestamp_response(text) == [(42, "")]
+
+
+def test_parse_timestamp_response_falls_back_to_text_blocks():
+    text = "- Timestamp: 00:01:30\n- Reason: intro\n\n- Timestamp: 00:05:00\n- Reason: summary\n\nNothing else."
+
+    assert parse_timestamp_response(text) == [(90, "intro"), (300, "summary")]
+
+
+def test_parse_timestamp_response_of_an_empty_answer():
+    assert parse_timestamp_response("[]") == []
+    assert parse_timestamp_response("") == []
+
+
+def test_parse_timestamp_response_keeps_braces_in_reasons():
+    text = '[{"start": 30, "reason": "defines the set {x | x > 0}"}, {"start": 90, "reason": "code: f() { return 1; }"}]'
+
+    assert parse_timestamp_response(text) == [(30, "defines the set {x | x > 0}"), (90, "code: f() { return 1; }")]
+
+
+def test_parse_timestamp_response_reads_objects_inside_a_wrapping_object():
+    text = '{"timestamps": [{"start": 30, "reason": "a"}, {"start": "01:00", "reason": "b"}]}'
+
+    assert parse_timestamp_response(text) == [(30, "a"), (60, "b")]
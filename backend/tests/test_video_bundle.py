@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+
+import chromadb
+import numpy as np
+import pytest
+
+from app import commands
+from app.services.chromadb_service import ChromaDBService, EmbeddingModelMismatchError
+from app.services.video_bundle import MANIFEST_FILE, BundleError, VideoBundleService
+from app.utils import Segment
+from benchmarks.fakes import HashEmbeddingBackend, HashEmbeddingFunction
+
+
+def chroma_service(path, dimensions=16):
+    backend = HashEmbeddingBackend(dimensions)
+    return ChromaDBService(
+        chroma_client=chromadb.PersistentClient(path=str(path)), embedding_backend=backend,
+        metadata_embedding_function=HashEmbeddingFunction(backend),
+    )
+
+
+@pytest.fixture
+def bundles(tmp_path):
+    source = chroma_service(tmp_path / "source")
+    source.store_metadata("a", "Title", "Description", channel="chan", upload_date=20240101)
+    source.store_subtitle_segments([Segment(i * 2.5, i * 2.5 + 2.5, f"sentence {i}.") for i in range(7)], "a")
+    bundle_dir = str(tmp_path / "bundles")
+    VideoBundleService(source, bundle_dir).export("a")
+    return source, bundle_dir
+
+
+def test_export_and_load_round_trip(tmp_path, bundles):
+    source, bundle_dir = bundles
+    target = chroma_service(tmp_path / "target")
+    service = VideoBundleService(target, bundle_dir)
+
+    assert service.list_video_ids() == ["a"]
+    assert service.load("a") == 7
+    segments, embeddings = target.get_segment_embeddings("a")
+    expected_segments, expected_embeddings = source.get_segment_embeddings("a")
+    assert [(seg.start, seg.end, seg.text) for seg in segments] == [(seg.start, seg.end, seg.text) for seg in expected_segments]
+    assert np.array_equal(embeddings, expected_embeddings)
+    metadata = target.get_video_metadata("a")
+    assert (metadata["title"], metadata["description"], metadata["channel"], metadata["upload_date"]) == ("Title", "Description", "chan", 20240101)
+
+    # The same bundle is only imported again when forced
+    assert service.load("a") == 0
+    assert service.load("a", force=True) == 7
+    assert len(target.get_segments("a")) == 7
+
+
+def test_load_rejects_broken_and_incompatible_bundles(tmp_path, bundles):
+    _, bundle_dir = bundles
+    with pytest.raises(EmbeddingModelMismatchError):
+        VideoBundleService(chroma_service(tmp_path / "other-model", dimensions=8), bundle_dir).load("a")
+
+    service = VideoBundleService(chroma_service(tmp_path / "target"), bundle_dir)
+    with pytest.raises(BundleError):
+        service.load("missing")
+    manifest_path = os.path.join(bundle_dir, "a", MANIFEST_FILE)
+    with open(manifest_path, encoding="utf-8") as file:
+        manifest = json.load(file)
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump({**manifest, "texts": manifest["texts"][:-1]}, file)
+    with pytest.raises(BundleError):
+        service.load("a")
+
+
+def test_ensure_loaded_imports_once(tmp_path, bundles):
+    _, bundle_dir = bundles
+    service = VideoBundleService(chroma_service(tmp_path / "target"), bundle_dir)
+
+    assert service.ensure_loaded("a")
+    assert not service.ensure_loaded("a")
+    assert not service.ensure_loaded("missing")
+
+
+def test_ensure_loaded_does_not_wait_for_imports_of_other_videos(tmp_path, bundles):
+    _, bundle_dir = bundles
+    os.makedirs(os.path.join(bundle_dir, "b"))
+    with open(os.path.join(bundle_dir, "b", MANIFEST_FILE), "w", encoding="utf-8") as file:
+        file.write("{}")
+    service = VideoBundleService(chroma_service(tmp_path / "target"), bundle_dir)
+    importing, release = threading.Event(), threading.Event()
+    load = service.load
+
+    def slow_load(video_id, force=False):
+        if video_id == "b":
+            importing.set()
+            release.wait(5)
+        return load(video_id, force)
+
+    service.load = slow_load
+    slow = threading.Thread(target=service.ensure_loaded, args=("b",))
+    slow.start()
+    try:
+        assert importing.wait(5)
+        loaded = []
+        other = threading.Thread(target=lambda: loaded.append(service.ensure_loaded("a")))
+        other.start()
+        other.join(2)
+        assert loaded == [True]
+    finally:
+        release.set()
+        slow.join()
+
+
+class FakeBundles:
+    def __init__(self, broken):
+        self.broken = broken
+
+
+    def list_video_ids(self):
+        return ["a", "b", "c"]
+
+
+    def load(self, video_id, force=False):
+        if video_id in self.broken:
+            raise BundleError(f"Bundle of {video_id} is unreadable")
+        return 3
+
+
+def test_import_bundles_continues_after_a_failed_bundle(monkeypatch):
+    marked = []
+    monkeypatch.setattr(commands, "video_bundles", FakeBundles(broken={"b"}))
+    monkeypatch.setattr(commands.ingest_service, "mark_done", lambda video_id, youtube_url: marked.append(video_id))
+
+    result = commands.app.test_cli_runner().invoke(args=["import-bundles"])
+
+    assert result.exit_code == 1
+    assert marked == ["a", "c"]
+    assert "Imported 2 videos (6 segments)" in result.output
+    assert "1 bundles failed to import: b" in result.output
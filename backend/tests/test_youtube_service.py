@@ -0,0 +1,125 @@
+import pytest
+
+from app.artifacts import ArtifactStore
+from app.services import youtube_service
+from app.services.youtube_service import YouTubeService
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}&t=42s",
+    f" https://music.youtube.com/watch?v={VIDEO_ID}&list=PL123 ",
+    f"https://youtu.be/{VIDEO_ID}?si=abc",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://youtube.com/live/{VIDEO_ID}",
+])
+def test_extract_video_id(url):
+    assert YouTubeService.extract_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch",
+    "https://www.youtube.com/watch?v=short",
+    "https://www.youtube.com/@channel",
+    "https://www.youtube.com/playlist?list=PL123",
+    f"https://vimeo.com/watch?v={VIDEO_ID}",
+    "https://youtu.be/",
+    "not a url",
+])
+def test_extract_video_id_rejects_other_urls(url):
+    assert YouTubeService.extract_video_id(url) is None
+
+
+class FakeYoutubeDL:
+    pages = {}
+    opened = []
+
+    def __init__(self, options):
+        self.options = options
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+    def extract_info(self, url, download=False):
+        self.opened.append(url)
+        return self.pages[url]
+
+
+def video_entry(number):
+    return {"_type": "url", "ie_key": "Youtube", "id": f"video{number:06d}", "url": f"https://www.youtube.com/watch?v=video{number:06d}"}
+
+
+@pytest.fixture
+def youtube(tmp_path, monkeypatch):
+    monkeypatch.setattr(youtube_service.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    FakeYoutubeDL.opened = []
+    return YouTubeService(save_dir=str(tmp_path / "subtitles"), artifact_store=ArtifactStore(str(tmp_path / "artifacts")))
+
+
+def test_expand_url_of_a_video_skips_yt_dlp(youtube):
+    assert youtube.expand_url(f"https://youtu.be/{VIDEO_ID}") == [(VIDEO_ID, f"https://www.youtube.com/watch?v={VIDEO_ID}")]
+    assert youtube.expand_url("https://vimeo.com/123") == []
+    assert FakeYoutubeDL.opened == []
+
+
+def test_expand_url_follows_channel_tabs_and_drops_duplicates(youtube):
+    channel = "https://www.youtube.com/@channel"
+    FakeYoutubeDL.pages = {
+        channel: {"entries": [
+            {"_type": "playlist", "ie_key": "YoutubeTab", "id": "videos", "url": f"{channel}/videos"},
+            {"_type": "playlist", "ie_key": "YoutubeTab", "id": "shorts", "url": f"{channel}/shorts"},
+        ]},
+        f"{channel}/videos": {"entries": [video_entry(1), None, video_entry(2)]},
+        f"{channel}/shorts": {"entries": [video_entry(2), video_entry(3)]},
+    }
+
+    videos = youtube.expand_url(channel)
+
+    assert [video_id for video_id, _ in videos] == ["video000001", "video000002", "video000003"]
+    assert videos[0][1] == "https://www.youtube.com/watch?v=video000001"
+
+
+def test_expand_url_stops_at_max_videos(youtube):
+    playlist = "https://www.youtube.com/playlist?list=PL123"
+    FakeYoutubeDL.pages = {playlist: {"entries": [video_entry(i) for i in range(10)]}}
+
+    assert [video_id for video_id, _ in youtube.expand_url(playlist, max_videos=3)] == ["video000000", "video000001", "video000002"]
+
+
+class FakeResolver:
+    rate_limiter = None
+
+    def __init__(self, policy, languages):
+        self.policy = policy
+        self.languages = languages
+        self.calls = 0
+
+
+    def resolve(self, video_id):
+        self.calls += 1
+        entries = [{"start": 0.0, "duration": 2.0, "text": f"{self.policy[0]} {self.languages[0]} track."}]
+        return {"source": self.policy[0], "language": self.languages[0], "entries": entries}
+
+
+def test_stored_transcripts_are_keyed_by_policy_and_languages(tmp_path):
+    artifacts = ArtifactStore(str(tmp_path / "artifacts"))
+
+    def stream(policy, languages):
+        resolver = FakeResolver(policy, languages)
+        youtube = YouTubeService(save_dir=str(tmp_path / "subtitles"), save_srt=False, artifact_store=artifacts, transcript_resolver=resolver)
+        texts = [seg.text for seg in youtube.stream_subtitle(f"https://youtu.be/{VIDEO_ID}")]
+        return texts, resolver.calls
+
+    assert stream(["manual"], ["en"]) == (["manual en track."], 1)
+    assert stream(["manual"], ["en"]) == (["manual en track."], 0)
+    assert stream(["generated"], ["en"]) == (["generated en track."], 1)
+    assert stream(["manual"], ["de", "en"]) == (["manual de track."], 1)
@@ -1,5 +1,9 @@
 (() => {
   let youtubeLeftControls, youtubePlayer;
+  // Ingest job of the current video: state is one of the backend job states ("queued",
+  // "fetching", "transcribing", "embedding", "done", "failed")
+  let ingestJob = null;
+  const INGEST_POLL_MS = 2000;
 
   const storeVideoDataAPI = async (youtubeUrl) => {
     try {
@@ -26,9 +30,62 @@
     }
   };
 
-  const queryTimestampAPI = async (youtubeUrl, query) => {
+  const ingestStatusAPI = async (videoId) => {
+    const response = await fetch(`http://127.0.0.1:5000/ingest_status/${videoId}`);
+    if (!response.ok) {
+      throw new Error(`Server responded with status ${response.status}`);
+    }
+    return response.json();
+  };
+
+  // Polls the ingest job until it is done or failed, as /store_video_data returns before the
+  // video is searchable
+  const waitForIngest = async (job) => {
+    ingestJob = job;
+    renderIngestStatus();
+    while (ingestJob === job && job.state !== "done" && job.state !== "failed") {
+      await new Promise((resolve) => setTimeout(resolve, INGEST_POLL_MS));
+      try {
+        job = await ingestStatusAPI(job.video_id);
+      } catch (error) {
+        console.error("Error checking ingest status:", error);
+        continue;
+      }
+      if (ingestJob === null || ingestJob.video_id !== job.video_id) return;
+      ingestJob = job;
+      renderIngestStatus();
+    }
+  };
+
+  // Labels the search button of the open modal with the ingest state of the video
+  const renderIngestStatus = () => {
+    const modal = document.getElementById("vidlocator-modal");
+    if (!modal) return;
+    const submitBtn = modal.querySelector("#vidlocator-search-btn");
+    if (!submitBtn || submitBtn.dataset.searching) return;
+
+    const ready = ingestJob && ingestJob.state === "done";
+    const failed = ingestJob && ingestJob.state === "failed";
+    submitBtn.innerText = ready ? "Search" : failed ? "Unavailable" : "Still ingesting...";
+    submitBtn.disabled = !ready;
+    submitBtn.title = failed ? `VidLocator could not process this video: ${ingestJob.error}` : "";
+  };
+
+  const parseServerSentEvent = (message) => {
+    const event = { type: "message", data: "" };
+    message.split("\n").forEach((line) => {
+      if (line.startsWith("event:")) event.type = line.slice(6).trim();
+      else if (line.startsWith("data:")) event.data += line.slice(5).trim();
+    });
+    event.data = event.data ? JSON.parse(event.data) : null;
+    return event;
+  };
+
+  // Streams the results: onUpdate receives the vector matches first, then the LLM-ranked
+  // timestamps as they are completed, and the final list is returned
+  const queryTimestampAPI = async (youtubeUrl, query, onUpdate) => {
     try {
-      const response = await fetch("http://127.0.0.1:5000/query_timestamp", {
+      const response = await fetch("http://127.0.0.1:5000/query_timestamp/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -42,7 +99,27 @@
       if (!response.ok) {
         throw new Error(`Server responded with status ${response.status}`);
       }
-      data = await response.json();
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let data;
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const event = parseServerSentEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          if (event.type === "error") throw new Error(event.data.error);
+          if (event.type === "done") data = event.data;
+          else if (onUpdate && event.data && event.data.length) onUpdate(event.data);
+        }
+      }
+      if (!data) return data;
+
       const vidLocatorData =
         JSON.parse(sessionStorage.getItem("vidLocatorData")) || {};
       vidLocatorData.timestamps = data; // list of [timestamp, explaination]
@@ -209,6 +286,7 @@
 
     // Search button
     const submitBtn = document.createElement("button");
+    submitBtn.id = "vidlocator-search-btn";
     submitBtn.innerText = "Search";
     Object.assign(submitBtn.style, {
       padding: "10px 15px",
@@ -257,6 +335,7 @@
     buttonContainer.appendChild(submitBtn);
 
     document.body.appendChild(modal);
+    renderIngestStatus();
     if (vidLocatorData && vidLocatorData.timestamps) {
       renderTimestampList(vidLocatorData.timestamps);
     }
@@ -268,12 +347,21 @@
       alert("Please enter text!");
       return;
     }
+    if (ingestJob && ingestJob.state === "failed") {
+      alert(`VidLocator could not process this video: ${ingestJob.error}`);
+      return;
+    }
+    if (!ingestJob || ingestJob.state !== "done") {
+      alert("VidLocator: This video is still being ingested. Please try again shortly.");
+      return;
+    }
 
-    const submitBtn = modal.querySelector("button:first-child");
+    const submitBtn = modal.querySelector("#vidlocator-search-btn");
     submitBtn.innerText = "Loading...";
     submitBtn.disabled = true;
+    submitBtn.dataset.searching = "true";
 
-    queryTimestampAPI(youtubeUrl, query_text)
+    queryTimestampAPI(youtubeUrl, query_text, renderTimestampList)
       .then((data) => {
         if (data) {
           renderTimestampList(data);
@@ -286,14 +374,21 @@
         console.error("Error:", error);
       })
       .finally(() => {
-        submitBtn.innerText = "Search";
-        submitBtn.disabled = false;
+        delete submitBtn.dataset.searching;
+        renderIngestStatus();
       });
   };
 
   // Handle new video load and setup features
   const handleNewVideo = async (youtubeUrl) => {
-    await storeVideoDataAPI(youtubeUrl);
+    ingestJob = null;
+    const data = await storeVideoDataAPI(youtubeUrl);
+    if (data && data.job) {
+      waitForIngest(data.job);
+    } else {
+      ingestJob = { state: "failed", error: (data && data.error) || "the server could not be reached" };
+      renderIngestStatus();
+    }
 
     const vidLocatorButton = document.getElementsByClassName("vidlocator-btn");
     if (vidLocatorButton.length === 0) {